@@ -0,0 +1,380 @@
+import csv
+import io
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils.crypto import get_random_string
+
+from .models import (
+    AssetInventory, Department, Designation, Employee, EmployeeAssetDetails, EmployeeIdSequence, UserRegister,
+)
+from .org_hierarchy import add_employees as add_to_hierarchy
+from .serializers import EmployeeImportRowSerializer
+from .utils import hash_passwords
+from notifications.outbox import queue_messages
+
+
+class ImportFileError(Exception):
+    """Raised when an uploaded file cannot be read as CSV or XLSX."""
+
+
+def iter_import_rows(fileobj, filename):
+    """
+    Stream rows of a CSV or XLSX upload as dicts keyed by the header row.
+    Rows are yielded one by one so large files are never fully loaded into memory.
+    """
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return _iter_csv_rows(fileobj)
+    if name.endswith('.xlsx'):
+        return _iter_xlsx_rows(fileobj)
+    raise ImportFileError("Unsupported file type. Upload a .csv or .xlsx file.")
+
+
+def _iter_csv_rows(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        for row in csv.DictReader(text):
+            yield {(key or '').strip(): value for key, value in row.items()}
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise ImportFileError(f"Could not read CSV file: {exc}")
+    finally:
+        text.detach()
+
+
+def _iter_xlsx_rows(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError("XLSX import requires the 'openpyxl' package.")
+
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as exc:
+        raise ImportFileError(f"Could not read XLSX file: {exc}")
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return
+        header = [str(h).strip() if h is not None else '' for h in header]
+        for values in rows:
+            if values is None or all(v is None for v in values):
+                continue
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _clean_value(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets store phone and account numbers as floats
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _clean_row(row):
+    cleaned = {}
+    for key, value in row.items():
+        if not key:
+            continue
+        value = _clean_value(value)
+        if value is not None:
+            cleaned[key] = value
+    return cleaned
+
+
+def _split_ids(value):
+    return [part.strip() for part in str(value).replace(',', ';').split(';') if part.strip()]
+
+
+class EmployeeImporter:
+    """
+    Bulk-creates employees (and their login users) for one company.
+
+    Rows are validated and written in chunks; each chunk is committed in its own
+    transaction so a bad chunk does not roll back the rows before it.
+    Welcome emails are queued in the outbox together with each chunk.
+    """
+
+    def __init__(self, company, chunk_size=500, send_emails=True):
+        self.company = company
+        self.chunk_size = chunk_size
+        self.send_emails = send_emails
+        self.errors = []
+        self.created = []
+        self.total_rows = 0
+        self.file_error = None
+        self._seen_emails = set()
+        self._load_lookups()
+
+    def _load_lookups(self):
+        departments = Department.objects.filter(company=self.company)
+        self.departments_by_id = {str(d.id): d for d in departments}
+        self.departments_by_name = {d.department_name.strip().lower(): d for d in departments}
+
+        designations = Designation.objects.filter(company=self.company).select_related('level')
+        self.designations_by_id = {str(d.id): d for d in designations}
+        self.designations_by_name = {}
+        for designation in designations:
+            key = (designation.department_id, designation.designation_name.strip().lower())
+            self.designations_by_name[key] = designation
+
+        self.assets_by_id = {
+            str(a.id): a for a in AssetInventory.objects.filter(company=self.company)
+        }
+
+    def run(self, rows):
+        numbered = enumerate(rows, start=2)  # row 1 is the header
+        while True:
+            try:
+                chunk = list(islice(numbered, self.chunk_size))
+            except ImportFileError as exc:
+                # Rows in earlier chunks are already saved; report where reading stopped
+                self.file_error = str(exc)
+                break
+            if not chunk:
+                break
+            self.total_rows += len(chunk)
+            self._import_chunk(chunk)
+
+        return self.report()
+
+    def report(self):
+        return {
+            'total_rows': self.total_rows,
+            'created': len(self.created),
+            'failed': len(self.errors),
+            'file_error': self.file_error,
+            'employees': self.created,
+            'errors': sorted(self.errors, key=lambda e: e['row']),
+        }
+
+    def _fail(self, row_number, email, errors):
+        self.errors.append({'row': row_number, 'email': email, 'errors': errors})
+
+    def _import_chunk(self, chunk):
+        valid = []
+        for row_number, raw in chunk:
+            row = _clean_row(raw)
+            serializer = EmployeeImportRowSerializer(data=row)
+            if not serializer.is_valid():
+                self._fail(row_number, row.get('email'), serializer.errors)
+                continue
+            data = serializer.validated_data
+            errors = self._resolve_relations(data)
+            if errors:
+                self._fail(row_number, data['email'], errors)
+                continue
+            email_key = data['email'].lower()
+            if email_key in self._seen_emails:
+                self._fail(row_number, data['email'], {'email': ["Duplicate email in the uploaded file."]})
+                continue
+            self._seen_emails.add(email_key)
+            valid.append((row_number, data))
+
+        if not valid:
+            return
+
+        valid = self._drop_existing_emails(valid)
+        valid = self._resolve_reporting_managers(valid)
+        valid = self._reserve_assets(valid)
+        if not valid:
+            return
+
+        try:
+            self._write_chunk(valid)
+        except IntegrityError as exc:
+            for row_number, data in valid:
+                self._fail(row_number, data['email'], {'non_field_errors': [f"Could not save row: {exc}"]})
+
+    def _resolve_relations(self, data):
+        errors = {}
+        department_ref = str(data.pop('department'))
+        department = (
+            self.departments_by_id.get(department_ref)
+            or self.departments_by_name.get(department_ref.lower())
+        )
+        if not department:
+            errors['department'] = [f"Unknown department '{department_ref}'."]
+
+        designation_ref = str(data.pop('designation'))
+        designation = self.designations_by_id.get(designation_ref)
+        if not designation and department:
+            designation = self.designations_by_name.get((department.id, designation_ref.lower()))
+        if not designation:
+            errors['designation'] = [f"Unknown designation '{designation_ref}'."]
+        elif department and designation.department_id != department.id:
+            errors['designation'] = ["Designation does not belong to the given department."]
+
+        asset_ids = _split_ids(data.pop('assets', '') or '')
+        unknown = [a for a in asset_ids if a not in self.assets_by_id]
+        if unknown:
+            errors['assets'] = [f"Unknown asset id(s): {', '.join(unknown)}."]
+
+        data['department'] = department
+        data['designation'] = designation
+        data['asset_ids'] = asset_ids
+        return errors
+
+    def _drop_existing_emails(self, valid):
+        emails = [data['email'].lower() for _, data in valid]
+        existing = set(
+            Employee.objects.filter(company=self.company)
+            .annotate(email_lower=Lower('email'))
+            .filter(email_lower__in=emails)
+            .values_list('email_lower', flat=True)
+        )
+        kept = []
+        for row_number, data in valid:
+            if data['email'].lower() in existing:
+                self._fail(row_number, data['email'], {'email': ["This email is already registered for this company."]})
+            else:
+                kept.append((row_number, data))
+        return kept
+
+    def _resolve_reporting_managers(self, valid):
+        codes = {data['reporting_manager'] for _, data in valid if data.get('reporting_manager')}
+        managers = {}
+        if codes:
+            managers = {
+                e.employee_id: e
+                for e in Employee.objects.filter(company=self.company, employee_id__in=codes)
+            }
+        kept = []
+        for row_number, data in valid:
+            code = data.pop('reporting_manager', None)
+            if code and code not in managers:
+                self._fail(row_number, data['email'], {'reporting_manager': [f"Unknown employee id '{code}'."]})
+                continue
+            data['reporting_manager'] = managers.get(code) if code else None
+            kept.append((row_number, data))
+        return kept
+
+    def _reserve_assets(self, valid):
+        """
+        Check stock for the whole chunk at once; rows asking for an asset that has
+        run out are rejected. The stock itself is decremented in `_write_chunk`.
+        """
+        requested = Counter(a for _, data in valid for a in data['asset_ids'])
+        self._granted_assets = Counter()
+        if not requested:
+            return valid
+
+        available = dict(
+            AssetInventory.objects.filter(id__in=requested.keys()).values_list('id', 'quantity')
+        )
+        kept = []
+        for row_number, data in valid:
+            short = [
+                a for a in data['asset_ids']
+                if available.get(int(a), 0) - self._granted_assets[a] <= 0
+            ]
+            if short:
+                names = ', '.join(self.assets_by_id[a].name for a in short)
+                self._fail(row_number, data['email'], {'assets': [f"Out of stock: {names}."]})
+                continue
+            self._granted_assets.update(data['asset_ids'])
+            kept.append((row_number, data))
+        return kept
+
+    def _unique_usernames(self, count):
+        usernames = set()
+        while len(usernames) < count:
+            candidates = {f'emp_{get_random_string(6)}' for _ in range(count - len(usernames))}
+            taken = set(UserRegister.objects.filter(username__in=candidates).values_list('username', flat=True))
+            usernames.update(candidates - taken)
+        return list(usernames)
+
+    def _write_chunk(self, valid):
+        passwords = [get_random_string(8) for _ in valid]
+        hashed = hash_passwords(passwords)
+        usernames = self._unique_usernames(len(valid))
+        # Reserved before the write transaction so the sequence row is not held locked
+        # while the chunk is inserted.
+        employee_ids = EmployeeIdSequence.reserve(self.company.id, len(valid))
+
+        with transaction.atomic():
+            # One UPDATE per asset for the whole chunk instead of one per row
+            for asset_id, count in self._granted_assets.items():
+                updated = AssetInventory.objects.filter(id=asset_id, quantity__gte=count).update(
+                    quantity=F('quantity') - count
+                )
+                if not updated:
+                    raise IntegrityError(f"Asset {self.assets_by_id[asset_id].name} ran out of stock during import.")
+
+            users = UserRegister.objects.bulk_create([
+                UserRegister(
+                    username=username,
+                    email=data['email'],
+                    password=password_hash,
+                    role='employee',
+                    company=self.company,
+                )
+                for username, password_hash, (_, data) in zip(usernames, hashed, valid)
+            ])
+
+            employees = []
+            for user, employee_id, (_, data) in zip(users, employee_ids, valid):
+                fields = {k: v for k, v in data.items() if k != 'asset_ids'}
+                designation = fields.get('designation')
+                if designation and designation.level_id:
+                    fields['level'] = designation.level
+                employees.append(Employee(
+                    company=self.company,
+                    user=user,
+                    employee_id=employee_id,
+                    **fields,
+                ))
+            employees = Employee.objects.bulk_create(employees)
+            add_to_hierarchy((employee.id, employee.reporting_manager_id) for employee in employees)
+
+            EmployeeAssetDetails.objects.bulk_create([
+                EmployeeAssetDetails(employee=employee, assetinventory_id=int(asset_id))
+                for employee, (_, data) in zip(employees, valid)
+                for asset_id in data['asset_ids']
+            ])
+
+            if self.send_emails:
+                queue_messages(
+                    [build_welcome_email(user, password) for user, password in zip(users, passwords)],
+                    company=self.company,
+                    redact_after_send=True,
+                )
+
+        for user, employee, (row_number, data) in zip(users, employees, valid):
+            self.created.append({
+                'row': row_number,
+                'id': employee.id,
+                'employee_id': employee.employee_id,
+                'email': employee.email,
+                'username': user.username,
+            })
+
+
+def build_welcome_email(user, password):
+    message = (
+        f'Hello {user.username},\n\n'
+        f'Your employee account has been created.\n\n'
+        f'Username: {user.username}\n'
+        f'Password: {password}\n\n'
+        f'Please log in and change your password after first login.\n\n'
+        f'Thank you!'
+    )
+    return EmailMessage('Welcome to the Company!', message, settings.DEFAULT_FROM_EMAIL, [user.email])
+
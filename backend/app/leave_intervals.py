@@ -0,0 +1,98 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.backends.postgresql.psycopg_any import DateRange
+
+from .models import EmpLeave
+
+
+def as_range(start, end):
+    """The inclusive date range [start, end], comparable with EmpLeave.period."""
+    return DateRange(start, end, '[]')
+
+
+def overlapping(employee, start, end):
+    """Pending or approved leaves of `employee` that share a day with [start, end]."""
+    return EmpLeave.objects.filter(
+        employee=employee,
+        status__in=EmpLeave.ACTIVE_STATUSES,
+        period__overlap=as_range(start, end),
+    )
+
+
+def _approved_days(leaves, start, end):
+    """
+    Yield (employee id, day, leave row) for every approved leave day in
+    [start, end], from one query over the period index. Leaves reaching
+    outside the window are clipped to it.
+    """
+    rows = (
+        leaves.filter(status='Approved', period__overlap=as_range(start, end))
+        .order_by('from_date', 'id')
+        .values('employee_id', 'from_date', 'to_date', 'leave_type__leave_name', 'leave_type__is_paid')
+    )
+    for row in rows:
+        first, last = sorted((row['from_date'], row['to_date']))
+        day, last = max(first, start), min(last, end)
+        while day <= last:
+            yield row['employee_id'], day, row
+            day += timedelta(days=1)
+
+
+def leave_days(employee, start, end):
+    """An employee's approved leave days in [start, end], as {date: leave type name}."""
+    return {
+        day: row['leave_type__leave_name'] or ''
+        for _, day, row in _approved_days(EmpLeave.objects.filter(employee=employee), start, end)
+    }
+
+
+def company_coverage(company_id, start, end):
+    """
+    Approved leave days of a company's employees in [start, end], as
+    {employee id: {date: leave type name}}.
+    """
+    coverage = defaultdict(dict)
+    for employee_id, day, row in _approved_days(EmpLeave.objects.filter(company_id=company_id), start, end):
+        coverage[employee_id][day] = row['leave_type__leave_name'] or ''
+    return coverage
+
+
+def leave_day_counts(company_id, start, end):
+    """
+    Approved leave days per employee in [start, end], split into paid and
+    unpaid, as {employee id: {'paid': n, 'unpaid': n}}. Days are counted once
+    even if they fall under more than one leave, and a leave spanning
+    months only counts its days inside the window.
+    """
+    days = defaultdict(lambda: {'paid': set(), 'unpaid': set()})
+    for employee_id, day, row in _approved_days(EmpLeave.objects.filter(company_id=company_id), start, end):
+        if row['leave_type__is_paid'] is None:
+            # No leave type left to say whether it is paid
+            continue
+        days[employee_id]['paid' if row['leave_type__is_paid'] else 'unpaid'].add(day)
+    return {
+        employee_id: {kind: len(dates) for kind, dates in split.items()}
+        for employee_id, split in days.items()
+    }
+
+
+def overlap_conflicts(leaves):
+    """
+    Pending or approved leaves in `leaves` that share a day with another one
+    of the same employee, as (leave, kept leave) pairs. Approved leaves are
+    kept before pending ones and earlier before later, so the first leave of
+    each pair is the one to give up.
+    """
+    kept = defaultdict(list)
+    conflicts = []
+    active = [leave for leave in leaves if leave.status in EmpLeave.ACTIVE_STATUSES]
+    for leave in sorted(active, key=lambda leave: (leave.status != 'Approved', min(leave.from_date, leave.to_date), leave.id)):
+        start, end = sorted((leave.from_date, leave.to_date))
+        taken = kept[leave.employee_id]
+        other = next((other for other, (s, e) in taken if start <= e and s <= end), None)
+        if other:
+            conflicts.append((leave, other))
+        else:
+            taken.append((leave, (start, end)))
+    return conflicts
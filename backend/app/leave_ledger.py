@@ -0,0 +1,172 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+
+from .models import Leave, LeaveBalance, LeaveLedgerEntry
+
+
+def days_by_year(from_date, to_date):
+    """Inclusive leave days per calendar year, so a leave over New Year counts in both."""
+    days = {}
+    start = from_date
+    while start <= to_date:
+        year_end = min(date(start.year, 12, 31), to_date)
+        days[start.year] = (year_end - start).days + 1
+        start = year_end + timedelta(days=1)
+    return days
+
+
+def _locked_balance(employee, leave_type, year, user=None):
+    """
+    The balance row for update, created with its opening accrual (the leave
+    type's yearly count) the first time it is needed.
+    """
+    balance, created = LeaveBalance.objects.select_for_update().get_or_create(
+        employee=employee,
+        leave_type=leave_type,
+        year=year,
+        defaults={'company_id': employee.company_id, 'accrued': leave_type.count},
+    )
+    if created and leave_type.count:
+        LeaveLedgerEntry.objects.create(
+            company_id=employee.company_id,
+            employee=employee,
+            leave_type=leave_type,
+            year=year,
+            entry_type='accrual',
+            days=leave_type.count,
+            note='Yearly allowance',
+            created_by=user,
+        )
+    return balance
+
+
+def _wanted_debits(leave, release):
+    if release or leave.status != 'Approved' or not leave.leave_type_id or leave.from_date > leave.to_date:
+        return {}
+    return {
+        (leave.leave_type_id, year): -days
+        for year, days in days_by_year(leave.from_date, leave.to_date).items()
+    }
+
+
+def _locked_balances(keys, employees, leave_types, user=None):
+    """
+    The balance rows for (employee id, leave type id, year) keys, locked for
+    update. Rows that do not exist yet are created as _locked_balance does.
+    """
+    match = Q()
+    for employee_id, leave_type_id, year in keys:
+        match |= Q(employee_id=employee_id, leave_type_id=leave_type_id, year=year)
+    balances = {
+        (b.employee_id, b.leave_type_id, b.year): b
+        for b in LeaveBalance.objects.select_for_update().filter(match).order_by('employee_id', 'leave_type_id', 'year')
+    }
+    for key in sorted(set(keys) - set(balances)):
+        employee_id, leave_type_id, year = key
+        balances[key] = _locked_balance(employees[employee_id], leave_types[leave_type_id], year, user)
+    return balances
+
+
+def sync_leaves(leaves, user=None, release=False):
+    """
+    Bring the ledger in line with the current state of leave requests: an
+    approved leave is debited once per year it touches, and any other status
+    (rejected, cancelled, or an approval that was reversed) has its debits
+    credited back. A changed leave type or date range moves the debit accordingly.
+    `release` credits everything back whatever the status, for leaves being deleted.
+    Safe to call more than once. Call it in the transaction that saves the leaves.
+    A batch of leaves costs the same handful of queries as a single one.
+    """
+    leaves = [leave for leave in leaves if leave.pk]
+    if not leaves:
+        return
+
+    with transaction.atomic():
+        recorded = defaultdict(int)
+        rows = (
+            LeaveLedgerEntry.objects.filter(emp_leave__in=[leave.pk for leave in leaves])
+            .values('emp_leave_id', 'leave_type_id', 'year')
+            .annotate(total=Sum('days'))
+        )
+        for row in rows:
+            recorded[(row['emp_leave_id'], row['leave_type_id'], row['year'])] = row['total']
+
+        changes = []
+        for leave in leaves:
+            wanted = _wanted_debits(leave, release)
+            keys = set(wanted) | {key[1:] for key in recorded if key[0] == leave.pk}
+            for leave_type_id, year in sorted(keys):
+                delta = wanted.get((leave_type_id, year), 0) - recorded[(leave.pk, leave_type_id, year)]
+                if delta:
+                    changes.append((leave, leave_type_id, year, delta))
+        if not changes:
+            return
+
+        employees = {leave.employee_id: leave.employee for leave, *_ in changes}
+        leave_types = {lt.id: lt for lt in Leave.objects.filter(id__in={change[1] for change in changes})}
+        # Locked in key order so concurrent syncs never wait on each other in a cycle
+        balances = _locked_balances(
+            {(leave.employee_id, leave_type_id, year) for leave, leave_type_id, year, _ in changes},
+            employees, leave_types, user,
+        )
+
+        entries = []
+        for leave, leave_type_id, year, delta in changes:
+            entries.append(LeaveLedgerEntry(
+                company_id=leave.employee.company_id,
+                employee_id=leave.employee_id,
+                leave_type_id=leave_type_id,
+                year=year,
+                entry_type='debit' if delta < 0 else 'credit',
+                days=delta,
+                emp_leave=leave,
+                note=f"Leave {leave.from_date} to {leave.to_date} {leave.status.lower()}",
+                created_by=user,
+            ))
+            balances[(leave.employee_id, leave_type_id, year)].used -= delta
+        LeaveLedgerEntry.objects.bulk_create(entries)
+        touched = {(leave.employee_id, leave_type_id, year) for leave, leave_type_id, year, _ in changes}
+        LeaveBalance.objects.bulk_update([balances[key] for key in sorted(touched)], ['used'])
+
+
+def sync_leave(leave, user=None, release=False):
+    """sync_leaves for a single leave request."""
+    sync_leaves([leave], user=user, release=release)
+
+
+def adjust_allowance(leave_type, old_count, user=None):
+    """
+    Carry a change of a leave type's yearly count into this year's existing
+    balances, with one adjustment entry per balance.
+    """
+    delta = leave_type.count - old_count
+    if not delta:
+        return
+    year = date.today().year
+    with transaction.atomic():
+        balances = list(LeaveBalance.objects.select_for_update().filter(leave_type=leave_type, year=year))
+        if not balances:
+            return
+        LeaveLedgerEntry.objects.bulk_create([
+            LeaveLedgerEntry(
+                company_id=balance.company_id,
+                employee_id=balance.employee_id,
+                leave_type=leave_type,
+                year=year,
+                entry_type='adjustment',
+                days=delta,
+                note=f"Yearly allowance changed from {old_count} to {leave_type.count}",
+                created_by=user,
+            )
+            for balance in balances
+        ])
+        LeaveBalance.objects.filter(pk__in=[b.pk for b in balances]).update(accrued=F('accrued') + delta)
+
+
+def balances_for(employee, year=None):
+    """This year's (or `year`'s) balances of an employee, keyed by leave type id."""
+    year = year or date.today().year
+    return {b.leave_type_id: b for b in LeaveBalance.objects.filter(employee=employee, year=year)}
@@ -0,0 +1,92 @@
+import re
+import string
+import threading
+from collections import OrderedDict
+
+PLACEHOLDER_PATTERN = re.compile(r'<(\w+)>')
+
+# Compiled templates kept per process, keyed by template id
+CACHE_SIZE = 256
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class CompiledLetterTemplate:
+    """
+    Letter text parsed once into literal and placeholder segments.
+
+    `placeholders` is the set of names used in the text. `render(data)` fills
+    them from `data`; names missing from `data` are left as `<name>`.
+    """
+    __slots__ = ('literals', 'keys', 'placeholders')
+
+    def __init__(self, text):
+        parts = PLACEHOLDER_PATTERN.split(text or '')
+        # split() alternates literal, name, literal, ... and always ends on a literal
+        self.literals = tuple(parts[0::2])
+        self.keys = tuple(parts[1::2])
+        self.placeholders = frozenset(self.keys)
+
+    def render(self, data, only=None):
+        """
+        Fill the placeholders from `data`. When `only` is given, placeholders
+        outside it are left untouched even if `data` has a value for them.
+        """
+        out = [self.literals[0]]
+        for key, literal in zip(self.keys, self.literals[1:]):
+            if key in data and (only is None or key in only):
+                out.append(str(data[key]))
+            else:
+                out.append(f'<{key}>')
+            out.append(literal)
+        return ''.join(out)
+
+
+def compile_text(text):
+    return CompiledLetterTemplate(text)
+
+
+def compile_template(template):
+    """
+    Return the compiled form of a LetterTemplate's content, compiling it only when
+    the template is new to this process or has been saved since it was cached.
+    """
+    key = (template.pk, template.updated_at)
+    with _cache_lock:
+        cached = _cache.get(template.pk)
+        if cached and cached[0] == key:
+            _cache.move_to_end(template.pk)
+            return cached[1]
+
+    compiled = CompiledLetterTemplate(template.content)
+    if template.pk is None:
+        return compiled
+
+    with _cache_lock:
+        _cache[template.pk] = (key, compiled)
+        _cache.move_to_end(template.pk)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def legacy_placeholders(text):
+    """
+    Names written as `$name` or `${name}`, the string.Template syntax the
+    template preview accepted before it moved to `<name>`. Deprecated.
+    """
+    return sorted({
+        match.group('named') or match.group('braced')
+        for match in string.Template.pattern.finditer(text or '')
+        if match.group('named') or match.group('braced')
+    })
+
+
+def fill_legacy_placeholders(text, data):
+    """Fill `$name` placeholders from `data`, leaving unknown ones as typed."""
+    return string.Template(text or '').safe_substitute(data)
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
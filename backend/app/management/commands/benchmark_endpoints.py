@@ -0,0 +1,248 @@
+import json
+import math
+import statistics
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.models import Attendance, Company, Employee, UserRegister
+from app.synthetic_data import SyntheticDataGenerator
+
+DEFAULT_BASELINE = settings.BASE_DIR / 'benchmarks' / 'endpoints.json'
+DEFAULT_BUDGETS = {
+    # Queries a call may add over the baseline
+    'extra_queries': 0,
+    # p95 may grow by this fraction of the baseline, plus the slack
+    'p95_increase': 0.5,
+    'p95_slack_ms': 5,
+}
+# (name, url name, method, caller, query parameters for the benchmark month)
+ENDPOINTS = [
+    ('attendance_log', 'attendance-log', 'get', 'admin', lambda m: {'month': m.month, 'year': m.year}),
+    ('attendance_logs', 'attendance_log', 'get', 'admin', lambda m: {'month': m.strftime('%Y-%m')}),
+    ('generate_payroll', 'generate-payroll', 'post', 'admin', lambda m: {}),
+    ('admin_dashboard', 'admin-dashboard', 'get', 'admin', lambda m: {}),
+    ('all_notifications', 'all-notifications', 'get', 'employee', lambda m: {}),
+    ('my_tasks', 'my_tasks', 'get', 'employee', lambda m: {}),
+    ('dashboard', 'dashboard', 'get', 'employee', lambda m: {}),
+    ('employee_calendar', 'employee_calendar', 'get', 'employee', lambda m: {'month': m.month, 'year': m.year}),
+]
+
+
+class _QueryCounter:
+    """Counts queries without keeping them, so there is no cap on the count."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _p95(values):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * 0.95) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the heaviest endpoints on a synthetic dataset (see generate_synthetic_data): wall time, "
+        "query count and peak memory per call. Compares with a JSON baseline and fails when query counts "
+        "or p95 latency exceed its budgets; --record writes the baseline instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help="Baseline JSON file.")
+        parser.add_argument('--record', action='store_true', help="Write the results as the new baseline.")
+        parser.add_argument('--repeat', type=int, help="Timed calls per endpoint (default 5, or the baseline's).")
+        parser.add_argument('--only', action='append', choices=[e[0] for e in ENDPOINTS],
+                            help="Only benchmark this endpoint; may be given more than once.")
+        parser.add_argument('--queries-only', action='store_true',
+                            help="Only check query counts, e.g. on hardware other than the baseline's.")
+        parser.add_argument('--warm', action='store_true',
+                            help="Keep caches between calls. By default every call starts with an empty cache.")
+        dataset = parser.add_argument_group("dataset (defaults to the baseline's)")
+        dataset.add_argument('--seed', type=int)
+        dataset.add_argument('--employees', type=int)
+        dataset.add_argument('--days', type=int)
+        dataset.add_argument('--until', type=date.fromisoformat)
+        dataset.add_argument('--generate', action='store_true', help="Generate the dataset if it is missing.")
+
+    def handle(self, *args, **options):
+        baseline = self._load_baseline(options['baseline'])
+        dataset = {
+            'seed': 0, 'employees': 200, 'days': 365,
+            'until': (date.today() - timedelta(days=1)).isoformat(),
+            **baseline.get('dataset', {}),
+        }
+        for name in ('seed', 'employees', 'days', 'until'):
+            if options[name] is not None:
+                dataset[name] = options[name].isoformat() if name == 'until' else options[name]
+        repeat = options['repeat'] or baseline.get('repeat', 5)
+        if repeat < 1:
+            raise CommandError("--repeat must be at least 1.")
+
+        company = self._dataset(dataset, options['generate'])
+        admin = UserRegister.objects.filter(company=company, role='admin').order_by('id').first()
+        # The employee with the most tasks makes the employee endpoints work hardest
+        employee = (
+            Employee.objects.filter(company=company, user__isnull=False)
+            .annotate(n=Count('task_assignments'))
+            .order_by('-n', 'id')
+            .select_related('user')
+            .first()
+        )
+        if admin is None or employee is None:
+            raise CommandError(f"Company {company.pk} needs an admin and an employee with a login.")
+        last_day = Attendance.objects.filter(company=company).order_by('-date').values_list('date', flat=True).first()
+        month = (last_day or date.fromisoformat(dataset['until'])).replace(day=1)
+
+        self.stdout.write(
+            f"Company {company.pk} ({company.name}), {repeat} call(s) per endpoint, "
+            f"{'warm' if options['warm'] else 'cold'} cache, month {month:%Y-%m}"
+        )
+        clients = {'admin': APIClient(), 'employee': APIClient()}
+        clients['admin'].force_authenticate(admin)
+        clients['employee'].force_authenticate(employee.user)
+
+        results = {}
+        for name, url_name, method, caller, params in ENDPOINTS:
+            if options['only'] and name not in options['only']:
+                continue
+            results[name] = self._measure(
+                clients[caller], method, reverse(url_name), params(month), repeat, options['warm']
+            )
+            self._print_result(name, results[name], baseline.get('endpoints', {}).get(name))
+
+        if options['record']:
+            self._write_baseline(options['baseline'], baseline, dataset, repeat, results)
+            return
+        failures = self._check(results, baseline, options['queries_only'])
+        if failures:
+            raise CommandError("Over budget:\n  " + "\n  ".join(failures))
+        self.stdout.write(self.style.SUCCESS("All endpoints within budget."))
+
+    def _load_baseline(self, path):
+        try:
+            with open(path) as fileobj:
+                return json.load(fileobj)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            raise CommandError(f"Baseline {path} is not valid JSON: {e}")
+
+    def _dataset(self, dataset, generate):
+        generator = SyntheticDataGenerator(
+            seed=dataset['seed'], employees=dataset['employees'], days=dataset['days'],
+            until=date.fromisoformat(dataset['until']), log=self.stdout.write,
+        )
+        company = generator.existing().first()
+        if company is None:
+            if not generate:
+                raise CommandError(
+                    f"No synthetic company for seed {dataset['seed']}. Run with --generate, or "
+                    f"generate_synthetic_data --seed {dataset['seed']} --employees {dataset['employees']} "
+                    f"--days {dataset['days']} --until {dataset['until']}."
+                )
+            generator.run()
+            company = generator.existing().get()
+        elif company.employees.count() != dataset['employees']:
+            self.stderr.write(self.style.WARNING(
+                f"Company {company.pk} has {company.employees.count()} employees, "
+                f"the dataset {dataset['employees']}: results are not comparable with the baseline."
+            ))
+        return company
+
+    def _call(self, client, method, path, params, warm):
+        """One call, rolled back so every call sees the same data. Returns (status, seconds, queries)."""
+        if not warm:
+            cache.clear()
+        counter = _QueryCounter()
+        with transaction.atomic(), connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            if method == 'get':
+                response = client.get(path, params)
+            else:
+                response = client.post(path, params, format='json')
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return response.status_code, elapsed, counter.count
+
+    def _measure(self, client, method, path, params, repeat, warm):
+        # Untimed first call: imports, URL resolution and other one-off work
+        self._call(client, method, path, params, warm)
+        statuses, timings, queries = set(), [], []
+        for _ in range(repeat):
+            status, elapsed, count = self._call(client, method, path, params, warm)
+            statuses.add(status)
+            timings.append(elapsed * 1000)
+            queries.append(count)
+
+        # Memory is traced in a call of its own: tracing slows the timed calls down
+        tracemalloc.start()
+        try:
+            self._call(client, method, path, params, warm)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'status': max(statuses),
+            'queries': max(queries),
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(_p95(timings), 2),
+            'peak_memory_kb': round(peak / 1024),
+        }
+
+    def _print_result(self, name, result, previous):
+        line = (
+            f"{name:<18} {result['status']:>3}  {result['queries']:>6} queries  "
+            f"p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+            f"peak {result['peak_memory_kb']:>7} KB"
+        )
+        if previous:
+            line += f"   (baseline {previous['queries']} queries, p95 {previous['p95_ms']:.2f} ms)"
+        self.stdout.write(line)
+
+    def _check(self, results, baseline, queries_only):
+        budgets = {**DEFAULT_BUDGETS, **baseline.get('budgets', {})}
+        recorded = baseline.get('endpoints', {})
+        failures = []
+        for name, result in results.items():
+            if result['status'] >= 400:
+                failures.append(f"{name}: status {result['status']}")
+            previous = recorded.get(name)
+            if not previous:
+                self.stderr.write(self.style.WARNING(f"{name}: not in the baseline, not checked."))
+                continue
+            allowed = previous['queries'] + budgets['extra_queries']
+            if result['queries'] > allowed:
+                failures.append(f"{name}: {result['queries']} queries, budget {allowed}")
+            allowed_ms = previous['p95_ms'] * (1 + budgets['p95_increase']) + budgets['p95_slack_ms']
+            if not queries_only and result['p95_ms'] > allowed_ms:
+                failures.append(f"{name}: p95 {result['p95_ms']:.2f} ms, budget {allowed_ms:.2f} ms")
+        return failures
+
+    def _write_baseline(self, path, baseline, dataset, repeat, results):
+        endpoints = {**baseline.get('endpoints', {}), **results}
+        data = {
+            'dataset': dataset,
+            'repeat': repeat,
+            'budgets': {**DEFAULT_BUDGETS, **baseline.get('budgets', {})},
+            'endpoints': {name: endpoints[name] for name in sorted(endpoints)},
+        }
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as fileobj:
+            json.dump(data, fileobj, indent=2)
+            fileobj.write('\n')
+        self.stdout.write(self.style.SUCCESS(f"Baseline written to {path}."))
@@ -0,0 +1,171 @@
+import re
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from app.leave_intervals import as_range
+from app.models import Attendance, BreakLog, CalendarEvent, Company, Employee, EmpLeave, Payroll
+from notifications.models import UserNotification
+
+# The indexes added for these queries (app 0036, notifications 0005)
+HOT_INDEXES = [
+    'attendance_company_date_idx',
+    'breaklog_employee_start_idx',
+    'breaklog_open_idx',
+    'calendarevent_company_date_idx',
+    'empleave_company_status_idx',
+    'empleave_employee_created_idx',
+    'payroll_company_date_idx',
+    'payroll_employee_latest_idx',
+    'notif_recipient_created_idx',
+    'notif_unread_idx',
+]
+TABLES = [
+    Attendance._meta.db_table,
+    BreakLog._meta.db_table,
+    CalendarEvent._meta.db_table,
+    EmpLeave._meta.db_table,
+    Payroll._meta.db_table,
+    UserNotification._meta.db_table,
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the query plans of the hot per-company queries (dashboards, attendance logs, "
+        "leave logs, breaks, notifications, payroll). With --compare, also plan them with "
+        "the hot-query indexes dropped, inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('company_id', type=int)
+        parser.add_argument('--analyze', action='store_true',
+                            help="Run the queries (EXPLAIN ANALYZE) and report their execution times.")
+        parser.add_argument('--compare', action='store_true',
+                            help="Also plan without the hot-query indexes. Holds exclusive locks on the "
+                                 "tables while it runs: use a copy of the data, not a live database.")
+        parser.add_argument('--summary', action='store_true', help="Only print the summary table.")
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company_id'])
+        except Company.DoesNotExist:
+            raise CommandError(f"Company {options['company_id']} does not exist.")
+        if connection.vendor != 'postgresql':
+            raise CommandError("Query plans are only compared on PostgreSQL.")
+
+        queries = self._queries(company)
+        # Fresh statistics, so the plans reflect the data as it is now (e.g. just seeded)
+        with connection.cursor() as cursor:
+            for table in TABLES:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+
+        after = self._explain(queries, options['analyze'])
+        before = None
+        if options['compare']:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for name in HOT_INDEXES:
+                        cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}')
+                before = self._explain(queries, options['analyze'])
+                transaction.set_rollback(True)
+
+        if not options['summary']:
+            for label, _ in queries:
+                if before is not None:
+                    self._print_plan(f"{label} (without indexes)", before[label])
+                self._print_plan(label, after[label])
+        self._print_summary(queries, before, after, options['analyze'])
+
+    def _queries(self, company):
+        """(label, queryset) for each hot query, shaped like the views that run it."""
+        today = timezone.localdate()
+        month_start = today.replace(day=1)
+        month_end = (month_start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        # The busiest employee and recipient give the most telling plans
+        employee = (
+            Employee.objects.filter(company=company)
+            .annotate(n=Count('attendances'))
+            .order_by('-n', 'id')
+            .first()
+        )
+        if employee is None:
+            raise CommandError(f"Company {company.pk} has no employees.")
+        recipient = (
+            Employee.objects.filter(company=company)
+            .annotate(n=Count('notifications'))
+            .order_by('-n', 'id')
+            .first()
+        )
+        day_start = timezone.make_aware(datetime.combine(month_start, time.min))
+
+        return [
+            ("Attendance: company day snapshot",
+             Attendance.objects.filter(company=company, date=today, is_present=True).values('id')),
+            ("Attendance: company month log",
+             Attendance.objects.filter(company=company, date__range=(month_start, month_end))),
+            ("Attendance: employee month",
+             Attendance.objects.filter(employee=employee, date__range=(month_start, today))),
+            ("Leaves: pending count",
+             EmpLeave.objects.filter(company=company, status='Pending').values('id')),
+            ("Leaves: approved log",
+             EmpLeave.objects.filter(company=company, status='Approved', from_date__gte=month_start)),
+            ("Leaves: on leave today",
+             EmpLeave.objects.filter(company=company, status='Approved', period__contains=today).values('id')),
+            ("Leaves: company coverage",
+             EmpLeave.objects.filter(company=company, status='Approved',
+                                     period__overlap=as_range(month_start, today))),
+            ("Leaves: employee's own",
+             EmpLeave.objects.filter(employee=employee).order_by('-created_at')),
+            ("Breaks: open break",
+             BreakLog.objects.filter(employee=employee, end__isnull=True)[:1]),
+            ("Breaks: employee month",
+             BreakLog.objects.filter(employee=employee, end__isnull=False, start__gte=day_start)),
+            ("Notifications: unread stream",
+             UserNotification.objects.filter(recipient=recipient, id__gt=0, read=False).order_by('id')),
+            ("Notifications: list",
+             UserNotification.objects.filter(recipient=recipient).order_by('-created_at')[:50]),
+            ("Payroll: company list",
+             Payroll.objects.filter(company=company).order_by('-payroll_date')[:50]),
+            ("Payroll: latest of employee",
+             Payroll.objects.filter(employee=employee).order_by('-payroll_date', '-id')[:1]),
+            ("Calendar: company month",
+             CalendarEvent.objects.filter(company=company, date__range=(month_start, month_end))),
+        ]
+
+    def _explain(self, queries, analyze):
+        options = {'analyze': True, 'buffers': True} if analyze else {}
+        return {label: queryset.explain(**options) for label, queryset in queries}
+
+    def _print_plan(self, label, plan):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(plan)
+        self.stdout.write('')
+
+    def _print_summary(self, queries, before, after, analyze):
+        self.stdout.write(self.style.MIGRATE_HEADING("Summary"))
+        for label, _ in queries:
+            line = f"{label:<34} {_access(after[label]):<56}"
+            if analyze:
+                line += f" {_execution_ms(after[label]):>9.3f} ms"
+            if before is not None:
+                line += f"   without: {_access(before[label]):<56}"
+                if analyze:
+                    line += f" {_execution_ms(before[label]):>9.3f} ms"
+            self.stdout.write(line)
+
+
+def _access(plan):
+    """How the plan reaches the rows: the first index it uses, or a sequential scan."""
+    match = re.search(r'(Index Only Scan|Index Scan|Bitmap Index Scan)(?: Backward)? (?:using|on) (\w+)', plan)
+    if match:
+        return f"{match.group(1)} {match.group(2)}"
+    return 'Seq Scan' if 'Seq Scan' in plan else plan.splitlines()[0].split('  ')[0].strip()
+
+
+def _execution_ms(plan):
+    match = re.search(r'Execution Time: ([\d.]+) ms', plan)
+    return float(match.group(1)) if match else 0.0
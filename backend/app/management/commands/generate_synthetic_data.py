@@ -0,0 +1,57 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.synthetic_data import SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic companies for load and performance testing: configuration, an org chart "
+        "of employees, and a history of attendance with breaks, leaves, tasks, notifications and "
+        "payroll. The output depends only on the options, so pass --until to reproduce a dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=1)
+        parser.add_argument('--employees', type=int, default=200, help="Employees per company.")
+        parser.add_argument('--departments', type=int, default=5, help="Departments per company.")
+        parser.add_argument('--days', type=int, default=365, help="Days of history to generate.")
+        parser.add_argument('--until', type=date.fromisoformat,
+                            help="Last day of history, YYYY-MM-DD. Defaults to yesterday.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--tasks-per-manager', type=int, default=6)
+        parser.add_argument('--notifications-per-employee', type=int, default=40, help="Per year of history.")
+        parser.add_argument('--password', help="Password of every generated user. Without one they cannot log in.")
+
+    def handle(self, *args, **options):
+        for name in ('companies', 'employees', 'departments', 'days'):
+            if options[name] < 1:
+                raise CommandError(f"--{name} must be at least 1.")
+
+        generator = SyntheticDataGenerator(
+            seed=options['seed'],
+            companies=options['companies'],
+            employees=options['employees'],
+            departments=options['departments'],
+            days=options['days'],
+            until=options['until'],
+            tasks_per_manager=options['tasks_per_manager'],
+            notifications_per_employee=options['notifications_per_employee'],
+            password=options['password'],
+            log=self.stdout.write,
+        )
+        existing = list(generator.existing().values_list('pk', flat=True))
+        if existing:
+            raise CommandError(
+                f"Seed {options['seed']} was already generated (companies {existing}). Use another --seed."
+            )
+
+        self.stdout.write(
+            f"Generating {options['companies']} company(ies) of {options['employees']} employees, "
+            f"{generator.since} to {generator.until}, seed {options['seed']}"
+        )
+        counts = generator.run()
+        for model, count in sorted(counts.items()):
+            self.stdout.write(f"{model:<40} {count:>10}")
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.employee_import import EmployeeImporter, ImportFileError, iter_import_rows
+from app.models import Company
+
+
+class Command(BaseCommand):
+    help = "Bulk import employees for a company from a CSV or XLSX file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('company_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--no-email', action='store_true', help="Do not send welcome emails.")
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company_id'])
+        except Company.DoesNotExist:
+            raise CommandError(f"Company {options['company_id']} does not exist.")
+
+        importer = EmployeeImporter(
+            company,
+            chunk_size=options['chunk_size'],
+            send_emails=not options['no_email'],
+        )
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                report = importer.run(iter_import_rows(fileobj, options['path']))
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']} ({error['email']}): {error['errors']}")
+        if report['file_error']:
+            self.stderr.write(f"Stopped reading file: {report['file_error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {report['total_rows']} rows: {report['created']} created, {report['failed']} failed."
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app import org_hierarchy
+from app.models import Company
+
+
+class Command(BaseCommand):
+    help = "Rebuild the reporting hierarchy index (EmployeeHierarchy) from Employee.reporting_manager."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Only rebuild this company.")
+
+    def handle(self, *args, **options):
+        company_id = options['company']
+        if company_id and not Company.objects.filter(pk=company_id).exists():
+            raise CommandError(f"Company {company_id} does not exist.")
+
+        rows, cut = org_hierarchy.rebuild(company_id)
+        if cut:
+            self.stdout.write(self.style.WARNING(
+                f"Broke {len(cut)} reporting loop(s) by clearing the reporting manager of employees {cut}."
+            ))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} hierarchy rows."))
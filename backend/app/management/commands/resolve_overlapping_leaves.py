@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.leave_intervals import overlap_conflicts
+from app.leave_ledger import sync_leaves
+from app.models import Company, EmpLeave
+
+
+def _describe(leave):
+    return f"leave {leave.id} ({leave.status}, {leave.from_date} to {leave.to_date})"
+
+
+class Command(BaseCommand):
+    help = (
+        "List pending or approved leaves that overlap another leave of the same employee. "
+        "With --apply, cancel them and credit their days back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Only check this company.")
+        parser.add_argument(
+            '--apply', action='store_true',
+            help="Cancel the listed leaves. Without it nothing is changed.",
+        )
+
+    def handle(self, *args, **options):
+        company_id = options['company']
+        if company_id and not Company.objects.filter(pk=company_id).exists():
+            raise CommandError(f"Company {company_id} does not exist.")
+
+        # Only the columns that exist before the period migration
+        leaves = EmpLeave.objects.filter(status__in=EmpLeave.ACTIVE_STATUSES).only(
+            'id', 'company', 'employee', 'leave_type', 'status', 'from_date', 'to_date',
+        )
+        if company_id:
+            leaves = leaves.filter(company_id=company_id)
+        conflicts = overlap_conflicts(leaves)
+        if not conflicts:
+            self.stdout.write(self.style.SUCCESS("No overlapping leaves."))
+            return
+
+        for leave, kept in conflicts:
+            self.stdout.write(f"Employee {leave.employee_id}: {_describe(leave)} overlaps {_describe(kept)}")
+        if not options['apply']:
+            self.stdout.write(self.style.WARNING(
+                f"Dry run: {len(conflicts)} leave(s) would be cancelled. Re-run with --apply to cancel them."
+            ))
+            return
+
+        cancelled = [leave for leave, _ in conflicts]
+        with transaction.atomic():
+            EmpLeave.objects.filter(id__in=[leave.id for leave in cancelled]).update(status='Cancelled')
+            for leave in cancelled:
+                leave.status = 'Cancelled'
+            # Approved ones get their days credited back
+            sync_leaves(cancelled)
+        self.stdout.write(self.style.SUCCESS(f"Cancelled {len(cancelled)} leave(s)."))
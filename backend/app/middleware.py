@@ -0,0 +1,52 @@
+import logging
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles every request when PROFILING['ENABLED'] is set (see app.profiling);
+    otherwise Django drops it at startup. Keep it first in MIDDLEWARE so the
+    total covers the other middleware too.
+    """
+
+    def __init__(self, get_response):
+        if not profiling.conf('ENABLED'):
+            raise MiddlewareNotUsed
+        profiling.patch_serializers()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with profiling.sampled_cprofile() as profiler:
+            with profiling.profiling() as profile, connection.execute_wrapper(profile):
+                response = self.get_response(request)
+
+        match = request.resolver_match
+        route = f"{request.method} {match.view_name if match else '<unresolved>'}"
+        total_ms = profile.total * 1000
+        slow = total_ms >= profiling.conf('SLOW_REQUEST_MS')
+        dumped = None
+        if slow and profiler is not None:
+            dumped = profiling.dump_profile(profiler, route, total_ms)
+        profiling.registry.record(route, profile, slow=slow, dumped=dumped is not None)
+
+        duplicates = profile.duplicates()
+        if duplicates:
+            sql, count = duplicates[0]
+            logger.warning(
+                "Likely N+1 in %s: %d statements repeated, worst %d times: %s",
+                route, len(duplicates), count, sql[:300],
+            )
+        if slow:
+            logger.warning(
+                "Slow request %s: %.0f ms, %d queries in %.0f ms%s",
+                route, total_ms, profile.queries, profile.db_time * 1000,
+                f", profile in {dumped}" if dumped else "",
+            )
+        response['Server-Timing'] = profile.server_timing()
+        return response
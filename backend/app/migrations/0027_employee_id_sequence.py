@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0026_generatedletter_email_sent_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeIdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='employee',
+            name='employee_id',
+            field=models.CharField(max_length=10, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='employee',
+            constraint=models.UniqueConstraint(fields=('company', 'employee_id'), name='unique_employee_id_per_company'),
+        ),
+        migrations.AddField(
+            model_name='employeeidsequence',
+            name='company',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='employee_id_sequence', to='app.company'),
+        ),
+    ]
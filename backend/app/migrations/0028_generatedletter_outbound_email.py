@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-19 19:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0027_employee_id_sequence'),
+        ('notifications', '0004_outbound_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedletter',
+            name='outbound_email',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='letters', to='notifications.outboundemail'),
+        ),
+    ]
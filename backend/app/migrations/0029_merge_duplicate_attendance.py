@@ -0,0 +1,88 @@
+import logging
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+
+def _durations(check_in, check_out, total_breaks, shift):
+    # Attendance.compute_durations, which historical models do not have
+    work_time = (check_out - check_in) - total_breaks
+    if shift:
+        standard = timedelta(hours=round(shift.full_day.total_seconds() / 3600, 2) if shift.full_day else 8.0)
+        return work_time, max(work_time - standard, timedelta())
+    return work_time, timedelta()
+
+
+def merge_duplicate_attendance(apps, schema_editor):
+    """
+    Collapse duplicate (employee, date) attendance rows left by concurrent check-ins
+    into the oldest row, keeping the earliest check-in and latest check-out.
+
+    The other rows' break logs move to the kept row, their shift, leave, break
+    time and remarks fill in what it lacks, and its work and overtime durations
+    are recomputed from the merged punches and breaks. Lateness is not stored;
+    it follows from the kept check-in and shift.
+    """
+    Attendance = apps.get_model('app', 'Attendance')
+    BreakLog = apps.get_model('app', 'BreakLog')
+
+    duplicates = (
+        Attendance.objects.values('employee_id', 'date')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates:
+        rows = list(
+            Attendance.objects.select_related('shift')
+            .filter(employee_id=dup['employee_id'], date=dup['date']).order_by('id')
+        )
+        keep, extra = rows[0], rows[1:]
+        check_ins = [r.check_in for r in rows if r.check_in]
+        check_outs = [r.check_out for r in rows if r.check_out]
+        keep.check_in = min(check_ins) if check_ins else None
+        keep.check_out = max(check_outs) if check_outs else None
+        if not keep.shift_id:
+            keep.shift = next((r.shift for r in extra if r.shift_id), None)
+        keep.leave_id = keep.leave_id or next((r.leave_id for r in extra if r.leave_id), None)
+        keep.total_break_time = keep.total_break_time or next(
+            (r.total_break_time for r in extra if r.total_break_time), None
+        )
+        keep.is_present = any(r.is_present for r in rows)
+        remarks = [r.remarks for r in rows if r.remarks]
+        keep.remarks = '\n'.join(dict.fromkeys(remarks)) or None
+
+        extra_ids = [r.id for r in extra]
+        BreakLog.objects.filter(attendance_id__in=extra_ids).update(attendance_id=keep.id)
+
+        total_breaks = sum(
+            (b.end - b.start for b in BreakLog.objects.filter(attendance_id=keep.id) if b.start and b.end),
+            timedelta(),
+        )
+        if keep.check_in and keep.check_out:
+            keep.total_work_duration, keep.overtime_duration = _durations(
+                keep.check_in, keep.check_out, total_breaks, keep.shift
+            )
+        else:
+            keep.total_work_duration = keep.overtime_duration = None
+        keep.save()
+
+        logger.info(
+            "Merged attendance %s into %s for employee %s on %s",
+            extra_ids, keep.id, dup['employee_id'], dup['date'],
+        )
+        Attendance.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0028_lettertemplate_updated_at'),
+    ]
+
+    operations = [
+        # Merged rows cannot be split again; reversing leaves them merged
+        migrations.RunPython(merge_duplicate_attendance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0029_merge_duplicate_attendance'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('employee', 'date'), name='unique_attendance_per_employee_day'),
+        ),
+    ]
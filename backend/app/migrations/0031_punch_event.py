@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0030_attendance_unique_employee_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PunchEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(max_length=100)),
+                ('client_event_id', models.CharField(max_length=64)),
+                ('event_type', models.CharField(choices=[('check_in', 'Check In'), ('check_out', 'Check Out'), ('break_start', 'Break Start'), ('break_end', 'Break End')], max_length=20)),
+                ('occurred_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('applied', 'Applied'), ('ignored', 'Ignored'), ('rejected', 'Rejected')], max_length=20)),
+                ('detail', models.CharField(blank=True, max_length=255)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('attendance', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='punch_events', to='app.attendance')),
+                ('break_config', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.breakconfig')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='punch_events', to='app.company')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='punch_events', to='app.employee')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('employee', 'client_event_id'), name='unique_punch_event_per_employee')],
+            },
+        ),
+    ]
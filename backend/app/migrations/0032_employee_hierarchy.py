@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_hierarchy(apps, schema_editor):
+    """
+    Fill the closure table from reporting_manager. Reporting loops are broken
+    first: in each loop, the member with the lowest id loses its manager.
+    """
+    Employee = apps.get_model('app', 'Employee')
+    EmployeeHierarchy = apps.get_model('app', 'EmployeeHierarchy')
+    quote = schema_editor.connection.ops.quote_name
+    hierarchy = quote(EmployeeHierarchy._meta.db_table)
+    employee = quote(Employee._meta.db_table)
+    schema_editor.execute(f"""
+        WITH RECURSIVE walk(start_id, current_id, path) AS (
+            SELECT id, reporting_manager_id, ARRAY[id] FROM {employee} WHERE reporting_manager_id IS NOT NULL
+            UNION ALL
+            SELECT w.start_id, e.reporting_manager_id, w.path || e.id
+            FROM walk w
+            JOIN {employee} e ON e.id = w.current_id
+            WHERE e.reporting_manager_id IS NOT NULL AND NOT e.id = ANY(w.path)
+        )
+        UPDATE {employee} SET reporting_manager_id = NULL
+        WHERE id IN (
+            SELECT start_id FROM walk
+            WHERE current_id = start_id AND start_id = (SELECT min(member) FROM unnest(path) AS member)
+        )
+    """)
+    schema_editor.execute(f"""
+        WITH RECURSIVE chain(ancestor_id, descendant_id, depth, path) AS (
+            SELECT id, id, 0, ARRAY[id] FROM {employee}
+            UNION ALL
+            SELECT e.reporting_manager_id, c.descendant_id, c.depth + 1, c.path || e.reporting_manager_id
+            FROM chain c
+            JOIN {employee} e ON e.id = c.ancestor_id
+            WHERE e.reporting_manager_id IS NOT NULL AND NOT e.reporting_manager_id = ANY(c.path)
+        )
+        INSERT INTO {hierarchy} (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, depth FROM chain
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0031_punch_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeHierarchy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hierarchy_descendants', to='app.employee')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hierarchy_ancestors', to='app.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='hierarchy_ancestor_depth_idx'), models.Index(fields=['descendant', 'depth'], name='hierarchy_descendant_depth_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_hierarchy_pair')],
+            },
+        ),
+        migrations.RunPython(build_hierarchy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:54
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import migrations, models
+
+
+def _days_by_year(from_date, to_date):
+    days = {}
+    start = from_date
+    while start <= to_date:
+        year_end = min(date(start.year, 12, 31), to_date)
+        days[start.year] = (year_end - start).days + 1
+        start = year_end + timedelta(days=1)
+    return days
+
+
+def backfill_ledger(apps, schema_editor):
+    """Open balances for every approved leave, with its accrual and debit entries."""
+    EmpLeave = apps.get_model('app', 'EmpLeave')
+    LeaveBalance = apps.get_model('app', 'LeaveBalance')
+    LeaveLedgerEntry = apps.get_model('app', 'LeaveLedgerEntry')
+
+    used = defaultdict(int)
+    allowance = {}
+    entries = []
+    leaves = (
+        EmpLeave.objects.filter(status='Approved', leave_type__isnull=False)
+        .select_related('employee', 'leave_type')
+        .order_by('id')
+    )
+    for leave in leaves:
+        for year, days in _days_by_year(leave.from_date, leave.to_date).items():
+            key = (leave.employee_id, leave.leave_type_id, year)
+            used[key] += days
+            allowance[key] = (leave.employee.company_id, leave.leave_type.count)
+            entries.append(LeaveLedgerEntry(
+                company_id=leave.employee.company_id,
+                employee_id=leave.employee_id,
+                leave_type_id=leave.leave_type_id,
+                year=year,
+                entry_type='debit',
+                days=-days,
+                emp_leave_id=leave.id,
+                note=f"Leave {leave.from_date} to {leave.to_date} approved",
+            ))
+
+    accruals = []
+    balances = []
+    for (employee_id, leave_type_id, year), days in used.items():
+        company_id, count = allowance[(employee_id, leave_type_id, year)]
+        balances.append(LeaveBalance(
+            company_id=company_id, employee_id=employee_id, leave_type_id=leave_type_id,
+            year=year, accrued=count, used=days,
+        ))
+        if count:
+            accruals.append(LeaveLedgerEntry(
+                company_id=company_id, employee_id=employee_id, leave_type_id=leave_type_id,
+                year=year, entry_type='accrual', days=count, note='Yearly allowance',
+            ))
+    LeaveBalance.objects.bulk_create(balances, batch_size=1000)
+    LeaveLedgerEntry.objects.bulk_create(accruals + entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0032_employee_hierarchy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('accrued', models.IntegerField(default=0)),
+                ('used', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.company')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_balances', to='app.employee')),
+                ('leave_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='app.leave')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('employee', 'leave_type', 'year'), name='unique_leave_balance')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaveLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('entry_type', models.CharField(choices=[('accrual', 'Accrual'), ('debit', 'Debit'), ('credit', 'Credit'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('days', models.IntegerField()),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.company')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('emp_leave', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='app.empleave')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_ledger', to='app.employee')),
+                ('leave_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='app.leave')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['employee', 'leave_type', 'year'], name='leave_ledger_balance_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:56
+
+from collections import defaultdict
+
+from django.db import migrations
+
+# Conflicts listed in the error before it is cut short
+REPORT_LIMIT = 20
+
+
+def refuse_overlapping_leaves(apps, schema_editor):
+    """
+    Existing data may hold overlapping active leaves, which the constraint
+    added next rejects. Rather than pick which ones to cancel here, list them
+    and stop; `manage.py resolve_overlapping_leaves` reports and resolves them.
+    (The migration keeps its name so databases that ran it stay consistent.)
+    """
+    EmpLeave = apps.get_model('app', 'EmpLeave')
+
+    by_employee = defaultdict(list)
+    leaves = EmpLeave.objects.filter(status__in=['Pending', 'Approved']).order_by('employee_id', 'from_date', 'id')
+    for leave in leaves:
+        by_employee[leave.employee_id].append(leave)
+
+    conflicts = []
+    for employee_id, employee_leaves in by_employee.items():
+        for i, leave in enumerate(employee_leaves):
+            start, end = sorted((leave.from_date, leave.to_date))
+            for other in employee_leaves[i + 1:]:
+                other_start, other_end = sorted((other.from_date, other.to_date))
+                if start <= other_end and other_start <= end:
+                    conflicts.append(
+                        f"employee {employee_id}: leave {leave.id} ({leave.status}, {leave.from_date} to "
+                        f"{leave.to_date}) and leave {other.id} ({other.status}, {other.from_date} to {other.to_date})"
+                    )
+    if not conflicts:
+        return
+
+    listed = '\n  '.join(conflicts[:REPORT_LIMIT])
+    more = f"\n  ... and {len(conflicts) - REPORT_LIMIT} more" if len(conflicts) > REPORT_LIMIT else ''
+    raise RuntimeError(
+        f"{len(conflicts)} pair(s) of pending or approved leaves overlap:\n  {listed}{more}\n"
+        "Review them with 'manage.py resolve_overlapping_leaves', resolve them (by hand or with its "
+        "--apply option), then run migrate again."
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0033_leave_ledger'),
+    ]
+
+    operations = [
+        # Only reads; nothing to undo
+        migrations.RunPython(refuse_overlapping_leaves, migrations.RunPython.noop),
+    ]
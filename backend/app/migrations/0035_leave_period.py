@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:56
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0034_cancel_overlapping_leaves'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.AddField(
+            model_name='empleave',
+            name='period',
+            field=models.GeneratedField(db_persist=True, expression=models.Func(django.db.models.functions.comparison.Least('from_date', 'to_date'), django.db.models.functions.comparison.Greatest('from_date', 'to_date'), models.Value('[]'), function='daterange'), output_field=django.contrib.postgres.fields.ranges.DateRangeField()),
+        ),
+        migrations.AddIndex(
+            model_name='empleave',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['period'], name='empleave_period_gist'),
+        ),
+        migrations.AddConstraint(
+            model_name='empleave',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status__in', ['Pending', 'Approved'])), expressions=[('employee', '='), ('period', '&&')], name='empleave_no_overlap'),
+        ),
+    ]
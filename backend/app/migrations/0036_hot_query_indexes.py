@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:26
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Built without locking out writes on the busy tables
+    atomic = False
+
+    dependencies = [
+        ('app', '0035_leave_period'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='attendance',
+            index=models.Index(fields=['company', 'date'], name='attendance_company_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='breaklog',
+            index=models.Index(fields=['employee', 'start'], name='breaklog_employee_start_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='breaklog',
+            index=models.Index(condition=models.Q(('end__isnull', True)), fields=['employee'], name='breaklog_open_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='calendarevent',
+            index=models.Index(fields=['company', 'date'], name='calendarevent_company_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='empleave',
+            index=models.Index(fields=['company', 'status', 'from_date'], name='empleave_company_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='empleave',
+            index=models.Index(fields=['employee', '-created_at'], name='empleave_employee_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payroll',
+            index=models.Index(fields=['company', '-payroll_date'], name='payroll_company_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payroll',
+            index=models.Index(fields=['employee', '-payroll_date', '-id'], name='payroll_employee_latest_idx'),
+        ),
+    ]
@@ -1,8 +1,13 @@
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
 from datetime import timedelta
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateRangeField, RangeOperators
+from django.contrib.postgres.indexes import GistIndex
+from django.db.models import Func, Q, Value
+from django.db.models.functions import Greatest, Least
 
 
 
@@ -45,8 +50,7 @@ class UserRegister(AbstractUser):
 
     @property
     def is_reporting_manager(self):
-        emp = self.employee_profile
-        return emp and emp.reportees.exists()
+        return EmployeeHierarchy.objects.filter(ancestor__user=self, depth=1).exists()
 
     def __str__(self):
         return self.username
@@ -103,7 +107,7 @@ class Employee(models.Model):
     )
     reporting_level = models.ForeignKey(Level,on_delete=models.SET_NULL,null=True,blank=True,related_name='reporting_level')
     
-    employee_id = models.CharField(max_length=10, unique=True, null=True)
+    employee_id = models.CharField(max_length=10, null=True)
 
     # Basic info
     first_name = models.CharField(max_length=100, null=True)
@@ -194,14 +198,107 @@ class Employee(models.Model):
 
     @property
     def is_reporting_manager(self):
-        return self.employees_reporting_to_me.exists()
+        return EmployeeHierarchy.objects.filter(ancestor=self, depth=1).exists()
 
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'employee_id'], name='unique_employee_id_per_company'),
+        ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
+
+
+class EmployeeIdSequence(models.Model):
+    """
+    Per-company counter behind the `EMP-xxxx` employee ids.
+    Use `reserve()` rather than reading and bumping `last_value` yourself.
+    """
+    PREFIX = 'EMP-'
+
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, related_name='employee_id_sequence')
+    last_value = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def format_id(cls, value):
+        return f'{cls.PREFIX}{value:04d}'
+
+    @classmethod
+    def reserve(cls, company_id, count=1):
+        """
+        Reserve `count` consecutive employee ids for a company and return them.
+
+        The counter is bumped with a single UPDATE ... RETURNING, so concurrent
+        callers each get their own range. The row stays locked until the caller's
+        transaction ends; reserve outside long transactions where possible.
+        Ids reserved by a transaction that later rolls back are simply skipped.
+        """
+        if count < 1:
+            return []
+        last_value = cls._bump(company_id, count)
+        if last_value is None:
+            # First allocation for this company: seed from ids already in use
+            try:
+                with transaction.atomic():
+                    cls.objects.create(company_id=company_id, last_value=cls._highest_used(company_id))
+            except IntegrityError:
+                pass  # another request created it first
+            last_value = cls._bump(company_id, count)
+        return [cls.format_id(value) for value in range(last_value - count + 1, last_value + 1)]
+
+    @classmethod
+    def _bump(cls, company_id, count):
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET last_value = last_value + %s WHERE company_id = %s RETURNING last_value",
+                [count, company_id],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    @classmethod
+    def _highest_used(cls, company_id):
+        highest = 0
+        employee_ids = Employee.objects.filter(
+            company_id=company_id, employee_id__startswith=cls.PREFIX
+        ).values_list('employee_id', flat=True)
+        for employee_id in employee_ids:
+            suffix = employee_id[len(cls.PREFIX):]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest
+
+    def __str__(self):
+        return f"{self.company} - {self.format_id(self.last_value)}"
+
+
+class EmployeeHierarchy(models.Model):
+    """
+    Closure table over Employee.reporting_manager: one row for every
+    (manager, report) pair at any distance, plus a depth-0 row per employee.
+    Maintained by app.org_hierarchy; do not write to it directly.
+    """
+    ancestor = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='hierarchy_descendants')
+    descendant = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='hierarchy_ancestors')
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_hierarchy_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['ancestor', 'depth'], name='hierarchy_ancestor_depth_idx'),
+            models.Index(fields=['descendant', 'depth'], name='hierarchy_descendant_depth_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
     
 class RelievedEmployee(models.Model):
     employee = models.OneToOneField(Employee, on_delete=models.SET_NULL, null=True, blank=True, related_name='relieved_info')
@@ -288,12 +385,97 @@ class EmpLeave(models.Model):
     reason = models.TextField(blank=True, null=True)
     from_date = models.DateField()
     to_date = models.DateField()
+    # Inclusive [from_date, to_date], kept by the database for range queries
+    period = models.GeneratedField(
+        expression=Func(
+            Least('from_date', 'to_date'),
+            Greatest('from_date', 'to_date'),
+            Value('[]'),
+            function='daterange',
+        ),
+        output_field=DateRangeField(),
+        db_persist=True,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Statuses that hold the dates; an employee cannot have two of these overlap
+    ACTIVE_STATUSES = ('Pending', 'Approved')
+
+    class Meta:
+        indexes = [
+            GistIndex(fields=['period'], name='empleave_period_gist'),
+            # Pending counts and the approved/rejected leave logs
+            models.Index(fields=['company', 'status', 'from_date'], name='empleave_company_status_idx'),
+            # An employee's own leaves, newest first
+            models.Index(fields=['employee', '-created_at'], name='empleave_employee_created_idx'),
+        ]
+        constraints = [
+            ExclusionConstraint(
+                name='empleave_no_overlap',
+                expressions=[('employee', RangeOperators.EQUAL), ('period', RangeOperators.OVERLAPS)],
+                condition=Q(status__in=['Pending', 'Approved']),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.employee} Leave: {self.leave_type} ({self.status})"
 
 
+class LeaveLedgerEntry(models.Model):
+    """
+    Append-only history of leave days per employee, leave type and year.
+    Positive `days` add to what the employee can take, negative ones use it up.
+    Written through app.leave_ledger together with the matching LeaveBalance.
+    """
+    ENTRY_TYPES = [
+        ('accrual', 'Accrual'),
+        ('debit', 'Debit'),
+        ('credit', 'Credit'),
+        ('adjustment', 'Adjustment'),
+    ]
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='leave_ledger')
+    leave_type = models.ForeignKey(Leave, on_delete=models.CASCADE, related_name='ledger_entries')
+    year = models.PositiveSmallIntegerField()
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    days = models.IntegerField()
+    emp_leave = models.ForeignKey(EmpLeave, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    note = models.CharField(max_length=255, blank=True)
+    created_by = models.ForeignKey(UserRegister, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['employee', 'leave_type', 'year'], name='leave_ledger_balance_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} {self.leave_type} {self.year}: {self.entry_type} {self.days:+d}"
+
+
+class LeaveBalance(models.Model):
+    """Running totals of the ledger for one employee, leave type and year."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='leave_balances')
+    leave_type = models.ForeignKey(Leave, on_delete=models.CASCADE, related_name='balances')
+    year = models.PositiveSmallIntegerField()
+    accrued = models.IntegerField(default=0)
+    used = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'leave_type', 'year'], name='unique_leave_balance'),
+        ]
+
+    @property
+    def remaining(self):
+        return max(self.accrued - self.used, 0)
+
+    def __str__(self):
+        return f"{self.employee} {self.leave_type} {self.year}: {self.used}/{self.accrued}"
+
+
 class LearningCorner(models.Model):
     title = models.CharField(max_length=255, null=True)
     description = models.TextField(null=True)
@@ -350,6 +532,25 @@ class DepartmentWiseWorkingDays(models.Model):
         shifts_display = ", ".join(str(s) for s in self.shifts.all()) if self.shifts.exists() else "All"
         return f"{self.department} - {shifts_display} ({self.week_start_day} to {self.week_end_day})"
 
+    WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+    @classmethod
+    def weekdays_of(cls, config):
+        """
+        Working weekdays (0 = Monday) for a department's configuration, wrapping
+        around the week when it starts later than it ends. Monday-Friday without one.
+        """
+        if config is None:
+            return frozenset(range(5))
+        try:
+            start_idx = cls.WEEKDAYS.index(config.week_start_day.strip().lower())
+            end_idx = cls.WEEKDAYS.index(config.week_end_day.strip().lower())
+        except ValueError:
+            return frozenset(range(5))
+        if start_idx <= end_idx:
+            return frozenset(range(start_idx, end_idx + 1))
+        return frozenset(list(range(start_idx, 7)) + list(range(0, end_idx + 1)))
+
     class Meta:
         verbose_name_plural = "Department Wise Working Days"
         
@@ -367,6 +568,9 @@ class CalendarEvent(models.Model):
 
     class Meta:
         ordering = ['date']
+        indexes = [
+            models.Index(fields=['company', 'date'], name='calendarevent_company_date_idx'),
+        ]
         
         
 class SalaryStructure(models.Model):
@@ -440,6 +644,13 @@ class Payroll(models.Model):
     other_deductions = models.JSONField(null=True, blank=True)
 
     payroll_date = models.DateField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', '-payroll_date'], name='payroll_company_date_idx'),
+            # Latest payroll of an employee (dashboard)
+            models.Index(fields=['employee', '-payroll_date', '-id'], name='payroll_employee_latest_idx'),
+        ]
     
     def __str__(self):
         return f"{self.employee} - {self.batch}"
@@ -472,6 +683,16 @@ class Attendance(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # One row per employee per day; punches upsert against it
+            models.UniqueConstraint(fields=['employee', 'date'], name='unique_attendance_per_employee_day'),
+        ]
+        indexes = [
+            # Company-wide day and month views; per-employee lookups use the unique constraint
+            models.Index(fields=['company', 'date'], name='attendance_company_date_idx'),
+        ]
+
     def calculate_work_duration(self):
         if self.check_in and self.check_out:
          
@@ -483,16 +704,20 @@ class Attendance(models.Model):
             else:
                 total_breaks = timezone.timedelta()  # Default to zero if no breaks
             
-            work_time = (self.check_out - self.check_in) - total_breaks
-            self.total_work_duration = work_time
-
-            if self.shift:
-                standard = timezone.timedelta(hours=self.shift.full_day_hours())
-                self.overtime_duration = max(work_time - standard, timezone.timedelta())
-            else:
-                self.overtime_duration = timezone.timedelta()
+            self.total_work_duration, self.overtime_duration = self.compute_durations(
+                self.check_in, self.check_out, total_breaks, self.shift
+            )
             self.save()
 
+    @staticmethod
+    def compute_durations(check_in, check_out, total_breaks, shift):
+        """Return (work duration, overtime) for a day; overtime is measured against the shift's full day."""
+        work_time = (check_out - check_in) - total_breaks
+        if shift:
+            standard = timezone.timedelta(hours=shift.full_day_hours())
+            return work_time, max(work_time - standard, timezone.timedelta())
+        return work_time, timezone.timedelta()
+
 class BreakConfig(models.Model):
     BREAK_CHOICES = [
         ('dont_disturb', "Don't Disturb"),
@@ -519,9 +744,54 @@ class BreakLog(models.Model):
     end = models.DateTimeField(null=True, blank=True)
     duration_minutes = models.PositiveIntegerField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['employee', 'start'], name='breaklog_employee_start_idx'),
+            # The open break of an employee; only a handful of rows at any time
+            models.Index(fields=['employee'], condition=Q(end__isnull=True), name='breaklog_open_idx'),
+        ]
+
     def __str__(self):
         return f"{self.employee} - {self.break_config} ({self.start} - {self.end})"
 
+
+class PunchEvent(models.Model):
+    """
+    A check-in/out or break punch recorded by a mobile app or kiosk, possibly offline,
+    and synced later. `client_event_id` is set by the device and makes replays idempotent.
+    """
+    EVENT_TYPES = [
+        ('check_in', 'Check In'),
+        ('check_out', 'Check Out'),
+        ('break_start', 'Break Start'),
+        ('break_end', 'Break End'),
+    ]
+    STATUS_CHOICES = [
+        ('applied', 'Applied'),
+        ('ignored', 'Ignored'),
+        ('rejected', 'Rejected'),
+    ]
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='punch_events')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='punch_events')
+    device_id = models.CharField(max_length=100)
+    client_event_id = models.CharField(max_length=64)
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+    occurred_at = models.DateTimeField()
+    break_config = models.ForeignKey(BreakConfig, on_delete=models.SET_NULL, null=True, blank=True)
+    attendance = models.ForeignKey('Attendance', on_delete=models.SET_NULL, null=True, blank=True, related_name='punch_events')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    detail = models.CharField(max_length=255, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'client_event_id'], name='unique_punch_event_per_employee'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} - {self.event_type} at {self.occurred_at} ({self.status})"
+
     
 class CompanyPolicies(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='policies')
@@ -544,6 +814,7 @@ class LetterTemplate(models.Model):
     email_content = models.TextField(null=True, blank=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.title} ({self.company.name})"
@@ -565,6 +836,19 @@ class GeneratedLetter(models.Model):
     title = models.CharField(max_length=255, blank=True, null=True)  
     email_sent = models.BooleanField(default=False)
     email_sent_at = models.DateTimeField(null=True, blank=True)
+    # The email in the outbox; email_sent is only set once it is delivered
+    outbound_email = models.ForeignKey(
+        'notifications.OutboundEmail', null=True, blank=True, on_delete=models.SET_NULL, related_name='letters'
+    )
+
+    @property
+    def email_status(self):
+        """'sent', 'queued' (waiting in the outbox), 'failed', or None if never emailed."""
+        if self.email_sent:
+            return 'sent'
+        if self.outbound_email_id is None:
+            return None
+        return {'sent': 'sent', 'failed': 'failed'}.get(self.outbound_email.status, 'queued')
 
     def __str__(self):
         who = self.employee or self.candidate or self.relieved_employee
@@ -0,0 +1,229 @@
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from .models import Employee, EmployeeHierarchy
+
+
+class HierarchyCycleError(ValueError):
+    pass
+
+
+def _tables():
+    return (
+        connection.ops.quote_name(EmployeeHierarchy._meta.db_table),
+        connection.ops.quote_name(Employee._meta.db_table),
+    )
+
+
+def reports_of(employee, direct=False):
+    """Everyone reporting to `employee`, directly or through other managers."""
+    if direct:
+        return Employee.objects.filter(reporting_manager=employee)
+    return Employee.objects.filter(hierarchy_ancestors__ancestor=employee, hierarchy_ancestors__depth__gt=0)
+
+
+def chain_of(employee):
+    """The employee's managers, from the direct manager up to the top."""
+    return (
+        Employee.objects.filter(hierarchy_descendants__descendant=employee, hierarchy_descendants__depth__gt=0)
+        .order_by('hierarchy_descendants__depth')
+    )
+
+
+def is_manager(employee):
+    return EmployeeHierarchy.objects.filter(ancestor=employee, depth=1).exists()
+
+
+def is_under(employee_id, manager_id):
+    """True when `employee_id` is `manager_id` or anywhere below them."""
+    return EmployeeHierarchy.objects.filter(ancestor_id=manager_id, descendant_id=employee_id).exists()
+
+
+def add_employees(pairs):
+    """
+    Add new employees to the hierarchy. `pairs` is an iterable of
+    (employee id, reporting manager id or None) for employees not yet in it.
+    Employee.save() does this through the save signals; code that uses
+    bulk_create calls it directly.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return
+    hierarchy, _ = _tables()
+    with transaction.atomic():
+        EmployeeHierarchy.objects.bulk_create(
+            [EmployeeHierarchy(ancestor_id=emp_id, descendant_id=emp_id, depth=0) for emp_id, _ in pairs],
+            ignore_conflicts=True,
+        )
+        managed = [(emp_id, manager_id) for emp_id, manager_id in pairs if manager_id]
+        if not managed:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {hierarchy} (ancestor_id, descendant_id, depth)
+                SELECT h.ancestor_id, new.id, h.depth + 1
+                FROM {hierarchy} h
+                JOIN unnest(%s::bigint[], %s::bigint[]) AS new(id, manager_id) ON h.descendant_id = new.manager_id
+                ON CONFLICT DO NOTHING
+                """,
+                [[emp_id for emp_id, _ in managed], [manager_id for _, manager_id in managed]],
+            )
+
+
+def move_employee(employee_id, manager_id):
+    """
+    Re-attach an employee, with everyone below them, under `manager_id` (or at
+    the top when None). Raises HierarchyCycleError if the new manager reports
+    to the employee.
+    """
+    if manager_id and is_under(manager_id, employee_id):
+        raise HierarchyCycleError("An employee cannot report to themselves or to one of their reports.")
+    hierarchy, _ = _tables()
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Cut the subtree loose from its current managers...
+        cursor.execute(
+            f"""
+            DELETE FROM {hierarchy}
+            WHERE descendant_id IN (SELECT descendant_id FROM {hierarchy} WHERE ancestor_id = %s)
+              AND ancestor_id NOT IN (SELECT descendant_id FROM {hierarchy} WHERE ancestor_id = %s)
+            """,
+            [employee_id, employee_id],
+        )
+        if not manager_id:
+            return
+        # ...and hang it under every manager of the new manager
+        cursor.execute(
+            f"""
+            INSERT INTO {hierarchy} (ancestor_id, descendant_id, depth)
+            SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+            FROM {hierarchy} above
+            CROSS JOIN {hierarchy} below
+            WHERE above.descendant_id = %s AND below.ancestor_id = %s
+            """,
+            [manager_id, employee_id],
+        )
+
+
+def _break_loops(cursor, company_filter, params):
+    """
+    Cut the reporting loops of the employees matching `company_filter`: in
+    each loop, the member with the lowest id loses its reporting manager and
+    becomes the top of the chain. Returns the ids of the employees cut loose.
+    """
+    _, employee = _tables()
+    # A walk up from an employee that comes back to it means the employee is on
+    # a loop, and the walk's path holds every member of that loop
+    cursor.execute(
+        f"""
+        WITH RECURSIVE walk(start_id, current_id, path) AS (
+            SELECT id, reporting_manager_id, ARRAY[id] FROM {employee}
+            {company_filter} {'AND' if company_filter else 'WHERE'} reporting_manager_id IS NOT NULL
+            UNION ALL
+            SELECT w.start_id, e.reporting_manager_id, w.path || e.id
+            FROM walk w
+            JOIN {employee} e ON e.id = w.current_id
+            WHERE e.reporting_manager_id IS NOT NULL AND NOT e.id = ANY(w.path)
+        )
+        UPDATE {employee} SET reporting_manager_id = NULL
+        WHERE id IN (
+            SELECT start_id FROM walk
+            WHERE current_id = start_id AND start_id = (SELECT min(member) FROM unnest(path) AS member)
+        )
+        RETURNING id
+        """,
+        params,
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def rebuild(company_id=None):
+    """
+    Recompute the hierarchy from Employee.reporting_manager, for one company or
+    for everyone. Reporting loops in existing data are broken first (see
+    _break_loops). Returns (rows written, ids of the employees cut loose).
+    """
+    hierarchy, employee = _tables()
+    company_filter = "WHERE company_id = %s" if company_id else ""
+    params = [company_id] if company_id else []
+    with transaction.atomic(), connection.cursor() as cursor:
+        cut = _break_loops(cursor, company_filter, params)
+        if company_id:
+            cursor.execute(
+                f"DELETE FROM {hierarchy} WHERE descendant_id IN (SELECT id FROM {employee} WHERE company_id = %s)",
+                params,
+            )
+        else:
+            cursor.execute(f"DELETE FROM {hierarchy}")
+        cursor.execute(
+            f"""
+            WITH RECURSIVE chain(ancestor_id, descendant_id, depth, path) AS (
+                SELECT id, id, 0, ARRAY[id] FROM {employee} {company_filter}
+                UNION ALL
+                SELECT e.reporting_manager_id, c.descendant_id, c.depth + 1, c.path || e.reporting_manager_id
+                FROM chain c
+                JOIN {employee} e ON e.id = c.ancestor_id
+                -- Loops are broken above; the guard keeps a walk into another
+                -- company's data finite all the same
+                WHERE e.reporting_manager_id IS NOT NULL AND NOT e.reporting_manager_id = ANY(c.path)
+            )
+            INSERT INTO {hierarchy} (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, descendant_id, depth FROM chain
+            """,
+            params,
+        )
+        return cursor.rowcount, cut
+
+
+def org_tree(company_id, root_id=None):
+    """
+    Nested org chart for a company, built from one query. With `root_id`,
+    only that employee and the people below them.
+    """
+    employees = Employee.objects.filter(company_id=company_id, is_active=True)
+    if root_id:
+        employees = employees.filter(hierarchy_ancestors__ancestor_id=root_id)
+    rows = list(
+        employees.order_by('first_name', 'last_name', 'id').values(
+            'id', 'employee_id', 'first_name', 'last_name', 'photo', 'reporting_manager_id',
+            'designation__designation_name', 'level__level_name',
+        )
+    )
+
+    nodes = {}
+    for row in rows:
+        nodes[row['id']] = {
+            'id': row['id'],
+            'employee_id': row['employee_id'],
+            'name': f"{row['first_name']} {row['last_name']}",
+            'photo': default_storage.url(row['photo']) if row['photo'] else None,
+            'designation': row['designation__designation_name'],
+            'level': row['level__level_name'],
+            'reportees': [],
+        }
+
+    roots = []
+    for row in rows:
+        node = nodes[row['id']]
+        parent = nodes.get(row['reporting_manager_id'])
+        if parent is not None and row['id'] != root_id:
+            parent['reportees'].append(node)
+        else:
+            roots.append(node)
+
+    # Employees caught in a reporting loop are unreachable from any root; lift
+    # one of them to the top per loop so the tree stays finite and complete.
+    seen = set()
+    pending = list(roots)
+    for row in rows:
+        while pending:
+            node = pending.pop()
+            seen.add(node['id'])
+            pending.extend(node['reportees'])
+        if row['id'] not in seen:
+            node = nodes[row['id']]
+            parent = nodes[row['reporting_manager_id']]
+            parent['reportees'].remove(node)
+            roots.append(node)
+            pending.append(node)
+    return roots
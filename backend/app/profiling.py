@@ -0,0 +1,303 @@
+"""
+Per-request profiling, behind app.middleware.ProfilingMiddleware.
+
+Each profiled request records its database queries (count and time), the
+time spent building serializer output, and its total latency. Statements
+are grouped by their normalized SQL: one that runs DUPLICATE_THRESHOLD times
+or more in a single request is reported as a likely N+1. The figures go out
+in a Server-Timing header and into a rolling window per route, which the
+profiling endpoint summarizes as latency percentiles and a histogram.
+A sample of requests also runs under cProfile; the ones that turn out slow
+are dumped to PROFILE_DIR for `python -m pstats` or snakeviz.
+
+The windows live in the memory of the process: each worker keeps its own,
+and they are lost on restart.
+"""
+import cProfile
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from asgiref.local import Local
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Requests kept per route for the percentiles and histogram
+    'WINDOW': 1000,
+    # A statement run this many times in one request is reported as an N+1
+    'DUPLICATE_THRESHOLD': 5,
+    'SLOW_REQUEST_MS': 1000,
+    # Share of requests run under cProfile; only the slow ones are kept
+    'PROFILE_SAMPLE_RATE': 0.05,
+    'PROFILE_DIR': None,
+    # Dumps kept in PROFILE_DIR, oldest removed first
+    'PROFILE_KEEP': 50,
+}
+# Upper bounds of the latency histogram, in ms
+BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+_state = Local()
+_serializers_patched = False
+
+
+def conf(name):
+    return getattr(settings, 'PROFILING', {}).get(name, DEFAULTS[name])
+
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACE = re.compile(r'\s+')
+
+
+# Django's SQL carries placeholders rather than values, so the same few
+# strings come back over and over
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """
+    The shape of a statement: parameters and literals become placeholders and
+    IN lists of any length look alike, so the queries of an N+1 compare equal.
+    """
+    sql = _STRING.sub('%s', sql)
+    sql = _NUMBER.sub('%s', sql)
+    sql = _IN_LIST.sub('(%s, ...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class RequestProfile:
+    """What one request spent its time on. Times are in seconds."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.serialize_time = 0.0
+        # Queries run while serializing, e.g. lazy related lookups
+        self.serialize_db_time = 0.0
+        self._serializing = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            if self._serializing:
+                self.serialize_db_time += elapsed
+            self.statements[normalize_sql(sql)] += 1
+
+    @contextmanager
+    def serializing(self):
+        # Nested serializers (a SerializerMethodField building another
+        # serializer's .data) are counted once, in the outermost
+        self._serializing += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._serializing -= 1
+            if not self._serializing:
+                self.serialize_time += time.perf_counter() - started
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def duplicates(self):
+        """(normalized sql, count) of the statements repeated past the threshold, most repeated first."""
+        threshold = conf('DUPLICATE_THRESHOLD')
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+    def server_timing(self):
+        """The Server-Timing header value: durations in ms, the serializer's without its queries."""
+        serialize = self.serialize_time - self.serialize_db_time
+        metrics = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={serialize * 1000:.1f}',
+            f'app;dur={max(self.total - self.db_time - serialize, 0) * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ]
+        duplicates = self.duplicates()
+        if duplicates:
+            metrics.append(f'n1;desc="{len(duplicates)} repeated statements, worst x{duplicates[0][1]}"')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def profiling():
+    """Profile the code run inside, which should be one request. Yields its RequestProfile."""
+    profile = RequestProfile()
+    _state.profile = profile
+    try:
+        yield profile
+    finally:
+        profile.finish()
+        _state.profile = None
+
+
+def patch_serializers():
+    """Time the building of serializer output (.data) of the requests being profiled."""
+    global _serializers_patched
+    if _serializers_patched:
+        return
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        cls.data = property(_timed(cls.data.fget))
+    _serializers_patched = True
+
+
+def _timed(fget):
+    def data(serializer):
+        profile = getattr(_state, 'profile', None)
+        if profile is None:
+            return fget(serializer)
+        with profile.serializing():
+            return fget(serializer)
+    return data
+
+
+@contextmanager
+def sampled_cprofile():
+    """
+    Run the code inside under cProfile for a sample of the calls. Yields the
+    profiler, or None when the call is not sampled or another profiler is
+    already running.
+    """
+    if random.random() >= conf('PROFILE_SAMPLE_RATE'):
+        yield None
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        yield None
+        return
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+
+
+def dump_profile(profiler, route, total_ms):
+    """Write the stats of a slow request to PROFILE_DIR and prune old dumps. Returns the path."""
+    directory = Path(conf('PROFILE_DIR') or settings.BASE_DIR / 'profiles')
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r'[^\w.-]+', '-', route).strip('-')
+    path = directory / f"{datetime.now():%Y%m%d-%H%M%S-%f}-{slug}-{total_ms:.0f}ms.prof"
+    profiler.dump_stats(path)
+    for old in sorted(directory.glob('*.prof'))[:-conf('PROFILE_KEEP')]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+class RouteStats:
+    """A rolling window of the latest requests to one route, with lifetime counters."""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+        self.slow = 0
+        self.n_plus_one = 0
+        self.profiles = 0
+        # Worst repeated statements seen lately: sql -> highest count in one request
+        self.repeated = {}
+
+    def add(self, profile, slow, dumped):
+        self.samples.append((
+            profile.total * 1000,
+            profile.queries,
+            profile.db_time * 1000,
+            (profile.serialize_time - profile.serialize_db_time) * 1000,
+        ))
+        self.requests += 1
+        self.slow += slow
+        self.profiles += dumped
+        duplicates = profile.duplicates()
+        if duplicates:
+            self.n_plus_one += 1
+            for sql, count in duplicates:
+                self.repeated[sql] = max(count, self.repeated.get(sql, 0))
+            if len(self.repeated) > 20:
+                worst = sorted(self.repeated.items(), key=lambda item: -item[1])[:10]
+                self.repeated = dict(worst)
+
+    def summary(self):
+        latency = sorted(sample[0] for sample in self.samples)
+        queries = [sample[1] for sample in self.samples]
+        histogram = {f'<={bound}': 0 for bound in BUCKETS}
+        histogram[f'>{BUCKETS[-1]}'] = 0
+        for value in latency:
+            bound = next((bound for bound in BUCKETS if value <= bound), None)
+            histogram[f'<={bound}' if bound is not None else f'>{BUCKETS[-1]}'] += 1
+        return {
+            'requests': self.requests,
+            'window': len(latency),
+            'latency_ms': {
+                'p50': _percentile(latency, 50),
+                'p95': _percentile(latency, 95),
+                'p99': _percentile(latency, 99),
+                'max': round(latency[-1], 1) if latency else None,
+            },
+            'histogram_ms': histogram,
+            'queries': {
+                'mean': round(sum(queries) / len(queries), 1) if queries else None,
+                'max': max(queries, default=None),
+            },
+            'db_ms_p95': _percentile(sorted(sample[2] for sample in self.samples), 95),
+            'serialize_ms_p95': _percentile(sorted(sample[3] for sample in self.samples), 95),
+            'slow': self.slow,
+            'n_plus_one': self.n_plus_one,
+            'profiles': self.profiles,
+            'repeated_statements': [
+                {'sql': sql[:500], 'count': count}
+                for sql, count in sorted(self.repeated.items(), key=lambda item: -item[1])[:5]
+            ],
+        }
+
+
+def _percentile(ordered, percent):
+    if not ordered:
+        return None
+    return round(ordered[max(0, math.ceil(len(ordered) * percent / 100) - 1)], 1)
+
+
+class Registry:
+    """The RouteStats of every route, shared by the threads of the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+            self.since = timezone.now()
+
+    def record(self, route, profile, slow=False, dumped=False):
+        with self._lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = RouteStats(conf('WINDOW'))
+            stats.add(profile, slow, dumped)
+
+    def summary(self):
+        with self._lock:
+            routes = [{'route': route, **stats.summary()} for route, stats in self.routes.items()]
+            since = self.since
+        routes.sort(key=lambda route: -(route['latency_ms']['p95'] or 0))
+        return {'since': since, 'window': conf('WINDOW'), 'routes': routes}
+
+
+registry = Registry()
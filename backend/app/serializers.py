@@ -7,6 +7,8 @@ from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth import get_user_model
 from .models import *
+from .org_hierarchy import is_under
+from notifications.outbox import queue_email
 
 User = get_user_model()
 
@@ -399,6 +401,11 @@ class EmployeeSerializer(serializers.ModelSerializer):
             if reporting_level and reporting_manager.level_id != reporting_level.id:
                 raise serializers.ValidationError("Reporting manager is not assigned to the selected reporting level.")
 
+            if self.instance is not None and is_under(reporting_manager.id, self.instance.id):
+                raise serializers.ValidationError(
+                    {"reporting_manager": "An employee cannot report to themselves or to one of their reports."}
+                )
+
         return data
 
     def create(self, validated_data):
@@ -407,7 +414,7 @@ class EmployeeSerializer(serializers.ModelSerializer):
         request = self.context['request']
         admin_user = request.user
 
-        employee_id = self.generate_employee_id()
+        employee_id = self.generate_employee_id(admin_user.company)
         username = f'emp_{get_random_string(6)}'
         password = get_random_string(8)
 
@@ -448,13 +455,8 @@ class EmployeeSerializer(serializers.ModelSerializer):
 
 
 
-    def generate_employee_id(self):
-        last_employee = Employee.objects.order_by('id').last()
-        if last_employee and last_employee.employee_id:
-            last_id = int(last_employee.employee_id.split('-')[-1])
-        else:
-            last_id = 0
-        return f'EMP-{last_id + 1:04d}'
+    def generate_employee_id(self, company):
+        return EmployeeIdSequence.reserve(company.id)[0]
 
     def send_welcome_email(self, user, password):
         subject = 'Welcome to the Company!'
@@ -466,9 +468,46 @@ class EmployeeSerializer(serializers.ModelSerializer):
             f'Please log in and change your password after first login.\n\n'
             f'Thank you!'
         )
-        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email])
-    
-    
+        queue_email(
+            subject, message, [user.email],
+            company=user.company,
+            created_by=self.context['request'].user,
+            redact_after_send=True,
+        )
+
+
+class EmployeeImportRowSerializer(serializers.ModelSerializer):
+    """
+    Validates a single row of a bulk employee import.
+    Related objects are given by id or name and resolved by the importer, not here,
+    so validating a row never touches the database.
+    """
+    email = serializers.EmailField()
+    department = serializers.CharField()
+    designation = serializers.CharField()
+    reporting_manager = serializers.CharField(required=False, allow_blank=True)
+    assets = serializers.CharField(required=False, allow_blank=True)
+
+    class Meta:
+        model = Employee
+        fields = [
+            'first_name', 'middle_name', 'last_name', 'gender', 'email', 'date_of_birth',
+            'mobile', 'temporary_address', 'permanent_address', 'aadhar_no', 'pan_no',
+            'guardian_name', 'guardian_mobile', 'category', 'department', 'designation',
+            'reporting_manager', 'payment_method', 'account_no', 'ifsc_code', 'bank_name',
+            'source_of_employment', 'date_of_joining', 'previous_employer', 'date_of_releaving',
+            'previous_designation_name', 'previous_salary', 'ctc', 'gross_salary',
+            'epf_status', 'uan', 'esic_status', 'esic_no', 'assets',
+        ]
+        extra_kwargs = {
+            'first_name': {'required': True, 'allow_null': False},
+            'last_name': {'required': True, 'allow_null': False},
+        }
+
+    def validate_email(self, value):
+        return value.strip()
+
+
 class AssetInventorySerializer(serializers.ModelSerializer):
     class Meta:
         model = AssetInventory
@@ -831,10 +870,13 @@ class LetterTemplateSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "company", "created_by", "created_at", "company_details"]
 
 class GeneratedLetterSerializer(serializers.ModelSerializer):
+    email_status = serializers.ReadOnlyField()
+
     class Meta:
         model = GeneratedLetter
         fields = '__all__'
         extra_kwargs = {
-            'file_path': {'required': False, 'allow_blank': True, 'allow_null': True}
+            'file_path': {'required': False, 'allow_blank': True, 'allow_null': True},
+            'outbound_email': {'read_only': True},
         }
 
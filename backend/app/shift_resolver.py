@@ -0,0 +1,155 @@
+import threading
+import time
+from bisect import bisect_right
+from datetime import timedelta
+
+from . import tenant_config
+
+DAY = 24 * 60 * 60
+# A shift can be picked from this long before it starts...
+EARLY_CHECKIN_BUFFER = timedelta(hours=2)
+# ...and only while at least this much of it is left
+MIN_WORK_TIME = timedelta(hours=2)
+# Tables are dropped on ShiftPolicy / working-days changes; the TTL only bounds how
+# long another process may keep using a table built before such a change.
+CACHE_TTL = 300
+
+_tables = {}
+_lock = threading.Lock()
+
+
+def _seconds(t):
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+class ShiftTable:
+    """
+    Shift choice for every second of a day, for one company and department.
+
+    The day is cut into segments at every point where the answer can change.
+    Each segment stores the shift to use and when that shift instance started,
+    in seconds from local midnight (negative for an overnight shift that began
+    the day before). Looking up a check-in time is then a bisect.
+    """
+
+    def __init__(self, shifts):
+        self.shifts = list(shifts)
+        self.starts = []
+        self.entries = []
+        if self.shifts:
+            self._build()
+
+    def _windows(self):
+        early = int(EARLY_CHECKIN_BUFFER.total_seconds())
+        min_work = int(MIN_WORK_TIME.total_seconds())
+        windows = []
+        # Today's instance of every shift first, in shift order, then yesterday's
+        # overnight shifts still running this morning.
+        for day_offset in (0, -DAY):
+            for shift in self.shifts:
+                start = _seconds(shift.checkin)
+                end = _seconds(shift.checkout)
+                overnight = shift.checkin > shift.checkout
+                if overnight:
+                    end += DAY
+                elif day_offset:
+                    continue
+                start += day_offset
+                end += day_offset
+                # Selectable from `early` before the start until `min_work` before
+                # the end, both included
+                windows.append((start - early, end - min_work, shift, start))
+        return windows
+
+    def _fallback(self, t):
+        # Nearest upcoming check-in, wrapping to tomorrow
+        def wait(shift):
+            checkin = _seconds(shift.checkin)
+            return checkin - t if checkin > t else checkin + DAY - t
+        shift = min(self.shifts, key=wait)
+        start = _seconds(shift.checkin)
+        if shift.checkin > shift.checkout and t < _seconds(shift.checkout):
+            start -= DAY
+        return shift, start
+
+    def _build(self):
+        windows = self._windows()
+        points = {0}
+        for low, high, _, _ in windows:
+            # A window closes after its last second
+            points.update(p for p in (low, high + 1) if 0 < p < DAY)
+        for shift in self.shifts:
+            points.add(_seconds(shift.checkin))
+            points.add(_seconds(shift.checkout))
+
+        for point in sorted(points):
+            entry = next(
+                ((shift, start) for low, high, shift, start in windows if low <= point <= high),
+                None,
+            ) or self._fallback(point)
+            # Merge with the previous segment when nothing changes
+            if self.entries and self.entries[-1] == entry:
+                continue
+            self.starts.append(point)
+            self.entries.append(entry)
+
+    def resolve(self, seconds):
+        """Return (shift, start offset in seconds) for a time of day, or (None, None)."""
+        if not self.entries:
+            return None, None
+        return self.entries[bisect_right(self.starts, seconds) - 1]
+
+
+def _candidate_shifts(company_id, department_id):
+    """
+    Shifts assigned to the department through DepartmentWiseWorkingDays, or every
+    shift of the company (and shared shifts) when the department has none.
+    """
+    config = tenant_config.get_config(company_id)
+    if department_id:
+        shifts = {
+            shift.id: shift
+            for working_days in config.working_days if working_days.department_id == department_id
+            for shift in working_days.shifts.all()
+        }
+        if shifts:
+            return [shifts[shift_id] for shift_id in sorted(shifts)]
+    return list(config.shifts)
+
+
+def get_shift_table(company_id, department_id):
+    key = (company_id, department_id)
+    now = time.monotonic()
+    with _lock:
+        cached = _tables.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    table = ShiftTable(_candidate_shifts(company_id, department_id))
+    with _lock:
+        _tables[key] = (now + CACHE_TTL, table)
+    return table
+
+
+def resolve_shift(employee, local_dt):
+    """
+    Pick the shift for an employee checking in at `local_dt` (an aware datetime in
+    the company's timezone), taken to the whole second. Returns (shift, shift
+    start datetime), or (None, None) when no shift is configured.
+    """
+    table = get_shift_table(employee.company_id, employee.department_id)
+    midnight = local_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    shift, start = table.resolve(int((local_dt - midnight).total_seconds()))
+    if shift is None:
+        return None, None
+    return shift, midnight + timedelta(seconds=start)
+
+
+def invalidate(company_id=None):
+    """Drop cached tables for one company, or for every company."""
+    with _lock:
+        if company_id is None:
+            _tables.clear()
+            return
+        for key in [k for k in _tables if k[0] == company_id]:
+            del _tables[key]
@@ -0,0 +1,130 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from notifications.outbox import emails_delivered
+
+from . import leave_ledger, org_hierarchy, shift_resolver, tenant_config
+from .models import (
+    AllowanceType, BreakConfig, DeductionPolicy, DepartmentWiseWorkingDays, EmpLeave, Employee, GeneratedLetter,
+    IncomeTaxConfig, Leave, Level, SalaryStructure, ShiftPolicy,
+)
+
+
+def _config_changed(company_id, shifts=False):
+    """
+    Retire the company's configuration snapshot (and its shift tables) once
+    the change is committed, so no reader caches what is about to change.
+    Without a company, every company's.
+    """
+    def invalidate():
+        tenant_config.invalidate(company_id)
+        # Shift tables are rebuilt from the snapshot, so they go after it
+        if shifts:
+            shift_resolver.invalidate(company_id)
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=ShiftPolicy)
+def shift_policy_changed(sender, instance, **kwargs):
+    # Shifts without a company are shared by every company
+    _config_changed(instance.company_id, shifts=True)
+
+
+@receiver([post_save, post_delete], sender=DepartmentWiseWorkingDays)
+def working_days_changed(sender, instance, **kwargs):
+    _config_changed(instance.company_id, shifts=True)
+
+
+@receiver(m2m_changed, sender=DepartmentWiseWorkingDays.shifts.through)
+def working_days_shifts_changed(sender, instance, **kwargs):
+    if isinstance(instance, DepartmentWiseWorkingDays):
+        _config_changed(instance.company_id, shifts=True)
+    else:
+        _config_changed(None, shifts=True)
+
+
+@receiver([post_save, post_delete], sender=BreakConfig)
+@receiver([post_save, post_delete], sender=Leave)
+@receiver([post_save, post_delete], sender=IncomeTaxConfig)
+@receiver([post_save, post_delete], sender=SalaryStructure)
+@receiver([post_save, post_delete], sender=Level)
+def tenant_config_changed(sender, instance, **kwargs):
+    _config_changed(instance.company_id)
+
+
+@receiver([post_save, post_delete], sender=AllowanceType)
+@receiver([post_save, post_delete], sender=DeductionPolicy)
+def salary_structure_item_changed(sender, instance, **kwargs):
+    _config_changed(instance.salary_structure.company_id)
+
+
+@receiver(pre_save, sender=Employee)
+def employee_manager_changing(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._previous_manager_id = None
+    if instance.pk:
+        instance._previous_manager_id = (
+            Employee.objects.filter(pk=instance.pk).values_list('reporting_manager_id', flat=True).first()
+        )
+    # Refuse reporting loops before anything is written
+    if (
+        instance.pk and instance.reporting_manager_id
+        and instance.reporting_manager_id != instance._previous_manager_id
+        and org_hierarchy.is_under(instance.reporting_manager_id, instance.pk)
+    ):
+        raise org_hierarchy.HierarchyCycleError(
+            "An employee cannot report to themselves or to one of their reports."
+        )
+
+
+@receiver(post_save, sender=Employee)
+def employee_manager_changed(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        org_hierarchy.add_employees([(instance.pk, instance.reporting_manager_id)])
+    elif instance.reporting_manager_id != getattr(instance, '_previous_manager_id', None):
+        org_hierarchy.move_employee(instance.pk, instance.reporting_manager_id)
+
+
+@receiver(pre_delete, sender=Employee)
+def employee_leaving_hierarchy(sender, instance, **kwargs):
+    # Reportees are set to no manager by the delete; detach their subtrees to match
+    for reportee_id in Employee.objects.filter(reporting_manager=instance).values_list('id', flat=True):
+        org_hierarchy.move_employee(reportee_id, None)
+
+
+@receiver(pre_save, sender=Leave)
+def leave_allowance_changing(sender, instance, raw=False, **kwargs):
+    instance._previous_count = None
+    if instance.pk and not raw:
+        instance._previous_count = Leave.objects.filter(pk=instance.pk).values_list('count', flat=True).first()
+
+
+@receiver(post_save, sender=Leave)
+def leave_allowance_changed(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_count', None)
+    if not created and previous is not None and previous != instance.count:
+        leave_ledger.adjust_allowance(instance, previous)
+
+
+@receiver(pre_delete, sender=EmpLeave)
+def emp_leave_deleted(sender, instance, origin=None, **kwargs):
+    # Only for leaves deleted on their own: when the employee or leave type goes,
+    # their ledger goes with them.
+    if isinstance(origin, EmpLeave) or getattr(origin, 'model', None) is EmpLeave:
+        # The ledger keeps the entries but loses the link; give the days back first
+        leave_ledger.sync_leave(instance, release=True)
+
+
+@receiver(emails_delivered)
+def letters_delivered(sender, emails, **kwargs):
+    # Letters count as sent once their email leaves the outbox, not when queued
+    sent_at = {email.id: email.sent_at for email in emails}
+    letters = list(GeneratedLetter.objects.filter(outbound_email_id__in=sent_at, email_sent=False))
+    for letter in letters:
+        letter.email_sent = True
+        letter.email_sent_at = sent_at[letter.outbound_email_id]
+    GeneratedLetter.objects.bulk_update(letters, ['email_sent', 'email_sent_at'])
@@ -0,0 +1,601 @@
+"""
+Deterministic synthetic tenants for load and performance testing.
+
+SyntheticDataGenerator creates whole companies: their configuration
+(departments, levels, designations, shifts, working days, breaks, leave types,
+salary structure, tax slabs, holidays), an org chart of employees with logins,
+and a history of attendance with breaks, leave requests with their ledger,
+tasks, notifications and locked payroll batches.
+
+Rows are written with bulk_create, so save signals do not run. Whatever they
+maintain (the reporting hierarchy, the leave ledger, task counters) is written
+here directly. The same seed, sizes and end date always produce the same data.
+Companies are recognised by their email, synthetic-<seed>-<n>@example.com, so
+each seed can be generated once per database.
+"""
+import random
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from employee.dashboard import invalidate_dashboards
+from employee.models import Task, TaskAssignment
+from notifications.models import UserNotification
+from .leave_ledger import days_by_year
+from .models import (
+    AllowanceType, Attendance, BreakConfig, BreakLog, CalendarEvent, Company, DeductionPolicy, Department,
+    DepartmentWiseWorkingDays, Designation, Employee, EmployeeIdSequence, EmpLeave, IncomeTaxConfig, Leave,
+    LeaveBalance, LeaveLedgerEntry, Level, Payroll, PayrollBatch, SalaryStructure, ShiftPolicy, UserRegister,
+)
+from .org_hierarchy import add_employees as add_to_hierarchy
+
+BATCH_SIZE = 5000
+# Employees whose attendance is built and written together
+EMPLOYEE_CHUNK = 100
+
+FIRST_NAMES = [
+    'Aarav', 'Aditi', 'Amit', 'Ananya', 'Arjun', 'Deepa', 'Divya', 'Farhan', 'Gaurav', 'Isha',
+    'Karan', 'Kavya', 'Lakshmi', 'Manoj', 'Meera', 'Neha', 'Nikhil', 'Pooja', 'Priya', 'Rahul',
+    'Ravi', 'Riya', 'Rohan', 'Sanjay', 'Shreya', 'Sneha', 'Suresh', 'Tanvi', 'Varun', 'Vikram',
+]
+LAST_NAMES = [
+    'Agarwal', 'Bhat', 'Chopra', 'Das', 'Desai', 'Gupta', 'Iyer', 'Joshi', 'Kapoor', 'Khan', 'Kumar',
+    'Menon', 'Mehta', 'Nair', 'Patel', 'Pillai', 'Rao', 'Reddy', 'Shah', 'Sharma', 'Singh', 'Verma',
+]
+CITIES = ['Bengaluru', 'Chennai', 'Hyderabad', 'Kochi', 'Mumbai', 'Pune']
+DEPARTMENTS = [
+    'Engineering', 'Sales', 'Operations', 'Finance', 'Human Resources',
+    'Support', 'Marketing', 'Quality', 'Legal', 'Design',
+]
+# (level name, title); L1 is the top of the org chart
+LEVELS = [('L1', 'Director'), ('L2', 'Manager'), ('L3', 'Team Lead'), ('L4', 'Associate')]
+MONTHLY_GROSS = {'L1': 300000, 'L2': 150000, 'L3': 80000, 'L4': 35000}
+# (name, yearly allowance, paid, relative share of requests)
+LEAVE_TYPES = [('Casual Leave', 12, True, 6), ('Sick Leave', 8, True, 3), ('Loss of Pay', 0, False, 1)]
+LEAVE_REASONS = ['Family function', 'Not feeling well', 'Personal work', 'Travel', 'Medical appointment']
+# (month, day, name)
+HOLIDAYS = [(1, 26, 'Republic Day'), (5, 1, 'Labour Day'), (8, 15, 'Independence Day'),
+            (10, 2, 'Gandhi Jayanti'), (12, 25, 'Christmas')]
+TASK_TITLES = [
+    'Prepare quarterly report', 'Review pull requests', 'Update onboarding guide', 'Customer follow-up',
+    'Fix reported issues', 'Plan sprint', 'Audit access rights', 'Draft proposal', 'Clean up backlog',
+    'Vendor evaluation', 'Update price list', 'Organise training',
+]
+NOTIFICATIONS = [
+    ('Task', 'New task assigned: {task}'),
+    ('Leave Status Updated', 'Your leave request has been reviewed'),
+    ('Holiday', 'The office is closed for a holiday'),
+    ('Payslip', 'Your payslip for the month is ready'),
+    ('Announcement', 'Town hall this Friday at 4 PM'),
+]
+
+
+def _money(value):
+    return Decimal(value).quantize(Decimal('0.01'))
+
+
+def _month_end(day):
+    following = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return following - timedelta(days=1)
+
+
+class _Tenant:
+    """What is known about the company being generated."""
+
+    def __init__(self, index, company, rng):
+        self.index = index
+        self.company = company
+        self.rng = rng
+        self.employees = []
+        self.reports = defaultdict(list)
+        # Employee id -> {day: Leave} of approved leave days
+        self.leave_days = defaultdict(dict)
+        # (employee id, year, month) -> days present
+        self.present = Counter()
+
+
+class SyntheticDataGenerator:
+    def __init__(self, seed=0, companies=1, employees=200, departments=5, days=365, until=None,
+                 tasks_per_manager=6, notifications_per_employee=40, password=None, log=None):
+        self.seed = seed
+        self.companies = companies
+        self.employees_per_company = employees
+        self.departments = departments
+        self.until = until or timezone.localdate() - timedelta(days=1)
+        self.since = self.until - timedelta(days=days - 1)
+        self.tasks_per_manager = tasks_per_manager
+        self.notifications_per_employee = notifications_per_employee
+        # Hashed once: hashing a password per user would dominate the run. None makes logins unusable.
+        self.password = make_password(password)
+        self.log = log or (lambda message: None)
+        self.tz = timezone.get_current_timezone()
+        self.counts = Counter()
+
+    def company_email(self, index):
+        return f'synthetic-{self.seed}-{index}@example.com'
+
+    def existing(self):
+        """Companies already generated with this seed."""
+        return Company.objects.filter(email__in=[self.company_email(i) for i in range(self.companies)])
+
+    def run(self):
+        """Generate every company, each in its own transaction. Returns the row counts per model."""
+        for index in range(self.companies):
+            with transaction.atomic():
+                company = self._generate(index)
+            self.log(f"Company {company.pk} ({company.name}) done.")
+        return self.counts
+
+    def _bulk(self, model, objects):
+        objects = model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        self.counts[model.__name__] += len(objects)
+        return objects
+
+    def _generate(self, index):
+        rng = random.Random(f'{self.seed}:{index}')
+        city = rng.choice(CITIES)
+        company = Company.objects.create(
+            name=f'Synthetic {self.seed}-{index + 1}',
+            address=f'{rng.randint(1, 999)} Main Road, {city}',
+            location=city,
+            email=self.company_email(index),
+            phone_number=f'9{rng.randint(0, 999999999):09d}',
+        )
+        self.counts['Company'] += 1
+        tenant = _Tenant(index, company, rng)
+        tenant.admin = UserRegister.objects.create(
+            username=f'synth{self.seed}_{index}_admin',
+            email=f'admin@s{self.seed}c{index}.example.com',
+            password=self.password,
+            role='admin',
+            company=company,
+            first_name='Synthetic',
+            last_name='Admin',
+        )
+        self.counts['UserRegister'] += 1
+
+        self._configuration(tenant)
+        self._org_chart(tenant)
+        self.log(f"  {len(tenant.employees)} employees")
+        self._leaves(tenant)
+        self._attendance(tenant)
+        self._tasks(tenant)
+        self._notifications(tenant)
+        self._payrolls(tenant)
+        return company
+
+    def _configuration(self, tenant):
+        company, rng = tenant.company, tenant.rng
+        names = [
+            DEPARTMENTS[i % len(DEPARTMENTS)] + (f' {i // len(DEPARTMENTS) + 1}' if i >= len(DEPARTMENTS) else '')
+            for i in range(self.departments)
+        ]
+        tenant.departments = self._bulk(Department, [Department(company=company, department_name=n) for n in names])
+        levels = self._bulk(Level, [Level(company=company, level_name=n, description=t) for n, t in LEVELS])
+        tenant.levels = {level.level_name: level for level in levels}
+        titles = dict(LEVELS)
+        designations = self._bulk(Designation, [
+            Designation(company=company, department=dept, level=level,
+                        designation_name=f'{dept.department_name} {titles[level.level_name]}')
+            for dept in tenant.departments for level in levels
+        ])
+        tenant.designations = {(d.department_id, d.level.level_name): d for d in designations}
+
+        shifts = self._bulk(ShiftPolicy, [
+            ShiftPolicy(company=company, shift_type='General', checkin=time(9, 30), checkout=time(18, 30),
+                        grace_period=timedelta(minutes=15), half_day=timedelta(hours=4), full_day=timedelta(hours=8)),
+            ShiftPolicy(company=company, shift_type='Early', checkin=time(7, 0), checkout=time(16, 0),
+                        grace_period=timedelta(minutes=10), half_day=timedelta(hours=4), full_day=timedelta(hours=8)),
+        ])
+        # Most departments work Monday to Friday on the general shift
+        working_days = self._bulk(DepartmentWiseWorkingDays, [
+            DepartmentWiseWorkingDays(
+                company=company, department=dept, working_days_count=6 if saturday else 5,
+                week_start_day='monday', week_end_day='saturday' if saturday else 'friday',
+            )
+            for dept, saturday in ((dept, rng.random() < 0.25) for dept in tenant.departments)
+        ])
+        department_shifts = [shifts[1] if rng.random() < 0.2 else shifts[0] for _ in working_days]
+        self._bulk(DepartmentWiseWorkingDays.shifts.through, [
+            DepartmentWiseWorkingDays.shifts.through(departmentwiseworkingdays=wd, shiftpolicy=shift)
+            for wd, shift in zip(working_days, department_shifts)
+        ])
+        tenant.shift_of = {wd.department_id: shift for wd, shift in zip(working_days, department_shifts)}
+        tenant.weekdays_of = {wd.department_id: DepartmentWiseWorkingDays.weekdays_of(wd) for wd in working_days}
+
+        breaks = self._bulk(BreakConfig, [
+            BreakConfig(company=company, break_choice='short_break', duration_minutes=15),
+            BreakConfig(company=company, break_choice='meal_break', duration_minutes=45),
+            BreakConfig(company=company, break_choice='dont_disturb'),
+        ])
+        tenant.short_break, tenant.meal_break = breaks[0], breaks[1]
+
+        leave_types = self._bulk(Leave, [
+            Leave(company=company, leave_name=name, count=count, is_paid=paid) for name, count, paid, _ in LEAVE_TYPES
+        ])
+        tenant.leave_types = leave_types
+        tenant.leave_weights = [share for *_, share in LEAVE_TYPES]
+
+        structure = SalaryStructure.objects.create(
+            company=company, name='Standard', basic_percent=40, hra_percent=20, conveyance_percent=5,
+            medical_percent=5, special_percent=25, service_charge_percent=5, total_working_days=30,
+        )
+        self.counts['SalaryStructure'] += 1
+        self._bulk(AllowanceType, [AllowanceType(salary_structure=structure, name='Internet', amount=500)])
+        self._bulk(DeductionPolicy, [DeductionPolicy(salary_structure=structure, name='Professional Tax', amount=200)])
+        tenant.structure = structure
+        tenant.extra_allowances, tenant.extra_deductions = Decimal(500), Decimal(200)
+        tenant.tax_slabs = self._bulk(IncomeTaxConfig, [
+            IncomeTaxConfig(company=company, name='Nil', salary_from=0, salary_to=Decimal('25000'), tax_percent=0),
+            IncomeTaxConfig(company=company, name='Low', salary_from=Decimal('25000.01'), salary_to=Decimal('50000'),
+                            tax_percent=5),
+            IncomeTaxConfig(company=company, name='Middle', salary_from=Decimal('50000.01'),
+                            salary_to=Decimal('100000'), tax_percent=10),
+            IncomeTaxConfig(company=company, name='High', salary_from=Decimal('100000.01'),
+                            salary_to=Decimal('99999999'), tax_percent=20),
+        ])
+
+        events = []
+        for year in range(self.since.year, self.until.year + 1):
+            days = [(date(year, month, day), name) for month, day, name in HOLIDAYS]
+            days += [(date(year, 1, 1) + timedelta(days=rng.randrange(365)), 'Company Holiday') for _ in range(3)]
+            events += [CalendarEvent(company=company, name=name, date=day, is_holiday=True,
+                                     description=f'{name} holiday') for day, name in days]
+            events += [CalendarEvent(company=company, name='Town Hall', date=date(year, month, 15),
+                                     description='Quarterly town hall') for month in (3, 6, 9, 12)]
+        events = self._bulk(CalendarEvent, events)
+        tenant.holidays = {event.date for event in events if event.is_holiday}
+
+    def _org_chart(self, tenant):
+        """A director, a manager per department, team leads and associates, created top down."""
+        total = self.employees_per_company
+        departments = tenant.departments
+        ceo, = self._people(tenant, [(departments[0], 'L1', None)])
+        heads = self._people(tenant, [(dept, 'L2', ceo) for dept in departments[:max(0, min(len(departments), total - 1))]])
+        head_of = {head.department_id: head for head in heads}
+
+        remaining = max(0, total - 1 - len(heads))
+        sizes = [remaining // len(departments) + (1 if i < remaining % len(departments) else 0)
+                 for i in range(len(departments))]
+        lead_specs, member_counts = [], []
+        for dept, size in zip(departments, sizes):
+            leads = min(size, max(1, size // 9)) if size else 0
+            lead_specs += [(dept, 'L3', head_of.get(dept.id, ceo))] * leads
+            member_counts.append((dept, size - leads))
+        leads = self._people(tenant, lead_specs)
+
+        leads_of = defaultdict(list)
+        for lead in leads:
+            leads_of[lead.department_id].append(lead)
+        member_specs = []
+        for dept, count in member_counts:
+            managers = leads_of[dept.id] or [head_of.get(dept.id, ceo)]
+            member_specs += [(dept, 'L4', managers[i % len(managers)]) for i in range(count)]
+        self._people(tenant, member_specs)
+
+    def _people(self, tenant, specs):
+        """Create employees with logins for (department, level name, manager) specs."""
+        if not specs:
+            return []
+        rng, company = tenant.rng, tenant.company
+        start = len(tenant.employees)
+        people = []
+        for number, (dept, level, manager) in enumerate(specs, start):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            if level in ('L1', 'L2') or rng.random() < 0.8:
+                joined = self.since - timedelta(days=rng.randint(30, 6 * 365))
+            else:
+                # Some people join during the generated period
+                joined = self.since + timedelta(days=rng.randrange(max(1, (self.until - self.since).days - 30)))
+            people.append({
+                'number': number, 'first': first, 'last': last, 'dept': dept, 'level': level,
+                'manager': manager, 'joined': joined,
+                'gross': _money(MONTHLY_GROSS[level] * rng.uniform(0.8, 1.25)),
+                'gender': rng.choice(['male', 'female']),
+                'birth': date(rng.randint(1965, 2002), rng.randint(1, 12), rng.randint(1, 28)),
+                'mobile': f'9{rng.randint(0, 999999999):09d}',
+            })
+
+        domain = f's{self.seed}c{tenant.index}.example.com'
+        users = self._bulk(UserRegister, [
+            UserRegister(
+                username=f"synth{self.seed}_{tenant.index}_{p['number']:05d}",
+                email=f"{p['first'].lower()}.{p['number']}@{domain}",
+                password=self.password, role='employee', company=company,
+                first_name=p['first'], last_name=p['last'],
+            )
+            for p in people
+        ])
+        employee_ids = EmployeeIdSequence.reserve(company.id, len(people))
+        employees = self._bulk(Employee, [
+            Employee(
+                company=company, user=user, employee_id=employee_id,
+                department=p['dept'], level=tenant.levels[p['level']],
+                designation=tenant.designations[(p['dept'].id, p['level'])],
+                reporting_manager=p['manager'], reporting_level=p['manager'].level if p['manager'] else None,
+                first_name=p['first'], last_name=p['last'], gender=p['gender'], email=user.email,
+                date_of_birth=p['birth'], mobile=p['mobile'], date_of_joining=p['joined'],
+                gross_salary=p['gross'], ctc=p['gross'] * 12, payment_method='bank', epf_status='yes',
+            )
+            for user, employee_id, p in zip(users, employee_ids, people)
+        ])
+        add_to_hierarchy((employee.id, employee.reporting_manager_id) for employee in employees)
+        for employee in employees:
+            if employee.reporting_manager_id:
+                tenant.reports[employee.reporting_manager_id].append(employee)
+        tenant.employees += employees
+        return employees
+
+    def _leaves(self, tenant):
+        """
+        Non-overlapping leave requests, mostly approved, plus a few upcoming
+        pending ones, and the ledger entries and balances they imply.
+        """
+        rng = tenant.rng
+        span = (self.until - self.since).days + 1
+        leaves = []
+        for employee in tenant.employees:
+            first_day = max(self.since, employee.date_of_joining)
+            taken = set()
+            starts = [first_day + timedelta(days=rng.randrange(max(1, (self.until - first_day).days + 1)))
+                      for _ in range(round(rng.uniform(4, 10) * span / 365))]
+            if rng.random() < 0.3:
+                starts.append(self.until + timedelta(days=rng.randint(3, 30)))
+            for start in starts:
+                days = [start + timedelta(days=n) for n in range(rng.choice((1, 1, 1, 2, 2, 3, 5)))]
+                if taken.intersection(days):
+                    continue
+                taken.update(days)
+                if start > self.until:
+                    status = 'Pending'
+                else:
+                    status = rng.choices(['Approved', 'Rejected', 'Cancelled', 'Pending'], [80, 8, 8, 4])[0]
+                leave_type = rng.choices(tenant.leave_types, tenant.leave_weights)[0]
+                leaves.append(EmpLeave(
+                    company=tenant.company, employee=employee, reporting_manager_id=employee.reporting_manager_id,
+                    leave_type=leave_type, status=status, reason=rng.choice(LEAVE_REASONS),
+                    from_date=days[0], to_date=days[-1],
+                ))
+                if status == 'Approved':
+                    tenant.leave_days[employee.id].update((day, leave_type) for day in days)
+        leaves = self._bulk(EmpLeave, leaves)
+        self._backdate(EmpLeave, 'created_at', {
+            leave.pk: self._at(leave.from_date - timedelta(days=rng.randint(1, 20)), time(10, 0))
+            for leave in leaves
+        })
+
+        balances = {}
+        entries = []
+
+        def balance(employee, leave_type, year):
+            key = (employee.id, leave_type.id, year)
+            if key not in balances:
+                balances[key] = LeaveBalance(company=tenant.company, employee=employee, leave_type=leave_type,
+                                             year=year, accrued=leave_type.count)
+                if leave_type.count:
+                    entries.append(LeaveLedgerEntry(
+                        company=tenant.company, employee=employee, leave_type=leave_type, year=year,
+                        entry_type='accrual', days=leave_type.count, note='Yearly allowance',
+                    ))
+            return balances[key]
+
+        for employee in tenant.employees:
+            for leave_type in tenant.leave_types:
+                if leave_type.count:
+                    for year in range(self.since.year, self.until.year + 1):
+                        balance(employee, leave_type, year)
+        for leave in leaves:
+            if leave.status != 'Approved':
+                continue
+            for year, days in days_by_year(leave.from_date, leave.to_date).items():
+                balance(leave.employee, leave.leave_type, year).used += days
+                entries.append(LeaveLedgerEntry(
+                    company=tenant.company, employee=leave.employee, leave_type=leave.leave_type, year=year,
+                    entry_type='debit', days=-days, emp_leave=leave,
+                    note=f"Leave {leave.from_date} to {leave.to_date} approved",
+                ))
+        self._bulk(LeaveBalance, list(balances.values()))
+        self._bulk(LeaveLedgerEntry, entries)
+
+    def _attendance(self, tenant):
+        """A row per day worked, with a meal break and sometimes a short break."""
+        employees = tenant.employees
+        for offset in range(0, len(employees), EMPLOYEE_CHUNK):
+            rows, breaks = [], []
+            for employee in employees[offset:offset + EMPLOYEE_CHUNK]:
+                self._employee_attendance(tenant, employee, rows, breaks)
+            rows = self._bulk(Attendance, rows)
+            for attendance, break_log in breaks:
+                break_log.attendance = attendance
+            self._bulk(BreakLog, [break_log for _, break_log in breaks])
+            self.log(f"  attendance for {min(offset + EMPLOYEE_CHUNK, len(employees))}/{len(employees)} employees")
+
+    def _employee_attendance(self, tenant, employee, rows, breaks):
+        rng = tenant.rng
+        shift = tenant.shift_of[employee.department_id]
+        weekdays = tenant.weekdays_of[employee.department_id]
+        on_leave = tenant.leave_days[employee.id]
+        day = max(self.since, employee.date_of_joining)
+        while day <= self.until:
+            if (day.weekday() in weekdays and day not in tenant.holidays and day not in on_leave
+                    and rng.random() < 0.96):
+                check_in = self._at(day, shift.checkin) + timedelta(minutes=min(45, max(-20, rng.gauss(2, 8))))
+                check_out = check_in + timedelta(minutes=9 * 60 + rng.gauss(0, 25))
+                attendance = Attendance(employee=employee, company=tenant.company, shift=shift, date=day,
+                                        check_in=check_in, check_out=check_out, is_present=True)
+                day_breaks = [(tenant.meal_break, check_in + timedelta(minutes=rng.randint(210, 270)),
+                               rng.randint(25, 50))]
+                if rng.random() < 0.5:
+                    day_breaks.append((tenant.short_break, check_in + timedelta(minutes=rng.randint(90, 150)),
+                                       rng.randint(8, 15)))
+                for config, start, minutes in day_breaks:
+                    breaks.append((attendance, BreakLog(
+                        employee=employee, break_config=config, start=start,
+                        end=start + timedelta(minutes=minutes), duration_minutes=minutes,
+                    )))
+                attendance.total_work_duration, attendance.overtime_duration = Attendance.compute_durations(
+                    check_in, check_out, timedelta(minutes=sum(minutes for *_, minutes in day_breaks)), shift
+                )
+                rows.append(attendance)
+                tenant.present[(employee.id, day.year, day.month)] += 1
+            day += timedelta(days=1)
+
+    def _tasks(self, tenant):
+        """Tasks from every manager to their reports, some with subtasks, most past ones done."""
+        rng = tenant.rng
+        span = (self.until - self.since).days + 1
+        plans = []
+        for manager in tenant.employees:
+            reports = tenant.reports.get(manager.id)
+            if not reports:
+                continue
+            for _ in range(self.tasks_per_manager):
+                created = self.since + timedelta(days=rng.randrange(span))
+                deadline = created + timedelta(days=rng.randint(3, 30))
+                assignees = rng.sample(reports, min(len(reports), rng.randint(1, 3)))
+                subtasks = [rng.choice(assignees) for _ in range(rng.choice((0, 0, 1, 2, 3)))]
+                plans.append((manager, created, deadline, assignees, subtasks))
+
+        def status_for(deadline):
+            if deadline < self.until - timedelta(days=7):
+                return 'done' if rng.random() < 0.85 else rng.choice(['inprogress', 'inreview'])
+            return rng.choice(['todo', 'inprogress', 'inreview', 'done'])
+
+        def task_status(statuses):
+            # As Task.compute_status_from_assignments
+            if all(s == 'done' for s in statuses):
+                return 'done'
+            if any(s == 'inprogress' for s in statuses):
+                return 'inprogress'
+            if all(s == 'todo' for s in statuses):
+                return 'todo'
+            return 'inreview'
+
+        parents, children, assignments, created_at = [], [], [], []
+        for manager, created, deadline, assignees, subtasks in plans:
+            title = rng.choice(TASK_TITLES)
+            statuses = [status_for(deadline) for _ in assignees]
+            parent = Task(title=title, description=f'{title} for the team', created_by=manager,
+                          deadline=deadline, priority=rng.choice(['low', 'medium', 'high']),
+                          status=task_status(statuses))
+            parents.append(parent)
+            created_at.append((parent, created))
+            for n, (employee, status) in enumerate(zip(assignees, statuses)):
+                assignments.append((parent, employee, 'owner' if n == 0 else 'contributor', status))
+            for n, employee in enumerate(subtasks, 1):
+                status = status_for(deadline)
+                child = Task(title=f'{title} - part {n}', created_by=manager, deadline=deadline,
+                             priority=parent.priority, status=status, parent_task=parent)
+                children.append(child)
+                created_at.append((child, created))
+                assignments.append((child, employee, 'owner', status))
+
+        self._bulk(Task, parents)
+        for child in children:
+            child.parent_task_id = child.parent_task.pk
+        self._bulk(Task, children)
+        self._bulk(TaskAssignment, [
+            TaskAssignment(task=task, employee=employee, role=role, status=status, is_seen=status != 'todo')
+            for task, employee, role, status in assignments
+        ])
+        self._backdate(Task, 'created_at', {task.pk: self._at(day, time(11, 0)) for task, day in created_at})
+        # Counters are kept by signals on the normal write paths
+        Task.refresh_counters([task.pk for task in parents + children])
+
+    def _notifications(self, tenant):
+        rng = tenant.rng
+        span_seconds = ((self.until - self.since).days + 1) * 86400
+        per_employee = round(self.notifications_per_employee * span_seconds / (365 * 86400))
+        start = self._at(self.since, time(0, 0))
+        recent = self._at(self.until, time(0, 0)) - timedelta(days=7)
+        rows, sent_at = [], []
+        for employee in tenant.employees:
+            for _ in range(per_employee):
+                title, message = rng.choice(NOTIFICATIONS)
+                at = start + timedelta(seconds=rng.randrange(span_seconds))
+                rows.append(UserNotification(
+                    recipient=employee, sender=tenant.admin, title=title,
+                    message=message.format(task=rng.choice(TASK_TITLES)),
+                    read=rng.random() < (0.95 if at < recent else 0.3),
+                ))
+                sent_at.append(at)
+        rows = self._bulk(UserNotification, rows)
+        self._backdate(UserNotification, 'created_at', {row.pk: at for row, at in zip(rows, sent_at)})
+
+    def _payrolls(self, tenant):
+        """A locked batch for every full month generated, computed as the finalize action does."""
+        structure = tenant.structure
+        month = self.since if self.since.day == 1 else _month_end(self.since) + timedelta(days=1)
+        months = []
+        while _month_end(month) <= self.until:
+            months.append(month)
+            month = _month_end(month) + timedelta(days=1)
+        batches = self._bulk(PayrollBatch, [
+            PayrollBatch(company=tenant.company, month=m.month, year=m.year, status='Locked') for m in months
+        ])
+
+        total_days = structure.total_working_days or 30
+        rows = []
+        for batch, first_day in zip(batches, months):
+            last_day = _month_end(first_day)
+            for employee in tenant.employees:
+                if employee.date_of_joining > last_day:
+                    continue
+                gross = employee.gross_salary
+                basic = gross * structure.basic_percent / 100
+                paid_leaves = unpaid_leaves = 0
+                for day, leave_type in tenant.leave_days[employee.id].items():
+                    if first_day <= day <= last_day:
+                        if leave_type.is_paid:
+                            paid_leaves += 1
+                        else:
+                            unpaid_leaves += 1
+                days_paid = tenant.present[(employee.id, first_day.year, first_day.month)] + paid_leaves
+                pf = basic * Decimal('0.12')
+                slab = next((s for s in tenant.tax_slabs if s.salary_from <= gross <= s.salary_to), None)
+                income_tax = gross * slab.tax_percent / 100 if slab else Decimal(0)
+                net_pay = (gross / total_days * days_paid + tenant.extra_allowances
+                           - (pf + income_tax + tenant.extra_deductions))
+                rows.append(Payroll(
+                    batch=batch, company=tenant.company, employee=employee, salary_structure=structure,
+                    gross_salary=gross, basic_salary=_money(basic),
+                    hra=_money(gross * structure.hra_percent / 100),
+                    conveyance=_money(gross * structure.conveyance_percent / 100),
+                    medical=_money(gross * structure.medical_percent / 100),
+                    special_allowance=_money(gross * structure.special_percent / 100),
+                    service_charges=_money(gross * structure.service_charge_percent / 100),
+                    pf=_money(pf), income_tax=_money(income_tax), net_pay=_money(max(net_pay, Decimal(0))),
+                    total_working_days=total_days, days_paid=days_paid, loss_of_pay_days=unpaid_leaves,
+                    payroll_date=last_day,
+                ))
+        self._bulk(Payroll, rows)
+        # The payroll_changed signal does not see bulk writes
+        employee_ids = [employee.id for employee in tenant.employees]
+        transaction.on_commit(lambda: invalidate_dashboards(employee_ids, timezone.localdate()))
+
+    def _at(self, day, clock):
+        return timezone.make_aware(datetime.combine(day, clock), self.tz)
+
+    def _backdate(self, model, field, values):
+        """
+        Set an auto_now_add timestamp, which bulk_create always fills with the
+        current time, to the given {pk: value}.
+        """
+        table = connection.ops.quote_name(model._meta.db_table)
+        column = connection.ops.quote_name(model._meta.get_field(field).column)
+        items = list(values.items())
+        with connection.cursor() as cursor:
+            for offset in range(0, len(items), BATCH_SIZE):
+                chunk = items[offset:offset + BATCH_SIZE]
+                cursor.execute(
+                    f"""
+                    UPDATE {table} AS t SET {column} = v.value
+                    FROM unnest(%s::bigint[], %s::timestamptz[]) AS v(id, value)
+                    WHERE t.id = v.id
+                    """,
+                    [[pk for pk, _ in chunk], [value for _, value in chunk]],
+                )
@@ -0,0 +1,127 @@
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import (
+    BreakConfig, DepartmentWiseWorkingDays, IncomeTaxConfig, Leave, Level, SalaryStructure, ShiftPolicy,
+)
+
+CACHE_TIMEOUT = 60 * 60
+# Bumped by the shared-shift signal: shifts without a company belong to every snapshot
+SHARED = 'shared'
+
+
+class TenantConfig:
+    """
+    The slow-changing configuration of one company, loaded together: shifts
+    (its own and the shared ones), break configs, department working days,
+    leave types, income tax slabs, the current salary structure and levels.
+    Lists are in id order (levels by name, their usual order), so picking the
+    first match gives the same row as the `.filter(...).first()` lookups this
+    replaces.
+    """
+
+    def __init__(self, company_id):
+        self.company_id = company_id
+        self.shifts = list(
+            ShiftPolicy.objects.filter(Q(company_id=company_id) | Q(company__isnull=True)).order_by('id')
+        )
+        self.break_configs = list(BreakConfig.objects.filter(company_id=company_id).order_by('id'))
+        # Older working-days rows have no company of their own, only their department's
+        self.working_days = list(
+            DepartmentWiseWorkingDays.objects.filter(Q(company_id=company_id) | Q(department__company_id=company_id))
+            .prefetch_related('shifts')
+            .order_by('id')
+        )
+        self.leave_types = list(Leave.objects.filter(company_id=company_id).order_by('id'))
+        self.tax_slabs = list(IncomeTaxConfig.objects.filter(company_id=company_id).order_by('id'))
+        self.salary_structure = (
+            SalaryStructure.objects.filter(company_id=company_id)
+            .prefetch_related('allowances', 'deductions')
+            .order_by('-created_at')
+            .first()
+        )
+        self.levels = list(Level.objects.filter(company_id=company_id).order_by('level_name', 'id'))
+
+    @property
+    def company_shifts(self):
+        """The company's own shifts, without the shared ones."""
+        return [shift for shift in self.shifts if shift.company_id == self.company_id]
+
+    def default_shift(self):
+        shifts = self.company_shifts
+        return shifts[0] if shifts else None
+
+    def shift(self, shift_id):
+        return next((shift for shift in self.shifts if shift.id == shift_id), None)
+
+    def break_config(self, config_id):
+        return next((config for config in self.break_configs if config.id == config_id), None)
+
+    @property
+    def enabled_break_configs(self):
+        return [config for config in self.break_configs if config.enabled]
+
+    def working_days_for(self, department_id):
+        if not department_id:
+            return None
+        return next((wd for wd in self.working_days if wd.department_id == department_id), None)
+
+    def tax_slab_for(self, gross):
+        return next((slab for slab in self.tax_slabs if slab.salary_from <= gross <= slab.salary_to), None)
+
+    def salary_extras(self):
+        """(allowances, deductions) of the salary structure, as fixed amounts per month."""
+        if not self.salary_structure:
+            return Decimal(0), Decimal(0)
+        allowances = sum(a.amount or 0 for a in self.salary_structure.allowances.all()) or Decimal(0)
+        deductions = sum(d.amount or 0 for d in self.salary_structure.deductions.all()) or Decimal(0)
+        return allowances, deductions
+
+
+def _version_key(scope):
+    return f'tenant-config-version:{scope}'
+
+
+def get_config(company_id):
+    """
+    The configuration snapshot of a company, read through the cache. The cache
+    key carries the company's and the shared version, so a bumped version makes
+    every process load a fresh snapshot.
+    """
+    keys = [_version_key(company_id), _version_key(SHARED)]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            _start_version(key)
+        versions = cache.get_many(keys)
+    key = f'tenant-config:{company_id}:' + ':'.join(str(versions.get(k, 0)) for k in keys)
+
+    config = cache.get(key)
+    if config is None:
+        config = TenantConfig(company_id)
+        cache.set(key, config, CACHE_TIMEOUT)
+    return config
+
+
+def _start_version(key):
+    # A version that went missing (evicted, cache restarted) restarts from the
+    # clock rather than from 0, so it never matches a snapshot cached before.
+    cache.add(key, time.time_ns(), None)
+
+
+def invalidate(company_id=None):
+    """
+    Retire the cached snapshot of one company, or of every company for shared
+    config. Call it once the change is committed (see app.signals).
+    """
+    key = _version_key(company_id or SHARED)
+    _start_version(key)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr
+        _start_version(key)
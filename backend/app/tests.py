@@ -1,3 +1,425 @@
-from django.test import TestCase
+import tempfile
+from datetime import date, time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from notifications.models import OutboundEmail
+from notifications.outbox import deliver_pending
+
+from . import org_hierarchy
+from .leave_ledger import adjust_allowance, balances_for, sync_leave, sync_leaves
+from .models import (
+    Company, EmpLeave, Employee, EmployeeHierarchy, GeneratedLetter, Leave, LeaveLedgerEntry, LetterTemplate,
+    Payroll, PayrollBatch, RelievedEmployee, SalaryStructure, ShiftPolicy, UserRegister,
+)
+from .shift_resolver import DAY, ShiftTable
+from .synthetic_data import SyntheticDataGenerator
+
+
+def _render_letter_pdfs(company, title, contents, **kwargs):
+    return [b'%PDF-1.4'] * len(contents)
+
+
+class GenerateLetterContentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Queued attachments are written to storage
+        media = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        cls.addClassCleanup(media_settings.disable)
+
+    def setUp(self):
+        self.company = Company.objects.create(
+            name='Acme', address='1 Main St', email='hr@acme.example', phone_number='0000000000'
+        )
+        self.admin = UserRegister.objects.create_user(
+            username='acme-admin', password='x', role='admin', company=self.company
+        )
+        self.template = LetterTemplate.objects.create(
+            company=self.company, title='Relieving Letter', content='Dear <name>, last day <last_working_date>.'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    @mock.patch('app.views.generate_letter_pdf', return_value=b'%PDF-1.4')
+    def test_relieved_employee_letter(self, generate_letter_pdf):
+        employee = Employee.objects.create(
+            company=self.company, first_name='Asha', last_name='Rao', email='asha@example.com'
+        )
+        relieved = RelievedEmployee.objects.create(employee=employee, relieving_date=date(2026, 9, 30))
+
+        response = self.client.post(reverse('generate-letter-content'), {
+            'template_id': self.template.id,
+            'type': 'relieve',
+            'relieved_employee_id': relieved.id,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['email_status'], 'queued')
+        self.assertIn('2026-09-30', response.data['content'])
+        self.assertEqual(generate_letter_pdf.call_args.args[0], self.company)
+        letter = GeneratedLetter.objects.get(relieved_employee=relieved)
+        self.assertEqual(letter.id, response.data['generated_letter_id'])
+        self.assertEqual(OutboundEmail.objects.get().to, ['asha@example.com'])
+
+    @mock.patch('app.views.generate_letter_pdf', return_value=b'%PDF-1.4')
+    def test_letter_is_sent_once_delivered(self, generate_letter_pdf):
+        employee = Employee.objects.create(company=self.company, first_name='Ravi', email='ravi@example.com')
+        payload = {'template_id': self.template.id, 'type': 'offer', 'employee_id': employee.id}
+        url = reverse('generate-letter-content')
+
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.data['email_status'], 'queued')
+        letter = GeneratedLetter.objects.get(pk=response.data['generated_letter_id'])
+        self.assertFalse(letter.email_sent)
+        self.assertEqual(letter.outbound_email_id, response.data['outbound_email_id'])
+
+        # Still in the outbox: not queued a second time
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.data['email_status'], 'queued')
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+        # A failed delivery leaves the letter unsent, and it is queued again
+        OutboundEmail.objects.update(status='failed')
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.data['email_status'], 'queued')
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+        letter.refresh_from_db()
+        self.assertFalse(letter.email_sent)
+
+        self.assertEqual(deliver_pending()['sent'], 1)
+        letter.refresh_from_db()
+        self.assertTrue(letter.email_sent)
+        self.assertEqual(letter.email_sent_at, letter.outbound_email.sent_at)
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.data['email_status'], 'already_sent')
+
+    @mock.patch('app.views.render_letter_pdfs', side_effect=_render_letter_pdfs)
+    def test_bulk_letters_are_sent_once_delivered(self, render_letter_pdfs):
+        employees = [
+            Employee.objects.create(company=self.company, first_name=name, email=f'{name}@example.com')
+            for name in ('anil', 'bina')
+        ]
+        payload = {
+            'template_id': self.template.id, 'type': 'offer', 'recipient_type': 'employee',
+            'recipient_ids': [e.id for e in employees],
+        }
+        url = reverse('generate-letter-content-bulk')
+
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual([r['email_status'] for r in response.data['results']], ['queued', 'queued'])
+        self.assertFalse(GeneratedLetter.objects.filter(email_sent=True).exists())
+
+        first = OutboundEmail.objects.get(to=['anil@example.com'])
+        OutboundEmail.objects.filter(pk=first.pk).update(status='failed')
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual([r['email_status'] for r in response.data['results']], ['queued', 'queued'])
+        self.assertEqual(response.data['queued'], 1)
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+        # Only the letter whose email failed is rendered again
+        self.assertEqual(len(render_letter_pdfs.call_args.args[2]), 1)
+
+        self.assertEqual(deliver_pending()['sent'], 2)
+        self.assertEqual(GeneratedLetter.objects.filter(email_sent=True).count(), 2)
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual([r['email_status'] for r in response.data['results']], ['already_sent', 'already_sent'])
+
+    def test_bulk_letters_reject_candidates(self):
+        # Candidates have no company, so a bulk request could reach other tenants' applicants
+        response = self.client.post(reverse('generate-letter-content-bulk'), {
+            'template_id': self.template.id, 'type': 'offer', 'recipient_type': 'candidate',
+            'recipient_ids': [1],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_preview_fills_both_placeholder_syntaxes(self):
+        url = reverse('lettertemplate-preview', args=[self.template.id])
+        data = {'name': 'Asha', 'last_working_date': '2026-09-30'}
+
+        response = self.client.post(url, {'candidate_data': data}, format='json')
+        self.assertEqual(response.data['preview_text'], 'Dear Asha, last day 2026-09-30.')
+        self.assertEqual(response.data['deprecated_placeholders'], [])
+
+        self.template.content = 'Dear $name, last day ${last_working_date}. Ref <reference_id>.'
+        self.template.save()
+        response = self.client.post(url, {'candidate_data': data}, format='json')
+        self.assertEqual(response.data['preview_text'], 'Dear Asha, last day 2026-09-30. Ref <reference_id>.')
+        self.assertEqual(response.data['deprecated_placeholders'], ['last_working_date', 'name'])
+        self.assertEqual(response.data['placeholders'], ['last_working_date', 'name', 'reference_id'])
+
+
+def _at(hour, minute=0, second=0):
+    return hour * 3600 + minute * 60 + second
+
+
+class ShiftTableTests(SimpleTestCase):
+    def setUp(self):
+        self.day = ShiftPolicy(shift_type='day', checkin=time(9), checkout=time(18))
+        self.night = ShiftPolicy(shift_type='night', checkin=time(22), checkout=time(6))
+        self.table = ShiftTable([self.day, self.night])
+
+    def test_overnight_shift_starting_today(self):
+        # Selectable from two hours before it starts, up to midnight
+        self.assertEqual(self.table.resolve(_at(20)), (self.night, _at(22)))
+        self.assertEqual(self.table.resolve(_at(23, 59, 59)), (self.night, _at(22)))
+
+    def test_yesterdays_overnight_shift_spills_into_today(self):
+        self.assertEqual(self.table.resolve(0), (self.night, _at(22) - DAY))
+        self.assertEqual(self.table.resolve(_at(3)), (self.night, _at(22) - DAY))
+
+    def test_window_includes_its_last_second(self):
+        # Two hours of work must be left: the night shift ends at 06:00, the day shift at 18:00
+        self.assertEqual(self.table.resolve(_at(4)), (self.night, _at(22) - DAY))
+        self.assertEqual(self.table.resolve(_at(4, 0, 1)), (self.day, _at(9)))
+        self.assertEqual(self.table.resolve(_at(16)), (self.day, _at(9)))
+        # Past the window, the nearest upcoming check-in is used
+        self.assertEqual(self.table.resolve(_at(16, 0, 1)), (self.night, _at(22)))
+
+    def test_window_opens_early(self):
+        self.assertEqual(self.table.resolve(_at(7)), (self.day, _at(9)))
+        self.assertEqual(self.table.resolve(_at(19, 59, 59)), (self.night, _at(22)))
+
+    def test_no_shifts(self):
+        self.assertEqual(ShiftTable([]).resolve(_at(9)), (None, None))
+
+
+class SyntheticPayrollTests(TestCase):
+    def test_bulk_payroll_drops_cached_dashboards(self):
+        generator = SyntheticDataGenerator(
+            employees=4, departments=1, days=62, tasks_per_manager=0, notifications_per_employee=0
+        )
+        with mock.patch('app.synthetic_data.invalidate_dashboards') as invalidate_dashboards:
+            with self.captureOnCommitCallbacks(execute=True):
+                generator.run()
+
+        self.assertGreater(generator.counts['Payroll'], 0)
+        employee_ids, _ = invalidate_dashboards.call_args.args
+        self.assertCountEqual(employee_ids, Employee.objects.values_list('id', flat=True))
+
+
+class PayrollFinalizeTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(
+            name='Acme', address='1 Main St', email='hr@acme.example', phone_number='0000000000'
+        )
+        SalaryStructure.objects.create(
+            company=self.company, basic_percent=50, hra_percent=20, total_working_days=30
+        )
+        self.employee = Employee.objects.create(company=self.company, first_name='Ravi', gross_salary=30000)
+        admin = UserRegister.objects.create_user(
+            username='acme-admin', password='x', role='admin', company=self.company
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def _finalize(self, year, month):
+        batch = PayrollBatch.objects.create(company=self.company, year=year, month=month, status='Draft')
+        response = self.client.post(reverse('payroll-batches-finalize', args=[batch.pk]))
+        self.assertEqual(response.status_code, 200, response.data)
+        return Payroll.objects.get(batch=batch, employee=self.employee)
+
+    def test_leave_spanning_two_months_is_split_between_them(self):
+        casual = Leave.objects.create(company=self.company, leave_name='Casual', count=12)
+        unpaid = Leave.objects.create(company=self.company, leave_name='Unpaid', count=0, is_paid=False)
+        for leave_type, from_date, to_date in [
+            (casual, date(2026, 1, 30), date(2026, 2, 2)),
+            (unpaid, date(2026, 2, 27), date(2026, 3, 3)),
+        ]:
+            EmpLeave.objects.create(
+                company=self.company, employee=self.employee, leave_type=leave_type,
+                from_date=from_date, to_date=to_date, status='Approved',
+            )
+
+        january, february = self._finalize(2026, 1), self._finalize(2026, 2)
+
+        self.assertEqual((january.days_paid, january.loss_of_pay_days), (2, 0))
+        self.assertEqual((february.days_paid, february.loss_of_pay_days), (2, 2))
+        # 2 paid days at 1000 a day, less PF of 12% on a basic of 15000
+        self.assertEqual(january.net_pay, Decimal('200.00'))
+
+
+class OrgHierarchyTests(TestCase):
+    def setUp(self):
+        company = Company.objects.create(
+            name='Acme', address='1 Main St', email='hr@acme.example', phone_number='0000000000'
+        )
+        self.company = company
+        self.ceo = Employee.objects.create(company=company, first_name='Ceo')
+        self.cto = Employee.objects.create(company=company, first_name='Cto', reporting_manager=self.ceo)
+        self.cfo = Employee.objects.create(company=company, first_name='Cfo', reporting_manager=self.ceo)
+        self.dev = Employee.objects.create(company=company, first_name='Dev', reporting_manager=self.cto)
+
+    def _closure(self):
+        return set(EmployeeHierarchy.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def test_reparenting_moves_the_subtree(self):
+        self.cto.reporting_manager = self.cfo
+        self.cto.save()
+
+        self.assertEqual(list(org_hierarchy.chain_of(self.dev)), [self.cto, self.cfo, self.ceo])
+        self.assertCountEqual(org_hierarchy.reports_of(self.cfo), [self.cto, self.dev])
+        self.assertTrue(org_hierarchy.is_under(self.dev.id, self.cfo.id))
+        # Same rows as rebuilding from reporting_manager
+        closure = self._closure()
+        org_hierarchy.rebuild(self.company.id)
+        self.assertEqual(self._closure(), closure)
+
+    def test_reporting_loops_are_refused(self):
+        for employee in (self.ceo, self.dev):
+            self.ceo.reporting_manager = employee
+            with self.assertRaises(org_hierarchy.HierarchyCycleError):
+                self.ceo.save()
+        self.ceo.refresh_from_db()
+        self.assertIsNone(self.ceo.reporting_manager_id)
+        self.assertEqual(list(org_hierarchy.chain_of(self.dev)), [self.cto, self.ceo])
+
+    def test_rebuild_breaks_existing_loops(self):
+        closure = self._closure()
+        # Written past the save signals, as old data could be
+        Employee.objects.filter(pk=self.ceo.pk).update(reporting_manager=self.dev)
+
+        rows, cut = org_hierarchy.rebuild(self.company.id)
+
+        self.assertEqual(cut, [self.ceo.id])
+        self.ceo.refresh_from_db()
+        self.assertIsNone(self.ceo.reporting_manager_id)
+        self.assertEqual(self._closure(), closure)
+        self.assertEqual(rows, len(closure))
+
+    def test_deleting_a_manager_detaches_their_reports(self):
+        self.cto.delete()
+
+        self.dev.refresh_from_db()
+        self.assertIsNone(self.dev.reporting_manager_id)
+        self.assertEqual(list(org_hierarchy.chain_of(self.dev)), [])
+        self.assertCountEqual(org_hierarchy.reports_of(self.ceo), [self.cfo])
+        closure = self._closure()
+        org_hierarchy.rebuild(self.company.id)
+        self.assertEqual(self._closure(), closure)
+
+
+class LeaveLedgerTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(
+            name='Acme', address='1 Main St', email='hr@acme.example', phone_number='0000000000'
+        )
+        self.employee = Employee.objects.create(company=self.company, first_name='Ravi')
+        self.casual = Leave.objects.create(company=self.company, leave_name='Casual', count=12)
+        self.year = date.today().year
+
+    def _leave(self, from_date, to_date, status='Approved'):
+        return EmpLeave.objects.create(
+            company=self.company, employee=self.employee, leave_type=self.casual,
+            from_date=from_date, to_date=to_date, status=status,
+        )
+
+    def _used(self, year=None):
+        balance = balances_for(self.employee, year).get(self.casual.id)
+        return (balance.accrued, balance.used) if balance else None
+
+    def test_approval_is_debited_once(self):
+        leave = self._leave(date(self.year, 3, 2), date(self.year, 3, 4))
+        sync_leave(leave)
+        sync_leave(leave)
+
+        self.assertEqual(self._used(), (12, 3))
+        self.assertEqual(
+            list(LeaveLedgerEntry.objects.order_by('id').values_list('entry_type', 'days')),
+            [('accrual', 12), ('debit', -3)],
+        )
+
+    def test_pending_leave_is_not_debited(self):
+        sync_leave(self._leave(date(self.year, 3, 2), date(self.year, 3, 4), status='Pending'))
+        self.assertIsNone(self._used())
+
+    def test_rejected_or_cancelled_approval_is_credited_back(self):
+        for status in ('Rejected', 'Cancelled'):
+            with self.subTest(status=status):
+                leave = self._leave(date(self.year, 3, 2), date(self.year, 3, 4))
+                sync_leave(leave)
+                leave.status = status
+                leave.save()
+                sync_leave(leave)
+
+                self.assertEqual(self._used(), (12, 0))
+                self.assertEqual(
+                    list(leave.ledger_entries.order_by('id').values_list('entry_type', 'days')),
+                    [('debit', -3), ('credit', 3)],
+                )
+
+    def test_changed_dates_move_the_debit(self):
+        leave = self._leave(date(self.year, 3, 2), date(self.year, 3, 4))
+        sync_leave(leave)
+        leave.to_date = date(self.year, 3, 6)
+        leave.save()
+        sync_leave(leave)
+        self.assertEqual(self._used(), (12, 5))
+
+    def test_deleted_leave_gives_its_days_back(self):
+        leave = self._leave(date(self.year, 3, 2), date(self.year, 3, 4))
+        sync_leave(leave)
+        leave.delete()
+
+        self.assertEqual(self._used(), (12, 0))
+        # The history stays, unlinked from the deleted request
+        self.assertEqual(LeaveLedgerEntry.objects.filter(emp_leave__isnull=True, entry_type='credit').count(), 1)
+
+    def test_leave_over_new_year_is_split_by_year(self):
+        leave = self._leave(date(self.year, 12, 30), date(self.year + 1, 1, 2))
+        sync_leaves([leave])
+
+        self.assertEqual(self._used(self.year), (12, 2))
+        self.assertEqual(self._used(self.year + 1), (12, 2))
+
+        leave.status = 'Rejected'
+        leave.save()
+        sync_leaves([leave])
+        self.assertEqual(self._used(self.year), (12, 0))
+        self.assertEqual(self._used(self.year + 1), (12, 0))
+
+    def test_allowance_change_adjusts_this_years_balances(self):
+        sync_leave(self._leave(date(self.year, 3, 2), date(self.year, 3, 4)))
+        self.casual.count = 15
+        # The Leave save signal calls adjust_allowance
+        self.casual.save()
+
+        self.assertEqual(self._used(), (15, 3))
+        self.assertEqual(balances_for(self.employee)[self.casual.id].remaining, 12)
+        adjustment = LeaveLedgerEntry.objects.get(entry_type='adjustment')
+        self.assertEqual(adjustment.days, 3)
+
+        # Called again with the count already applied, nothing changes
+        adjust_allowance(self.casual, 15)
+        self.assertEqual(self._used(), (15, 3))
+
+    def test_resolving_overlapping_leaves(self):
+        # Written before the exclusion constraint existed
+        approved = self._leave(date(self.year, 3, 2), date(self.year, 3, 6))
+        sync_leave(approved)
+        overlapping = self._leave(date(self.year, 3, 5), date(self.year, 3, 9))
+        sync_leave(overlapping)
+        pending = self._leave(date(self.year, 3, 1), date(self.year, 3, 2), status='Pending')
+        separate = self._leave(date(self.year, 4, 1), date(self.year, 4, 1))
+        sync_leave(separate)
+        self.assertEqual(self._used(), (12, 11))
+
+        out = StringIO()
+        call_command('resolve_overlapping_leaves', stdout=out)
+        self.assertIn(f'leave {overlapping.id} (Approved', out.getvalue())
+        self.assertIn(f'leave {pending.id} (Pending', out.getvalue())
+        self.assertEqual(EmpLeave.objects.filter(status='Cancelled').count(), 0)
+
+        call_command('resolve_overlapping_leaves', '--apply', stdout=StringIO())
+        self.assertCountEqual(
+            EmpLeave.objects.filter(status='Cancelled').values_list('id', flat=True), [overlapping.id, pending.id]
+        )
+        self.assertEqual(self._used(), (12, 6))
@@ -42,10 +42,13 @@ urlpatterns = [
     path('master-dashboard/', MasterDashboardView.as_view(), name='master_dashboard'),
     path('admin-dashboard/', AdminDashboardAPIView.as_view(), name='admin-dashboard'),
     path('company-logo/', CompanyLogoAPIView.as_view(), name='company_logo_get_by_admin'),
+    path('org-tree/', OrgTreeAPIView.as_view(), name='org_tree'),
     path('users/<int:pk>/', UserLogDeleteView.as_view(), name='delete_user_api'),
     path('approved-leaves/', ApprovedLeaveLogView.as_view(), name='approved_leave_log'),
     path('rejected-leaves/', RejectedLeaveLogView.as_view(), name='rejected_leave_log'),
     path('attendance-logs/', AttendanceLogView.as_view(), name='attendance_log'),
     path('generate-payroll/', GeneratePayrollView.as_view(), name='generate-payroll'),
+    path('profiling/', ProfilingStatsView.as_view(), name='profiling-stats'),
     path('generate-letter-content/', GenerateLetterContentAPIView.as_view(), name='generate-letter-content'),
+    path('generate-letter-content/bulk/', BulkGenerateLetterAPIView.as_view(), name='generate-letter-content-bulk'),
 ]
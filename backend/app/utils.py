@@ -1,7 +1,12 @@
+import os
+import threading
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from weasyprint import HTML
 from django.utils import timezone
 from django.template.loader import render_to_string
+from django.contrib.auth.hashers import make_password
 
 def generate_payslip_pdf(employee, payroll, batch, company=None, logo_path=None):
     # Compute extra allowances and deductions from related objects if available
@@ -40,25 +45,28 @@ def generate_payslip_pdf(employee, payroll, batch, company=None, logo_path=None)
     pdf_file.seek(0)
     return pdf_file
 
-def generate_letter_pdf(company, letter_title, letter_content, request=None):
-    """
-    Generate a PDF for a letter using the dynamic letter_template.html and full company context.
-    """
-
-    import os
+def resolve_letter_logo_url(company, request=None):
     from django.conf import settings
-    current_date_str = timezone.now().strftime("%B %d, %Y")
-    # Resolve logo path to full URL
-    logo_url = None
     if company and getattr(company, 'logo', None):
         if hasattr(company.logo, 'url'):
             # Build full URL using request or settings
             if request:
-                logo_url = request.build_absolute_uri(company.logo.url)
-            else:
-                # Fallback: try to build URL from settings
-                domain = getattr(settings, 'SITE_URL', 'http://localhost:8000')
-                logo_url = f"{domain}{company.logo.url}"
+                return request.build_absolute_uri(company.logo.url)
+            # Fallback: try to build URL from settings
+            domain = getattr(settings, 'SITE_URL', 'http://localhost:8000')
+            return f"{domain}{company.logo.url}"
+    return None
+
+
+def generate_letter_pdf(company, letter_title, letter_content, request=None, logo_url=None):
+    """
+    Generate a PDF for a letter using the dynamic letter_template.html and full company context.
+    Pass `logo_url` when it is already resolved (e.g. when rendering outside a request).
+    """
+    current_date_str = timezone.now().strftime("%B %d, %Y")
+    # Resolve logo path to full URL
+    if logo_url is None:
+        logo_url = resolve_letter_logo_url(company, request)
 
     context = {
         "company_logo_url": logo_url,
@@ -81,9 +89,115 @@ def generate_letter_pdf(company, letter_title, letter_content, request=None):
     return pdf_file.getvalue()
 
 
+def _render_letter_pdf(args):
+    company, letter_title, letter_content, logo_url = args
+    return generate_letter_pdf(company, letter_title, letter_content, logo_url=logo_url)
+
+
+def render_letter_pdfs(company, letter_title, contents, logo_url=None, min_pool_size=4):
+    """
+    Render one letter PDF per entry in `contents`, in order.
+    WeasyPrint is CPU bound, so larger batches are spread over the shared process pool.
+    """
+    jobs = [(company, letter_title, content, logo_url) for content in contents]
+    if len(jobs) < min_pool_size:
+        return [_render_letter_pdf(job) for job in jobs]
+    return _pool_map(_render_letter_pdf, jobs)
+
+
+def letter_placeholder_data(obj, obj_type, company=None):
+    """
+    Placeholder values for a letter recipient. `obj_type` is 'employee',
+    'candidate' or 'relievedemployee'; `company` is used for candidates.
+    """
+    if obj_type == 'employee':
+        return {
+            'name': obj.full_name,
+            'employee_id': obj.employee_id,
+            'designation': obj.designation.designation_name if obj.designation else '',
+            'department': obj.department.department_name if obj.department else '',
+            'joining_date': obj.date_of_joining.strftime('%Y-%m-%d') if obj.date_of_joining else '',
+            'last_working_date': obj.date_of_releaving.strftime('%Y-%m-%d') if obj.date_of_releaving else '',
+            'ctc': str(obj.ctc) if obj.ctc else '',
+            'company': obj.company.name if obj.company else '',
+            'location': obj.company.location if obj.company else '',
+        }
+    if obj_type == 'candidate':
+        return {
+            'name': obj.name,
+            'designation': obj.job_title,
+            'joining_date': obj.appointment_date.strftime('%Y-%m-%d') if obj.appointment_date else '',
+            'ctc': str(obj.salary) if obj.salary else '',
+            'company': company.name if company else '',
+            'location': company.location if company else '',
+            'address': obj.address or '',
+        }
+    if obj_type == 'relievedemployee':
+        emp = obj.employee
+        return {
+            'name': emp.full_name,
+            'employee_id': emp.employee_id,
+            'designation': emp.designation.designation_name if emp.designation else '',
+            'department': emp.department.department_name if emp.department else '',
+            'joining_date': emp.date_of_joining.strftime('%Y-%m-%d') if emp.date_of_joining else '',
+            'last_working_date': obj.relieving_date.strftime('%Y-%m-%d') if obj.relieving_date else '',
+            'ctc': str(emp.ctc) if emp.ctc else '',
+            'company': emp.company.name if emp.company else '',
+            'location': emp.company.location if emp.company else '',
+        }
+    return {}
+
+
 def fill_placeholders(text, data):
-    import re
-    def replacer(match):
-        key = match.group(1)
-        return str(data.get(key, f'<{key}>'))
-    return re.sub(r'<([a-zA-Z0-9_]+)>', replacer, text)
\ No newline at end of file
+    from .letter_templates import compile_text
+    return compile_text(text).render(data)
+
+
+def _init_django_worker():
+    # Spawned workers (non-fork platforms) start without a configured Django.
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+# Kept small: every web process that renders letters or imports employees owns one
+PROCESS_POOL_WORKERS = min(4, os.cpu_count() or 1)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _pool_map(func, items, chunksize=1):
+    """
+    Map `func` over `items` in the process pool shared by the CPU-bound helpers
+    below. The pool is started on first use and kept for the life of the
+    process; it is replaced when a worker dies.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PROCESS_POOL_WORKERS, initializer=_init_django_worker)
+        pool = _pool
+    try:
+        return list(pool.map(func, items, chunksize=chunksize))
+    except BrokenProcessPool:
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+
+
+def _hash_password(raw_password):
+    return make_password(raw_password)
+
+
+def hash_passwords(raw_passwords, min_pool_size=20):
+    """
+    Hash a list of raw passwords, spreading the work over the shared process pool.
+    Small lists are hashed inline since handing them to the pool costs more than it saves.
+    """
+    raw_passwords = list(raw_passwords)
+    if len(raw_passwords) < min_pool_size:
+        return [make_password(p) for p in raw_passwords]
+    return _pool_map(_hash_password, raw_passwords, chunksize=8)
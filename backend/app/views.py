@@ -1,5 +1,4 @@
 from rest_framework import viewsets, generics, status
-import string
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils.timezone import localtime
@@ -14,10 +13,21 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from datetime import date
 import io
 from django.utils import timezone
-from .utils import generate_letter_pdf, fill_placeholders
+from .utils import (
+    generate_letter_pdf, fill_placeholders, letter_placeholder_data, resolve_letter_logo_url,
+    render_letter_pdfs,
+)
+from .letter_templates import compile_template, compile_text, fill_legacy_placeholders, legacy_placeholders
 from decimal import Decimal
 from django.core.mail import EmailMessage
 from .utils import generate_payslip_pdf
+from django.conf import settings
+from notifications.outbox import queue_email, queue_messages
+from .employee_import import EmployeeImporter, ImportFileError, iter_import_rows
+from .org_hierarchy import org_tree
+from .leave_intervals import company_coverage, leave_day_counts
+from .tenant_config import get_config
+from . import profiling
 from rest_framework import viewsets, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -202,6 +212,25 @@ class CompanyLogoAPIView(APIView):
         return Response(serializer.data)
 
 
+class OrgTreeAPIView(APIView):
+    """Org chart of the user's company as nested reportees; ?root=<employee id> for one branch."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        employee = request.user.employee_profile
+        company_id = employee.company_id if employee else request.user.company_id
+        if not company_id:
+            return Response({'detail': 'No company found.'}, status=404)
+
+        root_id = request.query_params.get('root')
+        if root_id:
+            if not root_id.isdigit() or not Employee.objects.filter(id=root_id, company_id=company_id).exists():
+                return Response({'detail': 'Employee not found.'}, status=404)
+            root_id = int(root_id)
+
+        return Response({'tree': org_tree(company_id, root_id)})
+
+
 class CompanyUpdateAPIView(APIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
     
@@ -240,8 +269,7 @@ class AdminDashboardAPIView(APIView):
         # Leaves today
         leaves_today = EmpLeave.objects.filter(
             company=company,
-            from_date__lte=today,
-            to_date__gte=today,
+            period__contains=today,
             status='Approved'
         ).count()
 
@@ -277,8 +305,7 @@ class AdminDashboardAPIView(APIView):
         absent = Attendance.objects.filter(company=company, date=today, is_present=False).count()
         on_leave = EmpLeave.objects.filter(
             company=company,
-            from_date__lte=today,
-            to_date__gte=today,
+            period__contains=today,
             status='Approved'
         ).count()
 
@@ -373,7 +400,7 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         # Always return all levels linked to this company
         level_choices = [
             {"id": lvl.id, "name": lvl.level_name}
-            for lvl in Level.objects.filter(company=company)
+            for lvl in get_config(company.id).levels
         ]
 
         reporting_level_id = request.query_params.get('reporting_level_id')
@@ -402,6 +429,35 @@ class EmployeeViewSet(viewsets.ModelViewSet):
             "level_choices": level_choices
         })
 
+    @action(detail=False, methods=['post'], url_path='bulk-import')
+    def bulk_import(self, request):
+        """
+        Import employees from an uploaded CSV or XLSX file.
+        Returns a per-row report; valid rows are saved even if others fail.
+        """
+        company = getattr(request.user, 'company', None)
+        if not company:
+            return Response({"error": "User has no company"}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({"error": "file is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            chunk_size = int(request.data.get('chunk_size', 500))
+        except (TypeError, ValueError):
+            return Response({"error": "Invalid chunk_size"}, status=status.HTTP_400_BAD_REQUEST)
+        if chunk_size < 1:
+            return Response({"error": "Invalid chunk_size"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            rows = iter_import_rows(upload.file, upload.name)
+        except ImportFileError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = EmployeeImporter(company, chunk_size=chunk_size).run(rows)
+        return Response(report, status=status.HTTP_200_OK)
+
     
 class AssetInventoryViewSet(viewsets.ModelViewSet):
     serializer_class = AssetInventorySerializer
@@ -634,7 +690,8 @@ class PayrollBatchViewSet(viewsets.ModelViewSet):
             if batch.status == 'Locked':
                 return Response({'error': 'Batch already finalized.'}, status=400)
 
-            salary_structure = SalaryStructure.objects.filter(company=batch.company).order_by('-created_at').first()
+            config = get_config(batch.company_id)
+            salary_structure = config.salary_structure
             if not salary_structure:
                 return Response({'error': 'No Salary Structure found.'}, status=400)
 
@@ -643,6 +700,9 @@ class PayrollBatchViewSet(viewsets.ModelViewSet):
 
             first_day = date(batch.year, batch.month, 1)
             last_day = date(batch.year, batch.month, calendar.monthrange(batch.year, batch.month)[1])
+            # Leave days inside the month, including the part of leaves that span months
+            leave_counts = leave_day_counts(batch.company_id, first_day, last_day)
+            extra_allowances, extra_deductions = config.salary_extras()
 
             payroll_data = []
 
@@ -663,38 +723,19 @@ class PayrollBatchViewSet(viewsets.ModelViewSet):
                     date__range=(first_day, last_day)
                 ).values('date').distinct().count()
 
-                paid_leaves = EmpLeave.objects.filter(
-                    employee=emp,
-                    leave_type__is_paid=True,
-                    status='Approved',
-                    from_date__gte=first_day,
-                    to_date__lte=last_day
-                ).count()
-
-                lop_days = EmpLeave.objects.filter(
-                    employee=emp,
-                    leave_type__is_paid=False,
-                    status='Approved',
-                    from_date__gte=first_day,
-                    to_date__lte=last_day
-                ).count()
+                emp_leave_days = leave_counts.get(emp.id, {})
+                paid_leaves = emp_leave_days.get('paid', 0)
+                lop_days = emp_leave_days.get('unpaid', 0)
 
                 days_paid = present_days + paid_leaves
                 adjusted_gross = per_day_salary * Decimal(days_paid)
 
                 pf = basic * Decimal('0.12')
 
-                tax_slab = IncomeTaxConfig.objects.filter(
-                    company=batch.company,
-                    salary_from__lte=gross,
-                    salary_to__gte=gross
-                ).first()
+                tax_slab = config.tax_slab_for(gross)
 
                 income_tax = gross * (tax_slab.tax_percent / Decimal('100')) if tax_slab else Decimal(0)
 
-                extra_allowances = sum(a.amount for a in salary_structure.allowances.all()) or Decimal(0)
-                extra_deductions = sum(d.amount for d in salary_structure.deductions.all()) or Decimal(0)
-
                 net_pay = adjusted_gross + extra_allowances - (pf + income_tax + extra_deductions)
                 net_pay = max(net_pay, Decimal(0))
 
@@ -742,7 +783,8 @@ class PayrollBatchViewSet(viewsets.ModelViewSet):
         company = batch.company
         logo_path = company.logo.path if company.logo and hasattr(company.logo, 'path') else None
 
-        payrolls = Payroll.objects.filter(batch=batch)
+        payrolls = Payroll.objects.filter(batch=batch).select_related('employee')
+        messages = []
         for payroll in payrolls:
             employee = payroll.employee
             if not employee.email:
@@ -752,12 +794,16 @@ class PayrollBatchViewSet(viewsets.ModelViewSet):
             email = EmailMessage(
                 subject=f"Payslip for {batch.month}/{batch.year}",
                 body=f"Dear {employee.full_name},\n\nPlease find attached your payslip for {batch.month}/{batch.year}.\n\nRegards,\nHR Team",
+                from_email=settings.DEFAULT_FROM_EMAIL,
                 to=[employee.email]
             )
             email.attach(f"Payslip_{employee.employee_id}_{batch.month}_{batch.year}.pdf", pdf_buffer.read(), 'application/pdf')
-            email.send()
+            messages.append(email)
 
-        return Response({'message': 'Payslips sent to all employees.'})
+        # Delivered by the outbox worker (manage.py send_outbound_emails)
+        queue_messages(messages, company=company, created_by=request.user)
+
+        return Response({'message': f'Payslips queued for {len(messages)} employees.', 'queued': len(messages)})
 
            
 class GeneratePayrollView(APIView):
@@ -781,7 +827,8 @@ class GeneratePayrollView(APIView):
             defaults={'status': 'Draft'}
         )
 
-        salary_structure = SalaryStructure.objects.filter(company=company).order_by('-created_at').first()
+        config = get_config(company.id)
+        salary_structure = config.salary_structure
         if not salary_structure:
             return Response({'error': 'No Salary Structure found.'}, status=400)
 
@@ -790,6 +837,8 @@ class GeneratePayrollView(APIView):
 
         first_day = today.replace(day=1)
         last_day = today.replace(day=calendar.monthrange(year, month)[1])
+        leave_counts = leave_day_counts(company.id, first_day, last_day)
+        extra_allowances, extra_deductions = config.salary_extras()
 
         preview_data = []
 
@@ -810,38 +859,19 @@ class GeneratePayrollView(APIView):
                 date__range=(first_day, last_day)
             ).values('date').distinct().count()
 
-            paid_leaves = EmpLeave.objects.filter(
-                employee=emp,
-                leave_type__is_paid=True,
-                status='Approved',
-                from_date__gte=first_day,
-                to_date__lte=last_day
-            ).count()
-
-            lop_days = EmpLeave.objects.filter(
-                employee=emp,
-                leave_type__is_paid=False,
-                status='Approved',
-                from_date__gte=first_day,
-                to_date__lte=last_day
-            ).count()
+            emp_leave_days = leave_counts.get(emp.id, {})
+            paid_leaves = emp_leave_days.get('paid', 0)
+            lop_days = emp_leave_days.get('unpaid', 0)
 
             days_paid = present_days + paid_leaves
             adjusted_gross = per_day_salary * Decimal(days_paid)
 
             pf = basic * Decimal('0.12')
 
-            tax_slab = IncomeTaxConfig.objects.filter(
-                company=company,
-                salary_from__lte=gross,
-                salary_to__gte=gross
-            ).first()
+            tax_slab = config.tax_slab_for(gross)
 
             income_tax = gross * (tax_slab.tax_percent / Decimal('100')) if tax_slab else Decimal(0)
 
-            extra_allowances = sum(a.amount for a in salary_structure.allowances.all()) or Decimal(0)
-            extra_deductions = sum(d.amount for d in salary_structure.deductions.all()) or Decimal(0)
-
             net_pay = adjusted_gross + extra_allowances - (pf + income_tax + extra_deductions)
             net_pay = max(net_pay, Decimal(0))
 
@@ -929,20 +959,16 @@ class AttendanceViewSet(viewsets.ModelViewSet):
 
 
         company = request.user.company
+        config = get_config(company.id)
         employees = Employee.objects.filter(company=company)
 
+        # A date range rather than date__month, so the (company, date) index applies
         attendance_qs = Attendance.objects.filter(
-            date__year=year,
-            date__month=month,
+            date__range=(month_dates[0], month_dates[-1]),
             company=company
         ).select_related('employee', 'shift')
 
-        approved_leaves = EmpLeave.objects.filter(
-            status='Approved',
-            from_date__lte=month_dates[-1],
-            to_date__gte=month_dates[0],
-            company=company
-        ).select_related('leave_type', 'employee')
+        leave_coverage = company_coverage(company.id, month_dates[0], month_dates[-1])
 
         holidays = CalendarEvent.objects.filter(
             is_holiday=True,
@@ -965,7 +991,7 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         for emp in employees:
             emp_id = emp.id
 
-            dw = DepartmentWiseWorkingDays.objects.filter(department=emp.department_name).first()
+            dw = config.working_days_for(emp.department_id)
             valid_days = build_valid_days(dw.week_start_day, dw.week_end_day) if dw else []
 
             daily_records = {}
@@ -987,7 +1013,7 @@ class AttendanceViewSet(viewsets.ModelViewSet):
 
             attendance_records[emp_id] = {
                 'employee_id': emp.id,
-                'employee_name': emp.name,
+                'employee_name': emp.full_name,
                 'daily_records': daily_records,
                 'total_hours': 0.0,
                 'attendance_percentage': 0.0,
@@ -1003,19 +1029,15 @@ class AttendanceViewSet(viewsets.ModelViewSet):
                     daily['holiday_name'] = holiday.name
 
         # Mark approved leaves
-        for leave in approved_leaves:
-            emp_id = leave.employee.id
-            leave_days = [
-                leave.from_date + timedelta(days=i)
-                for i in range((leave.to_date - leave.from_date).days + 1)
-            ]
-            for day in leave_days:
-                day_str = str(day)
-                if emp_id in attendance_records and day_str in attendance_records[emp_id]['daily_records']:
-                    daily = attendance_records[emp_id]['daily_records'][day_str]
-                    if daily['status'] != 'H':
-                        daily['status'] = 'L'
-                        daily['leave_type'] = leave.leave_type.leave_name if leave.leave_type else ''
+        for emp_id, leave_days in leave_coverage.items():
+            if emp_id not in attendance_records:
+                continue
+            daily_records = attendance_records[emp_id]['daily_records']
+            for day, leave_name in leave_days.items():
+                daily = daily_records.get(str(day))
+                if daily and daily['status'] != 'H':
+                    daily['status'] = 'L'
+                    daily['leave_type'] = leave_name
 
         # Punch, worked hours
         for record in attendance_qs:
@@ -1044,7 +1066,7 @@ class AttendanceViewSet(viewsets.ModelViewSet):
                 pout = timezone.localtime(record.check_out)
                 worked_seconds = (pout - pin).total_seconds()
 
-                breaks = record.breaks.all()
+                breaks = record.break_logs.all()
                 for b in breaks:
                     if b.start and b.end:
                         worked_seconds -= (b.end - b.start).total_seconds()
@@ -1107,7 +1129,7 @@ class AttendanceLogView(APIView):
             return Response({'error': 'employee_id and date are required.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            emp = Employee.objects.get(employee_id=employee_id)
+            emp = Employee.objects.get(company=request.user.company, employee_id=employee_id)
         except Employee.DoesNotExist:
             return Response({'error': 'Employee not found.'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -1167,6 +1189,7 @@ class AttendanceLogView(APIView):
             company=request.user.company
         )
         holidays_dict = {h.date: h.name for h in holidays}
+        config = get_config(request.user.company_id)
 
         # Get employees with related data
         employees = Employee.objects.filter(
@@ -1184,10 +1207,7 @@ class AttendanceLogView(APIView):
             ).select_related('shift').prefetch_related('break_logs')
             
             # Get department working days configuration
-            dept_working_days = DepartmentWiseWorkingDays.objects.filter(
-                department=emp.department,
-                company=request.user.company
-            ).first()
+            dept_working_days = config.working_days_for(emp.department_id)
             
             # Determine working days for this employee
             working_days = self._get_working_days_for_month(
@@ -1201,7 +1221,7 @@ class AttendanceLogView(APIView):
 
             # Process each attendance record
             for att in attendance_qs:
-                daily_record = self._process_attendance_record(att, emp.company)
+                daily_record = self._process_attendance_record(att, config)
                 daily_data.append(daily_record)
                 
                 # Count status types
@@ -1306,7 +1326,7 @@ class AttendanceLogView(APIView):
             hours_variance = total_worked_hours - total_expected_hours
 
             # Get company's shift policies for reference
-            company_shifts = ShiftPolicy.objects.filter(company=request.user.company)
+            company_shifts = config.company_shifts
             shift_policies_info = [
                 {
                     "id": shift.id,
@@ -1371,41 +1391,24 @@ class AttendanceLogView(APIView):
         """Get all working days for the month excluding weekends and holidays"""
         working_days = []
         current_date = start_date
-        
-        # Define weekday mapping
-        weekdays = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-        
-        if dept_working_days:
-            # Get valid working days based on department configuration
-            start_idx = weekdays.index(dept_working_days.week_start_day.lower())
-            end_idx = weekdays.index(dept_working_days.week_end_day.lower())
-            
-            if start_idx <= end_idx:
-                valid_weekdays = weekdays[start_idx:end_idx + 1]
-            else:
-                valid_weekdays = weekdays[start_idx:] + weekdays[:end_idx + 1]
-        else:
-            # Default to Monday-Friday
-            valid_weekdays = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+        valid_weekdays = DepartmentWiseWorkingDays.weekdays_of(dept_working_days)
         
         while current_date <= end_date:
-            day_name = current_date.strftime('%A').lower()
-            
             # Include if it's a valid working day and not a holiday
-            if day_name in valid_weekdays and current_date not in holidays:
+            if current_date.weekday() in valid_weekdays and current_date not in holidays:
                 working_days.append(current_date)
             
             current_date += timedelta(days=1)
         
         return working_days
 
-    def _process_attendance_record(self, attendance, company):
+    def _process_attendance_record(self, attendance, config):
         """Process a single attendance record and return comprehensive data"""
         shift_policy = attendance.shift
         
         # If no shift assigned, get company's default shift
         if not shift_policy:
-            shift_policy = ShiftPolicy.objects.filter(company=company).first()
+            shift_policy = config.default_shift()
         
         # Calculate basic worked hours
         worked_hours = 0.0
@@ -1621,22 +1624,32 @@ class LetterTemplateViewSet(viewsets.ModelViewSet):
         template = self.get_object()
         candidate_data = request.data.get("candidate_data", {})
 
-        try:
-            # Use safe Python string.Template
-            tmpl = string.Template(template.content)
-            rendered_text = tmpl.safe_substitute(candidate_data)  
-            
-            return Response({
-                "template_id": template.id,
-                "preview_text": rendered_text,
-                "input_data": candidate_data
-            }, status=status.HTTP_200_OK)
+        if not isinstance(candidate_data, dict):
+            return Response({"error": "candidate_data must be an object."}, status=status.HTTP_400_BAD_REQUEST)
 
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # Same <placeholder> syntax as letter generation. `$name` is still filled
+        # for templates written for the old preview, and reported as deprecated.
+        legacy = legacy_placeholders(template.content)
+        if legacy:
+            compiled = compile_text(fill_legacy_placeholders(template.content, candidate_data))
+        else:
+            compiled = compile_template(template)
+        rendered_text = compiled.render(candidate_data)
+
+        return Response({
+            "template_id": template.id,
+            "preview_text": rendered_text,
+            "placeholders": sorted(compiled.placeholders | set(legacy)),
+            "deprecated_placeholders": legacy,
+            "input_data": candidate_data
+        }, status=status.HTTP_200_OK)
         
 
 
+# Placeholders filled in email bodies; the rest are left as typed
+EMAIL_PLACEHOLDERS = frozenset({'name', 'company'})
+
+
 class GenerateLetterContentAPIView(APIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
 
@@ -1688,55 +1701,16 @@ class GenerateLetterContentAPIView(APIView):
             return Response({'error': 'No valid person id provided.'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Build data dict for placeholders
-        data = {}
-        if obj_type == 'employee':
-            data = {
-                'name': obj.full_name,
-                'employee_id': obj.employee_id,
-                'designation': obj.designation.designation_name if obj.designation else '',
-                'department': obj.department.department_name if obj.department else '',
-                'joining_date': obj.date_of_joining.strftime('%Y-%m-%d') if obj.date_of_joining else '',
-                'last_working_date': obj.date_of_releaving.strftime('%Y-%m-%d') if obj.date_of_releaving else '',
-                'ctc': str(obj.ctc) if obj.ctc else '',
-                'company': obj.company.name if obj.company else '',
-                'location': obj.company.location if obj.company else '',
-            }
-        elif obj_type == 'candidate':
-            data = {
-                'name': obj.name,
-                'designation': obj.job_title,
-                'joining_date': obj.appointment_date.strftime('%Y-%m-%d') if obj.appointment_date else '',
-                'ctc': str(obj.salary) if obj.salary else '',
-                'company': request.user.company.name if hasattr(request.user, 'company') and request.user.company else '',
-                'location': request.user.company.location if hasattr(request.user, 'company') and request.user.company else '',
-                'address': obj.address or '',
-            }
-        elif obj_type == 'relievedemployee':
-            emp = obj.employee
-            data = {
-                'name': emp.full_name,
-                'employee_id': emp.employee_id,
-                'designation': emp.designation.designation_name if emp.designation else '',
-                'department': emp.department.department_name if emp.department else '',
-                'joining_date': emp.date_of_joining.strftime('%Y-%m-%d') if emp.date_of_joining else '',
-                'last_working_date': obj.relieving_date.strftime('%Y-%m-%d') if obj.relieving_date else '',
-                'ctc': str(emp.ctc) if emp.ctc else '',
-                'company': emp.company.name if emp.company else '',
-                'location': emp.company.location if emp.company else '',
-            }
-
-        # Find all placeholders in the template
-        placeholders = set(re.findall(r'<(\w+)>', template.content))
+        data = letter_placeholder_data(obj, obj_type, company=request.user.company)
 
-        # Replace placeholders in letter content
-        def replacer(match):
-            key = match.group(1)
-            return str(data.get(key, f'<{key}>'))
-        filled_content = re.sub(r'<(\w+)>', replacer, template.content)
+        # Find all placeholders in the template and fill them
+        compiled = compile_template(template)
+        placeholders = compiled.placeholders
+        filled_content = compiled.render(data)
 
         # Replace placeholders in email_content (only <name> and <company> for safety)
         if email_content:
-            email_content = re.sub(r'<(name|company)>', lambda m: str(data.get(m.group(1), f'<{m.group(1)}>')), email_content)
+            email_content = compile_text(email_content).render(data, only=EMAIL_PLACEHOLDERS)
 
         generated_letter = None
         if obj_type == 'candidate':
@@ -1783,14 +1757,16 @@ class GenerateLetterContentAPIView(APIView):
                 generated_letter.save()
 
         # --- EMAIL SENDING LOGIC ---
-        # Only send if not already sent
-        if hasattr(generated_letter, 'sent') and generated_letter.sent:
+        # Only send if not already sent, or waiting in the outbox; failed emails are queued again
+        email_status = generated_letter.email_status if generated_letter else None
+        if email_status in ('sent', 'queued'):
             return Response({
                 'content': filled_content,
                 'placeholders': list(placeholders),
                 'filled': data,
                 'generated_letter_id': generated_letter.id if generated_letter else None,
-                'email_status': 'already_sent'
+                'email_status': 'already_sent' if email_status == 'sent' else 'queued',
+                'outbound_email_id': generated_letter.outbound_email_id,
             }, status=status.HTTP_200_OK)
 
         # Generate PDF (implement generate_letter_pdf to return PDF bytes)
@@ -1801,33 +1777,30 @@ class GenerateLetterContentAPIView(APIView):
             elif obj_type == 'employee':
                 company = obj.company
             elif obj_type == 'relievedemployee':
-                company = emp.company
+                company = obj.employee.company
             else:
                 company = None
             pdf_bytes = generate_letter_pdf(company, template.title, filled_content, request)
         except Exception as e:
             return Response({'error': f'PDF generation failed: {str(e)}'}, status=500)
 
-        # Send email if recipient email is present (always send for offer/appointment letters)
+        # Queue the email if recipient email is present (always send for offer/appointment letters)
+        outbound_email = None
         if recipient_email:
-            try:
-                # Use email_content if available, otherwise use a default message
-                email_body = email_content if email_content else f"Please find attached the {template.title} for your review."
-                
-                email = EmailMessage(
-                    subject=template.title,
-                    body=email_body,
-                    to=[recipient_email]
-                )
-                email.attach(f"{template.title}.pdf", pdf_bytes, "application/pdf")
-                email.send()
-                # Mark as sent
-                generated_letter.sent = True
-                generated_letter.sent_at = timezone.now()
-                generated_letter.save()
-                email_status = 'sent'
-            except Exception as e:
-                email_status = f'error: {str(e)}'
+            # Use email_content if available, otherwise use a default message
+            email_body = email_content if email_content else f"Please find attached the {template.title} for your review."
+            outbound_email = queue_email(
+                template.title,
+                email_body,
+                [recipient_email],
+                attachments=[(f"{template.title}.pdf", pdf_bytes, "application/pdf")],
+                company=request.user.company,
+                created_by=request.user,
+            )
+            # Marked as sent once the outbox delivers it (see app.signals)
+            generated_letter.outbound_email = outbound_email
+            generated_letter.save(update_fields=['outbound_email'])
+            email_status = 'queued'
         else:
             email_status = 'no_recipient_email'
 
@@ -1836,13 +1809,181 @@ class GenerateLetterContentAPIView(APIView):
             'placeholders': list(placeholders),
             'filled': data,
             'generated_letter_id': generated_letter.id if generated_letter else None,
-            'email_status': email_status
+            'email_status': email_status,
+            'outbound_email_id': outbound_email.id if outbound_email else None,
         }, status=status.HTTP_200_OK)
         
 
 
+class BulkGenerateLetterAPIView(APIView):
+    """
+    Generate one letter per recipient from a single template and queue the emails.
+
+    Body: template_id, type, recipient_type ('employee' or 'relievedemployee'),
+    recipient_ids, optional email_content. Candidates are not tied to a company,
+    so they cannot be scoped to the admin's and are only sent letters one by one.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    RECIPIENT_FIELDS = {
+        'employee': 'employee',
+        'relievedemployee': 'relieved_employee',
+    }
+
+    def _recipients(self, recipient_type, ids, company):
+        if recipient_type == 'employee':
+            queryset = Employee.objects.select_related('company', 'department', 'designation').filter(company=company)
+        else:
+            queryset = RelievedEmployee.objects.select_related(
+                'employee__company', 'employee__department', 'employee__designation'
+            ).filter(employee__company=company)
+        return {obj.id: obj for obj in queryset.filter(id__in=ids)}
+
+    def post(self, request):
+        template_id = request.data.get('template_id')
+        letter_type = request.data.get('type')
+        recipient_type = request.data.get('recipient_type')
+        recipient_ids = request.data.get('recipient_ids') or []
+        email_content = request.data.get('email_content')
+        company = request.user.company
+
+        if not letter_type:
+            return Response({'error': 'Letter type is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if recipient_type not in self.RECIPIENT_FIELDS:
+            return Response({'error': 'recipient_type must be employee or relievedemployee.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            recipient_ids = list(dict.fromkeys(int(i) for i in recipient_ids))
+        except (TypeError, ValueError):
+            return Response({'error': 'recipient_ids must be a list of ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not recipient_ids:
+            return Response({'error': 'recipient_ids is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            template = LetterTemplate.objects.get(id=template_id, company=company)
+        except LetterTemplate.DoesNotExist:
+            return Response({'error': 'Template not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        recipients = self._recipients(recipient_type, recipient_ids, company)
+        results = {i: {'id': i} for i in recipient_ids}
+        for missing_id in set(recipient_ids) - set(recipients):
+            results[missing_id].update({'email_status': 'not_found', 'generated_letter_id': None})
+
+        # Parse the template once and render every recipient from the parsed segments
+        compiled = compile_template(template)
+        compiled_email = compile_text(email_content) if email_content else None
+        fk = self.RECIPIENT_FIELDS[recipient_type]
+
+        rendered = {}
+        for obj_id, obj in recipients.items():
+            data = letter_placeholder_data(obj, recipient_type, company=company)
+            rendered[obj_id] = {
+                'content': compiled.render(data),
+                'email_body': compiled_email.render(data, only=EMAIL_PLACEHOLDERS)
+                if compiled_email else f"Please find attached the {template.title} for your review.",
+            }
+
+        emails = {
+            obj_id: obj.employee.email if recipient_type == 'relievedemployee' and obj.employee else getattr(obj, 'email', None)
+            for obj_id, obj in recipients.items()
+        }
+        letter_filter = {'template': template, 'type': letter_type, f'{fk}_id__in': list(recipients)}
+
+        # PDFs are rendered before the row locks are taken, for every letter that
+        # looks like it still needs emailing; the status is checked again under the locks
+        settled = {
+            getattr(letter, f'{fk}_id')
+            for letter in GeneratedLetter.objects.select_related('outbound_email').filter(**letter_filter)
+            if letter.email_status in ('sent', 'queued')
+        }
+        pdfs = {}
+        logo_url = resolve_letter_logo_url(company, request)
+
+        def render(obj_ids):
+            if not obj_ids:
+                return None
+            contents = [rendered[obj_id]['content'] for obj_id in obj_ids]
+            try:
+                pdfs.update(zip(obj_ids, render_letter_pdfs(company, template.title, contents, logo_url=logo_url)))
+            except Exception as e:
+                return Response({'error': f'PDF generation failed: {str(e)}'}, status=500)
+
+        error = render([obj_id for obj_id in recipients if emails[obj_id] and obj_id not in settled])
+        if error:
+            return error
+
+        with transaction.atomic():
+            existing = {
+                getattr(letter, f'{fk}_id'): letter
+                for letter in GeneratedLetter.objects.select_related('outbound_email')
+                .select_for_update(of=('self',)).filter(**letter_filter)
+            }
+            to_update, to_create = [], []
+            for obj_id, parts in rendered.items():
+                letter = existing.get(obj_id)
+                if letter:
+                    letter.content = parts['content']
+                    letter.title = template.title
+                    to_update.append(letter)
+                else:
+                    to_create.append(GeneratedLetter(
+                        template=template,
+                        type=letter_type,
+                        content=parts['content'],
+                        title=template.title,
+                        **{f'{fk}_id': obj_id},
+                    ))
+            GeneratedLetter.objects.bulk_update(to_update, ['content', 'title'])
+            created = GeneratedLetter.objects.bulk_create(to_create)
+            letters = {getattr(letter, f'{fk}_id'): letter for letter in to_update + created}
+
+            to_email = []
+            for obj_id in recipients:
+                letter = letters[obj_id]
+                results[obj_id]['generated_letter_id'] = letter.id
+                # Failed emails are queued again; queued ones are left in the outbox
+                email_status = letter.email_status
+                if email_status == 'sent':
+                    results[obj_id]['email_status'] = 'already_sent'
+                elif email_status == 'queued':
+                    results[obj_id].update({'email_status': 'queued', 'outbound_email_id': letter.outbound_email_id})
+                elif not emails[obj_id]:
+                    results[obj_id]['email_status'] = 'no_recipient_email'
+                else:
+                    to_email.append(obj_id)
+            # Only letters whose email failed after the first read
+            error = render([obj_id for obj_id in to_email if obj_id not in pdfs])
+            if error:
+                return error
+
+            messages = []
+            for obj_id in to_email:
+                message = EmailMessage(
+                    subject=template.title,
+                    body=rendered[obj_id]['email_body'],
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[emails[obj_id]],
+                )
+                message.attach(f"{template.title}.pdf", pdfs[obj_id], "application/pdf")
+                messages.append(message)
+
+            # Marked as sent once the outbox delivers them (see app.signals)
+            queued = queue_messages(messages, company=company, created_by=request.user)
+            for obj_id, outbound in zip(to_email, queued):
+                letters[obj_id].outbound_email = outbound
+                results[obj_id].update({'email_status': 'queued', 'outbound_email_id': outbound.id})
+            GeneratedLetter.objects.bulk_update([letters[obj_id] for obj_id in to_email], ['outbound_email'])
+
+        return Response({
+            'template_id': template.id,
+            'placeholders': sorted(compiled.placeholders),
+            'generated': len(letters),
+            'queued': len(to_email),
+            'results': [results[i] for i in recipient_ids],
+        }, status=status.HTTP_200_OK)
+
+
 class GeneratedLetterViewSet(viewsets.ModelViewSet):
-    queryset = GeneratedLetter.objects.all()
+    queryset = GeneratedLetter.objects.select_related('outbound_email')
     serializer_class = GeneratedLetterSerializer
 
     def get_queryset(self):
@@ -1868,4 +2009,22 @@ class GeneratedLetterViewSet(viewsets.ModelViewSet):
         if uploaded_file:
             # Save the file and set file_path (adjust path as needed)
             instance.file_path = f'letters/{uploaded_file.name}'
-            instance.save()
\ No newline at end of file
+            instance.save()
+
+class ProfilingStatsView(APIView):
+    """
+    Latency percentiles, histograms and query counts per route, from the
+    profiling middleware of the process that answers (see app.profiling).
+    DELETE starts the windows over. Master only: the routes of every company
+    are mixed together.
+    """
+    permission_classes = [IsAuthenticated, IsMaster]
+
+    def get(self, request):
+        if not profiling.conf('ENABLED'):
+            return Response({"detail": "Profiling is not enabled."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(profiling.registry.summary())
+
+    def delete(self, request):
+        profiling.registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
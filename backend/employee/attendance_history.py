@@ -0,0 +1,170 @@
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+
+from django.db.models import DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+from app.leave_intervals import leave_days
+from app.models import Attendance, BreakLog, DepartmentWiseWorkingDays
+from app.tenant_config import get_config
+
+
+def month_bounds(year, month):
+    start_date = date(year, month, 1)
+    if month == 12:
+        end_date = date(year + 1, 1, 1) - timedelta(days=1)
+    else:
+        end_date = date(year, month + 1, 1) - timedelta(days=1)
+    return start_date, end_date
+
+
+def local_day_bounds(start_date, end_date, tz):
+    """
+    [start of `start_date`, start of the day after `end_date`) as aware datetimes
+    in `tz`. Filtering a timestamp against these bounds can use its index, where
+    `__date` lookups cannot.
+    """
+    return (
+        tz.localize(datetime.combine(start_date, datetime.min.time())),
+        tz.localize(datetime.combine(end_date + timedelta(days=1), datetime.min.time())),
+    )
+
+
+def break_seconds_by_day(employee, start_date, end_date, tz):
+    """Completed break time per local day, in seconds, from a single aggregate query."""
+    since, until = local_day_bounds(start_date, end_date, tz)
+    rows = (
+        BreakLog.objects.filter(
+            employee=employee,
+            end__isnull=False,
+            start__gte=since,
+            start__lt=until,
+        )
+        .annotate(day=TruncDate('start', tzinfo=tz))
+        .values('day')
+        .annotate(total=Sum(ExpressionWrapper(F('end') - F('start'), output_field=DurationField())))
+    )
+    return {row['day']: row['total'].total_seconds() for row in rows if row['total']}
+
+
+def working_weekdays_for(employee):
+    working_days = get_config(employee.company_id).working_days_for(employee.department_id)
+    return DepartmentWiseWorkingDays.weekdays_of(working_days)
+
+
+def build_month_history(employee, year, month, tz):
+    """
+    Day-by-day attendance for one month plus the summary counts.
+    Runs a fixed number of queries regardless of the number of days.
+    """
+    start_date, end_date = month_bounds(year, month)
+
+    attendances = Attendance.objects.filter(
+        employee=employee,
+        date__range=(start_date, end_date)
+    ).select_related('shift')
+    att_map = {att.date: att for att in attendances}
+
+    approved_leave_days = leave_days(employee, start_date, end_date)
+
+    break_seconds = break_seconds_by_day(employee, start_date, end_date, tz)
+    working_weekdays = working_weekdays_for(employee)
+
+    monthly_data = []
+    stats = {
+        'present': 0,
+        'absent': 0,
+        'leave': 0,
+        'half_day': 0,
+        'late': 0,
+        'working_days': 0
+    }
+
+    day = start_date
+    while day <= end_date:
+        is_weekend = day.weekday() not in working_weekdays
+        status = 'absent'
+        is_late = False
+        late_duration = None
+        total_hours = None
+        overtime_hours = None
+        break_time = '-'
+
+        att = att_map.get(day)
+
+        if is_weekend:
+            status = 'weekend'
+        elif day in approved_leave_days:
+            status = 'leave'
+            stats['leave'] += 1
+        elif att and att.check_in:
+            if att.shift:
+                grace = att.shift.grace_period or timedelta(minutes=15)
+                shift_start_aware = tz.localize(datetime.combine(day, att.shift.checkin))
+                check_in_local = att.check_in.astimezone(tz)
+                if check_in_local > (shift_start_aware + grace):
+                    is_late = True
+                    late_delta = check_in_local - (shift_start_aware + grace)
+                    late_duration = str(late_delta).split('.')[0]  # Format as HH:MM:SS
+
+            if att.check_out:
+                total_break = break_seconds.get(day, 0)
+                work_duration = (att.check_out - att.check_in).total_seconds() / 3600
+                work_duration -= total_break / 3600
+                total_hours = round(work_duration, 2)
+                # Shift rules
+                if att.shift:
+                    if work_duration >= att.shift.full_day_hours():
+                        status = 'present'
+                        stats['present'] += 1
+                    elif work_duration >= att.shift.half_day_hours():
+                        status = 'half_day'
+                        stats['half_day'] += 1
+                        stats['present'] += 0.5
+                        stats['absent'] += 0.5
+                    else:
+                        status = 'absent'
+                        stats['absent'] += 1
+                else:
+                    status = 'present'
+                    stats['present'] += 1
+                if att.overtime_duration:
+                    overtime_hours = round(att.overtime_duration.total_seconds() / 3600, 2)
+                break_time = f'{int(total_break // 60)} min' if total_break else '-'
+            else:
+                # Checked in but not checked out yet
+                status = 'checked_in'
+        else:
+            stats['absent'] += 1
+
+        if is_late and status in ['present', 'half_day', 'checked_in']:
+            stats['late'] += 1
+
+        monthly_data.append({
+            'date': str(day),
+            'day_name': day.strftime('%A'),
+            'check_in': att.check_in.astimezone(tz).strftime('%H:%M:%S') if att and att.check_in else '-',
+            'check_out': att.check_out.astimezone(tz).strftime('%H:%M:%S') if att and att.check_out else '-',
+            'shift': str(att.shift) if att and att.shift else '-',
+            'is_weekend': is_weekend,
+            'status': status,
+            'is_late': is_late,
+            'late_duration': late_duration,
+            'total_hours': total_hours if total_hours is not None else '-',
+            'overtime_hours': overtime_hours if overtime_hours is not None else '-',
+            'break_time': break_time,
+        })
+
+        if not is_weekend:
+            stats['working_days'] += 1
+
+        day += timedelta(days=1)
+
+    return monthly_data, stats
+
+
+def payload_etag(payload):
+    """Strong ETag for a JSON-serialisable response body."""
+    body = json.dumps(payload, sort_keys=True, default=str).encode()
+    return '"%s"' % hashlib.md5(body, usedforsecurity=False).hexdigest()
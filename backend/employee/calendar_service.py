@@ -0,0 +1,124 @@
+import calendar
+from collections import defaultdict
+from datetime import date
+
+from django.core.cache import cache
+
+from app.models import CalendarEvent
+from .models import PersonalCalendar
+
+CACHE_TIMEOUT = 24 * 60 * 60
+# Upper bound for the multi-month (year) view
+MAX_MONTHS = 12
+
+
+def _cache_key(company_id, year, month):
+    return f'calendar-events:{company_id}:{year}-{month:02d}'
+
+
+def invalidate_company_events(company_id, day):
+    """Drop the cached company events of the month containing `day`."""
+    cache.delete(_cache_key(company_id, day.year, day.month))
+
+
+def month_span(year, month, count):
+    """The (year, month) pairs of `count` consecutive months starting at year/month."""
+    months = []
+    for offset in range(count):
+        y, m = divmod(month - 1 + offset, 12)
+        months.append((year + y, m + 1))
+    return months
+
+
+def _month_range(months):
+    first_year, first_month = months[0]
+    last_year, last_month = months[-1]
+    last_day = calendar.monthrange(last_year, last_month)[1]
+    return date(first_year, first_month, 1), date(last_year, last_month, last_day)
+
+
+def company_events(company_id, months):
+    """
+    Company calendar events for the given months, as {date: [{'id', 'title'}]}.
+    Each month is cached on its own; the months not in the cache are fetched
+    together with one range query.
+    """
+    if not company_id:
+        return {}
+    keys = {ym: _cache_key(company_id, *ym) for ym in months}
+    cached = cache.get_many(keys.values())
+
+    by_date = {}
+    missing = []
+    for ym, key in keys.items():
+        if key in cached:
+            by_date.update(cached[key])
+        else:
+            missing.append(ym)
+    if not missing:
+        return by_date
+
+    start, end = _month_range(missing)
+    fetched = {ym: defaultdict(list) for ym in missing}
+    events = (
+        CalendarEvent.objects.filter(company_id=company_id, date__range=(start, end))
+        .order_by('date', 'id')
+        .values_list('id', 'name', 'date')
+    )
+    for event_id, name, day in events:
+        bucket = fetched.get((day.year, day.month))
+        # The range can span cached months in between; those are already filled
+        if bucket is not None:
+            bucket[day].append({'id': event_id, 'title': name})
+
+    cache.set_many({keys[ym]: dict(days) for ym, days in fetched.items()}, CACHE_TIMEOUT)
+    for days in fetched.values():
+        by_date.update(days)
+    return by_date
+
+
+def personal_events(user, start, end):
+    """A user's own calendar entries between two dates, as {date: [{'id', 'title'}]}."""
+    by_date = defaultdict(list)
+    events = (
+        PersonalCalendar.objects.filter(created_by=user, date__range=(start, end))
+        .order_by('date', 'id')
+        .values_list('id', 'name', 'date')
+    )
+    for event_id, name, day in events:
+        by_date[day].append({'id': event_id, 'title': name})
+    return by_date
+
+
+def build_month_grids(user, company_id, months, today, selected):
+    """
+    Sunday-first week grids for each of `months`, with the company and personal
+    events of every day cell.
+    """
+    start, end = _month_range(months)
+    admin_by_date = company_events(company_id, months)
+    personal_by_date = personal_events(user, start, end)
+
+    cal = calendar.Calendar(firstweekday=6)
+    grids = []
+    for year, month in months:
+        weeks = []
+        for week_days in cal.monthdayscalendar(year, month):
+            week = []
+            for day_num in week_days:
+                if day_num == 0:
+                    week.append({'day': ''})
+                    continue
+
+                day_date = date(year, month, day_num)
+                week.append({
+                    'day': day_num,
+                    'date': str(day_date),
+                    'admin_events': admin_by_date.get(day_date, []),
+                    'personal_events': personal_by_date.get(day_date, []),
+                    'is_today': day_date == today,
+                    'is_selected': day_date == selected
+                })
+            weeks.append(week)
+        grids.append({'year': year, 'month': month, 'weeks': weeks})
+    return grids
@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta
+
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.core.cache import cache
+from django.db.models import DurationField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import JSONObject
+
+from app.models import Attendance, BreakConfig, BreakLog, Employee, Payroll
+from .attendance_history import local_day_bounds
+
+CACHE_TIMEOUT = 5 * 60
+BREAK_LABELS = dict(BreakConfig.BREAK_CHOICES)
+
+
+def _cache_key(employee_id, day):
+    return f'employee-dashboard:{employee_id}:{day.isoformat()}'
+
+
+def invalidate_dashboard(employee_id, day):
+    """
+    Drop the cached dashboard of one employee for one day. The model signals
+    call this on every save; writes that skip them (bulk_create, bulk_update,
+    raw SQL) must call it, or invalidate_dashboards, themselves.
+    """
+    cache.delete(_cache_key(employee_id, day))
+
+
+def invalidate_dashboards(employee_ids, day):
+    cache.delete_many([_cache_key(employee_id, day) for employee_id in employee_ids])
+
+
+def _parse_ts(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _load(user_id, day, tz):
+    """
+    Everything the dashboard shows, in two queries: the employee annotated with
+    today's break total, today's breaks and the latest payroll, then today's
+    attendance with its shift.
+    """
+    day_start, day_end = local_day_bounds(day, day, tz)
+    todays_breaks = BreakLog.objects.filter(employee=OuterRef('pk'), start__gte=day_start, start__lt=day_end)
+    break_total = (
+        todays_breaks.filter(end__isnull=False)
+        .values('employee')
+        .annotate(total=Sum(ExpressionWrapper(F('end') - F('start'), output_field=DurationField())))
+        .values('total')
+    )
+    break_items = (
+        todays_breaks.values('employee')
+        .annotate(items=JSONBAgg(
+            JSONObject(
+                start='start',
+                end='end',
+                break_config_id='break_config_id',
+                break_choice='break_config__break_choice',
+            ),
+            ordering='-start',
+        ))
+        .values('items')
+    )
+    latest_payroll = Payroll.objects.filter(employee=OuterRef('pk')).order_by('-payroll_date', '-id')
+
+    employee = (
+        Employee.objects.filter(user_id=user_id)
+        .only('id', 'first_name', 'last_name', 'photo', 'date_of_birth')
+        .annotate(
+            break_total=Subquery(break_total, output_field=DurationField()),
+            break_items=Subquery(break_items),
+            payroll_net=Subquery(latest_payroll.values('net_pay')[:1]),
+            payroll_date=Subquery(latest_payroll.values('payroll_date')[:1]),
+        )
+        .first()
+    )
+    if employee is None:
+        return None
+
+    attendance = (
+        Attendance.objects.select_related('shift')
+        .filter(employee_id=employee.id, date=day)
+        .first()
+    )
+    return employee, attendance
+
+
+def _break_entry(item, tz):
+    return {
+        'type': BREAK_LABELS.get(item['break_choice']) if item['break_config_id'] else None,
+        'break_config_id': item['break_config_id'],
+        'start_time': _parse_ts(item['start']).astimezone(tz).strftime('%H:%M:%S') if item['start'] else None,
+        'end_time': _parse_ts(item['end']).astimezone(tz).strftime('%H:%M:%S') if item['end'] else None,
+    }
+
+
+def build_snapshot(user_id, day, tz):
+    loaded = _load(user_id, day, tz)
+    if loaded is None:
+        return None
+    employee, attendance = loaded
+
+    punch_in = attendance.check_in if attendance else None
+    punch_out = attendance.check_out if attendance else None
+    shift = attendance.shift if attendance else None
+
+    # Late check-in logic
+    is_late = False
+    if punch_in and shift:
+        grace = shift.grace_period or timedelta(minutes=15)
+        shift_start_aware = tz.localize(datetime.combine(day, shift.checkin))
+        is_late = punch_in > (shift_start_aware + grace)
+
+    # Overtime calculation
+    overtime = None
+    if punch_out and shift:
+        shift_end_dt = datetime.combine(day, shift.checkout)
+        # If overnight shift (e.g., 9 PM to 6 AM)
+        if shift.checkin > shift.checkout:
+            shift_end_dt += timedelta(days=1)
+        shift_end_aware = tz.localize(shift_end_dt)
+        if punch_out > shift_end_aware:
+            overtime_minutes = (punch_out - shift_end_aware).total_seconds() // 60
+            overtime = {
+                'hours': int(overtime_minutes // 60),
+                'minutes': int(overtime_minutes % 60),
+                'total': round(overtime_minutes / 60, 2)
+            }
+
+    items = employee.break_items or []
+    active = next((item for item in items if item['end'] is None), None)
+    recent = [item for item in items if item['end'] is not None][:5]
+    active_break = None
+    if active:
+        entry = _break_entry(active, tz)
+        active_break = {k: entry[k] for k in ('type', 'break_config_id', 'start_time')}
+
+    return {
+        'employee_id': employee.id,
+        'first_name': employee.first_name,
+        'employee_name': f"{employee.first_name} {employee.last_name}",
+        'photo_url': employee.photo.url if employee.photo else None,
+        'date_of_birth': employee.date_of_birth,
+        'check_in': punch_in,
+        'check_out': punch_out,
+        'is_late': is_late,
+        'break_minutes': int(employee.break_total.total_seconds() // 60) if employee.break_total else 0,
+        'shift_name': shift.shift_type if shift else 'Not assigned',
+        'shift_timing': f"{shift.checkin.strftime('%H:%M')} - {shift.checkout.strftime('%H:%M')}" if shift else '--:--',
+        'active_break': active_break,
+        'recent_breaks': [_break_entry(item, tz) for item in recent] or None,
+        'overtime': overtime,
+        'latest_payroll': {
+            'amount': employee.payroll_net,
+            'date': employee.payroll_date,
+        } if employee.payroll_date else None,
+    }
+
+
+def get_snapshot(user, day, tz):
+    """
+    Cached dashboard data for an employee user. Time-dependent figures (worked and
+    effective time) are left to the caller so a cached snapshot stays valid.
+    The cache is keyed by employee id, which is only known after the first load.
+    """
+    user_key = f'employee-dashboard-user:{user.id}'
+    employee_id = cache.get(user_key)
+    if employee_id is not None:
+        snapshot = cache.get(_cache_key(employee_id, day))
+        if snapshot is not None:
+            return snapshot
+
+    snapshot = build_snapshot(user.id, day, tz)
+    if snapshot is not None:
+        cache.set(user_key, snapshot['employee_id'], 24 * 60 * 60)
+        cache.set(_cache_key(snapshot['employee_id'], day), snapshot, CACHE_TIMEOUT)
+    return snapshot
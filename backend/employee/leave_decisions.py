@@ -0,0 +1,51 @@
+from django.db import transaction
+
+from app.leave_ledger import sync_leaves
+from app.models import EmpLeave
+from notifications.events import publish
+
+# Decision name in the request -> leave status it sets
+DECISIONS = {
+    'approve': 'Approved',
+    'reject': 'Rejected',
+}
+MAX_BATCH = 200
+
+
+def decide_leaves(manager, leave_ids, status, user=None):
+    """
+    Set `status` on the leave requests `leave_ids` of `manager`'s reports, in
+    one transaction with a single bulk update, keep the leave ledger in step,
+    and notify the employees in one batch once committed (see notifications.events).
+
+    Leaves already in `status` are left alone. Returns (changed, unchanged, missing):
+    the changed and unchanged leaves and the ids that are not the manager's to
+    decide. Nothing is written when any id is missing. Raises IntegrityError when
+    an approval would overlap another active leave of the same employee.
+    """
+    wanted = list(dict.fromkeys(leave_ids))
+    with transaction.atomic():
+        leaves = list(
+            EmpLeave.objects.select_for_update(of=('self',))
+            .filter(id__in=wanted, reporting_manager=manager)
+            .select_related('employee')
+            .order_by('id')
+        )
+        found = {leave.id for leave in leaves}
+        missing = [leave_id for leave_id in wanted if leave_id not in found]
+        if missing:
+            return [], [], missing
+
+        changed = [leave for leave in leaves if leave.status != status]
+        unchanged = [leave for leave in leaves if leave.status == status]
+        if not changed:
+            return changed, unchanged, missing
+
+        for leave in changed:
+            leave.status = status
+        # Not seen by the save signals, so the status events are published below
+        EmpLeave.objects.bulk_update(changed, ['status'])
+        sync_leaves(changed, user=user)
+        for leave in changed:
+            publish('leave_status', leave.id, status=status)
+    return changed, unchanged, missing
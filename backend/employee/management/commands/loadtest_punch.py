@@ -0,0 +1,144 @@
+import itertools
+import statistics
+import threading
+import time
+from collections import Counter
+
+import requests
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from app.models import Attendance, Company, Employee, EmployeeIdSequence, UserRegister
+from app.org_hierarchy import add_employees
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the morning check-in spike against a running server: sends punches to "
+        "/employee/punch/ at a fixed rate and reports latency, status codes and duplicate rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('company_id', type=int)
+        parser.add_argument('--url', default='http://127.0.0.1:8000/employee/punch/')
+        parser.add_argument('--rate', type=int, default=5000, help="Punches per minute.")
+        parser.add_argument('--duration', type=int, default=60, help="Seconds to run.")
+        parser.add_argument('--concurrency', type=int, default=64, help="Client threads.")
+        parser.add_argument('--employees', type=int, default=5000,
+                            help="Number of employees to punch as; missing ones are created with a 'loadtest_' username.")
+        parser.add_argument('--reset', action='store_true', help="Delete today's attendance for these employees first.")
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company_id'])
+        except Company.DoesNotExist:
+            raise CommandError(f"Company {options['company_id']} does not exist.")
+
+        employees = self._employees(company, options['employees'])
+        if options['reset']:
+            Attendance.objects.filter(employee__in=employees, date=timezone.localdate()).delete()
+
+        # Tokens are minted up front so the run measures the punch path only
+        tokens = [str(RefreshToken.for_user(e.user).access_token) for e in employees]
+        total = options['rate'] * options['duration'] // 60
+        interval = 60.0 / options['rate']
+        self.stdout.write(
+            f"Sending {total} punches at {options['rate']}/min with {options['concurrency']} threads "
+            f"as {len(employees)} employees to {options['url']}"
+        )
+
+        counter = itertools.count()
+        lock = threading.Lock()
+        latencies = []
+        statuses = Counter()
+        started = time.perf_counter()
+
+        def worker():
+            session = requests.Session()
+            while True:
+                with lock:
+                    i = next(counter)
+                if i >= total:
+                    return
+                # Hold each punch until its slot so the rate stays even
+                delay = started + i * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                t0 = time.perf_counter()
+                try:
+                    response = session.post(
+                        options['url'],
+                        json={'type': 'in'},
+                        headers={'Authorization': f'Bearer {tokens[i % len(tokens)]}'},
+                        timeout=30,
+                    )
+                    code = response.status_code
+                except requests.RequestException as e:
+                    code = type(e).__name__
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[code] += 1
+
+        threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        self._report(latencies, statuses, wall, employees)
+
+    def _employees(self, company, count):
+        employees = list(
+            Employee.objects.filter(company=company, user__isnull=False, user__role='employee')
+            .select_related('user').order_by('id')[:count]
+        )
+        missing = count - len(employees)
+        if missing > 0:
+            self.stdout.write(f"Creating {missing} load-test employees...")
+            password = make_password(None)
+            stamp = int(time.time())
+            users = UserRegister.objects.bulk_create([
+                UserRegister(
+                    username=f'loadtest_{stamp}_{i}', email=f'loadtest_{stamp}_{i}@example.com',
+                    password=password, role='employee', company=company,
+                )
+                for i in range(missing)
+            ])
+            employee_ids = EmployeeIdSequence.reserve(company.id, missing)
+            created = Employee.objects.bulk_create([
+                Employee(
+                    company=company, user=user, employee_id=employee_id, email=user.email,
+                    first_name='Load', last_name=f'Test {i}',
+                )
+                for i, (user, employee_id) in enumerate(zip(users, employee_ids))
+            ])
+            add_employees((employee.id, employee.reporting_manager_id) for employee in created)
+            employees += created
+        return employees
+
+    def _report(self, latencies, statuses, wall, employees):
+        latencies.sort()
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(f"Completed {len(latencies)} punches in {wall:.1f}s "
+                          f"({len(latencies) / wall * 60:.0f}/min)")
+        if latencies:
+            self.stdout.write(
+                f"Latency ms: mean {statistics.mean(latencies) * 1000:.1f}, p50 {pct(0.5):.1f}, "
+                f"p95 {pct(0.95):.1f}, p99 {pct(0.99):.1f}, max {latencies[-1] * 1000:.1f}"
+            )
+        self.stdout.write(f"Status codes: {dict(statuses)}")
+
+        duplicates = (
+            Attendance.objects.filter(employee__in=employees, date=timezone.localdate())
+            .values('employee_id').annotate(rows=Count('id')).filter(rows__gt=1).count()
+        )
+        style = self.style.SUCCESS if not duplicates else self.style.ERROR
+        self.stdout.write(style(f"Employees with duplicate attendance rows today: {duplicates}"))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from employee.models import Task
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the stored task counters (assignments and subtasks, total and done) "
+        "with a fresh count and report drift. With --fix, recount the drifted tasks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Recount tasks whose counters have drifted.")
+        parser.add_argument('--limit', type=int, default=20, help="Drifted tasks to list in the output.")
+
+    def handle(self, *args, **options):
+        expected = {f'expected_{name}': value for name, value in Task.counter_values().items()}
+        rows = Task.objects.annotate(**expected).values('id', *Task.COUNTER_FIELDS, *expected)
+
+        drifted = []
+        for row in rows.iterator():
+            diff = {
+                name: (row[name], row[f'expected_{name}'])
+                for name in Task.COUNTER_FIELDS
+                if row[name] != row[f'expected_{name}']
+            }
+            if diff:
+                drifted.append((row['id'], diff))
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("All task counters are correct."))
+            return
+
+        for task_id, diff in drifted[:options['limit']]:
+            details = ', '.join(f"{name} {stored} -> {actual}" for name, (stored, actual) in diff.items())
+            self.stdout.write(f"Task {task_id}: {details}")
+        if len(drifted) > options['limit']:
+            self.stdout.write(f"... and {len(drifted) - options['limit']} more")
+
+        if not options['fix']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(drifted)} task(s) have drifted counters. Run with --fix to repair them."
+            ))
+            return
+
+        Task.refresh_counters([task_id for task_id, _ in drifted])
+        self.stdout.write(self.style.SUCCESS(f"Recounted {len(drifted)} task(s)."))
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:49
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(qs, key):
+    grouped = qs.order_by().values(key).annotate(n=Count('id')).values('n')
+    return Coalesce(Subquery(grouped, output_field=models.IntegerField()), 0)
+
+
+def backfill_task_counters(apps, schema_editor):
+    Task = apps.get_model('employee', 'Task')
+    TaskAssignment = apps.get_model('employee', 'TaskAssignment')
+
+    assignments = TaskAssignment.objects.filter(task=OuterRef('pk'))
+    Task.objects.update(
+        assignments_total=_count(assignments, 'task'),
+        assignments_done=_count(assignments.filter(status='done'), 'task'),
+    )
+    subtasks = Task.objects.filter(parent_task=OuterRef('pk'))
+    Task.objects.update(
+        subtasks_total=_count(subtasks, 'parent_task'),
+        subtasks_done=_count(
+            subtasks.filter(assignments_total__gt=0, assignments_done=F('assignments_total')), 'parent_task'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='assignments_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='assignments_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='subtasks_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='subtasks_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_task_counters, migrations.RunPython.noop),
+    ]
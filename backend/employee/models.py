@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
 
@@ -46,22 +48,76 @@ class Task(models.Model):
         on_delete=models.CASCADE
     )
 
+    # Denormalized counts, kept current by Task.refresh_counters()
+    assignments_total = models.PositiveIntegerField(default=0)
+    assignments_done = models.PositiveIntegerField(default=0)
+    subtasks_total = models.PositiveIntegerField(default=0)
+    # Subtasks whose assignments are all done
+    subtasks_done = models.PositiveIntegerField(default=0)
+
+    COUNTER_FIELDS = ['assignments_total', 'assignments_done', 'subtasks_total', 'subtasks_done']
+
     def __str__(self):
         return self.title
 
     def done_subtasks_count(self):
-        return self.subtasks.filter(assignments__status='done').count()
+        return self.subtasks_done
 
     def progress(self):
-        if self.subtasks.exists():
-            total = self.subtasks.count()
-            done = self.done_subtasks_count()
+        if self.subtasks_total:
+            total = self.subtasks_total
+            done = self.subtasks_done
         else:
-            total = self.assignments.count()
-            done = self.assignments.filter(status='done').count()
+            total = self.assignments_total
+            done = self.assignments_done
 
         return 0 if total == 0 else int((done / total) * 100)
 
+    @staticmethod
+    def counter_values():
+        """Expressions computing each counter of a task row from its assignments and subtasks."""
+        def count(qs, key):
+            grouped = qs.order_by().values(key).annotate(n=Count('id')).values('n')
+            return Coalesce(Subquery(grouped, output_field=models.IntegerField()), 0)
+
+        assignments = TaskAssignment.objects.filter(task=OuterRef('pk'))
+        subtasks = Task.objects.filter(parent_task=OuterRef('pk'))
+        done_subtasks = subtasks.filter(assignments_total__gt=0, assignments_done=F('assignments_total'))
+        return {
+            'assignments_total': count(assignments, 'task'),
+            'assignments_done': count(assignments.filter(status='done'), 'task'),
+            'subtasks_total': count(subtasks, 'parent_task'),
+            'subtasks_done': count(done_subtasks, 'parent_task'),
+        }
+
+    @classmethod
+    def refresh_counters(cls, task_ids):
+        """
+        Recount the given tasks and their parents. Call it inside the transaction
+        that changed their assignments or subtasks; the rows stay locked until it ends.
+        """
+        task_ids = set(task_ids)
+        if not task_ids:
+            return
+        with transaction.atomic():
+            parent_ids = cls.objects.filter(
+                id__in=task_ids, parent_task__isnull=False
+            ).values_list('parent_task_id', flat=True)
+            task_ids.update(parent_ids)
+            # Lock in id order so concurrent refreshes cannot deadlock
+            list(cls.objects.select_for_update().filter(id__in=task_ids).order_by('id').values_list('id', flat=True))
+
+            values = cls.counter_values()
+            cls.objects.filter(id__in=task_ids).update(
+                assignments_total=values['assignments_total'],
+                assignments_done=values['assignments_done'],
+            )
+            # Subtask counters read the assignment counters written just above
+            cls.objects.filter(id__in=task_ids).update(
+                subtasks_total=values['subtasks_total'],
+                subtasks_done=values['subtasks_done'],
+            )
+
     def compute_status_from_assignments(self):
         
         statuses = self.assignments.values_list('status', flat=True)
@@ -0,0 +1,355 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from app.models import Attendance, BreakLog, Employee, PunchEvent, ShiftPolicy
+from app.shift_resolver import resolve_shift
+from app.tenant_config import get_config
+from .dashboard import invalidate_dashboard
+
+# Offline punches are accepted only within these bounds
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+MAX_EVENT_AGE = timedelta(days=31)
+
+
+class PunchError(Exception):
+    """A punch that cannot be applied (no shift, already checked in/out, ...)."""
+
+
+def _attendance_table():
+    return connection.ops.quote_name(Attendance._meta.db_table)
+
+
+def punch_in(employee, now_dt):
+    """
+    Record a check-in with a single INSERT ... ON CONFLICT against the unique
+    (employee, date) constraint, so duplicate taps cannot create a second row.
+    A row that exists without a check-in (e.g. created by an admin) is filled in.
+
+    Returns a dict with the attendance id, shift and lateness; raises PunchError
+    when no shift applies or the employee has already checked in today.
+    """
+    shift, shift_start = resolve_shift(employee, now_dt)
+    if not shift:
+        raise PunchError("No shift policy configured for your company.")
+
+    table = _attendance_table()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (employee_id, company_id, shift_id, date, check_in, is_present, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, TRUE, %s, %s)
+            ON CONFLICT (employee_id, date) DO UPDATE
+                SET check_in = EXCLUDED.check_in,
+                    shift_id = EXCLUDED.shift_id,
+                    is_present = TRUE,
+                    updated_at = EXCLUDED.updated_at
+                WHERE {table}.check_in IS NULL
+            RETURNING id
+            """,
+            [employee.id, employee.company_id, shift.id, now_dt.date(), now_dt, now_dt, now_dt],
+        )
+        row = cursor.fetchone()
+
+    if row is None:
+        check_in = Attendance.objects.filter(
+            employee_id=employee.id, date=now_dt.date()
+        ).values_list('check_in', flat=True).first()
+        local = check_in.astimezone(now_dt.tzinfo) if check_in else now_dt
+        raise PunchError(f"Already checked in at {local.strftime('%H:%M:%S')}")
+
+    # Raw SQL, so not seen by the signals
+    transaction.on_commit(lambda: invalidate_dashboard(employee.id, now_dt.date()))
+
+    late_by = now_dt - (shift_start + shift.grace())
+    return {
+        'attendance_id': row[0],
+        'check_in': now_dt,
+        'shift': shift,
+        'shift_start': shift_start,
+        'is_late': late_by > timedelta(0),
+        'late_by': max(late_by, timedelta(0)),
+    }
+
+
+def break_totals(attendance_ids):
+    """Sum of finished break time per attendance id."""
+    rows = (
+        BreakLog.objects.filter(attendance_id__in=attendance_ids, start__isnull=False, end__isnull=False)
+        .values('attendance_id')
+        .annotate(total=Sum(ExpressionWrapper(F('end') - F('start'), output_field=DurationField())))
+    )
+    return {row['attendance_id']: row['total'] for row in rows}
+
+
+def punch_out(employee, now_dt):
+    """
+    Record today's check-out with one conditional UPDATE, then store the work
+    duration and overtime computed as in Attendance.calculate_work_duration.
+    """
+    table = _attendance_table()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table}
+                SET check_out = %s, updated_at = %s
+                WHERE employee_id = %s AND date = %s AND check_in IS NOT NULL AND check_out IS NULL
+                RETURNING id, check_in, shift_id
+                """,
+                [now_dt, now_dt, employee.id, now_dt.date()],
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            if Attendance.objects.filter(employee_id=employee.id, date=now_dt.date(), check_out__isnull=False).exists():
+                raise PunchError("Already checked out today.")
+            raise PunchError("No check-in record found for today.")
+
+        attendance_id, check_in, shift_id = row
+        shift = None
+        if shift_id:
+            # Falls back to the table for a shift that is no longer the company's
+            shift = get_config(employee.company_id).shift(shift_id) or ShiftPolicy.objects.filter(id=shift_id).first()
+        total_breaks = break_totals([attendance_id]).get(attendance_id) or timedelta(0)
+        work, overtime = Attendance.compute_durations(check_in, now_dt, total_breaks, shift)
+        Attendance.objects.filter(id=attendance_id).update(total_work_duration=work, overtime_duration=overtime)
+        transaction.on_commit(lambda: invalidate_dashboard(employee.id, now_dt.date()))
+
+    return {
+        'attendance_id': attendance_id,
+        'check_in': check_in,
+        'check_out': now_dt,
+        'total_work_duration': work,
+        'overtime_duration': overtime,
+    }
+
+
+class PunchSync:
+    """
+    Applies a batch of offline punches for one employee.
+
+    Events are replayed in timestamp order against the employee's attendance and
+    break rows, which are loaded once and written back in bulk. Work duration is
+    recomputed once per affected day at the end. Every new event is stored as a
+    PunchEvent so replaying the same client_event_id is a no-op.
+    """
+
+    def __init__(self, employee, device_id, tz):
+        self.employee = employee
+        self.device_id = device_id
+        self.tz = tz
+        self.attendances = {}
+        self.changed_attendances = {}
+        self.open_breaks = []
+        self.new_breaks = []
+        self.changed_breaks = []
+
+    def run(self, events):
+        """
+        `events` are validated dicts with client_event_id, type, timestamp and
+        optionally break_config. Returns a (status, detail) pair per event, in input
+        order. Must be called inside a transaction.
+        """
+        # Serialises syncs for the same employee so dedup and replay see a stable state
+        Employee.objects.select_for_update().filter(id=self.employee.id).exists()
+
+        results = {}
+        unique = {}
+        repeated = set()
+        for i, event in enumerate(events):
+            cid = event['client_event_id']
+            if cid in unique:
+                repeated.add(i)
+            else:
+                unique[cid] = event
+        for cid in PunchEvent.objects.filter(
+            employee=self.employee, client_event_id__in=list(unique)
+        ).values_list('client_event_id', flat=True):
+            results[cid] = ('duplicate', 'Already synced.')
+            del unique[cid]
+
+        pending = sorted(unique.values(), key=lambda e: e['timestamp'])
+        if pending:
+            self._apply(pending, results)
+
+        return [
+            ('duplicate', 'Repeated in this batch.') if i in repeated else results[event['client_event_id']]
+            for i, event in enumerate(events)
+        ]
+
+    def _apply(self, pending, results):
+        self._load(pending)
+
+        records = []
+        now = timezone.now()
+        for event in pending:
+            ts = event['timestamp']
+            attendance = None
+            if ts > now + MAX_CLOCK_SKEW:
+                status, detail = 'rejected', 'Timestamp is in the future.'
+            elif ts < now - MAX_EVENT_AGE:
+                status, detail = 'rejected', 'Timestamp is too old to sync.'
+            elif event.get('break_config') and event['break_config'] not in self.break_configs:
+                status, detail = 'rejected', 'Unknown break config.'
+            else:
+                handler = getattr(self, f"_{event['type']}")
+                status, detail, attendance = handler(event, ts)
+            results[event['client_event_id']] = (status, detail)
+            records.append(PunchEvent(
+                employee=self.employee,
+                company_id=self.employee.company_id,
+                device_id=self.device_id,
+                client_event_id=event['client_event_id'],
+                event_type=event['type'],
+                occurred_at=ts,
+                break_config=self.break_configs.get(event.get('break_config')),
+                attendance=attendance,
+                status=status,
+                detail=detail,
+            ))
+
+        self._save()
+        PunchEvent.objects.bulk_create(records)
+
+    def _local_date(self, ts):
+        return timezone.localtime(ts, self.tz).date()
+
+    def _load(self, events):
+        dates = set()
+        for event in events:
+            day = self._local_date(event['timestamp'])
+            dates.update((day, day - timedelta(days=1)))
+        self.attendances = {
+            a.date: a for a in Attendance.objects.select_for_update(of=('self',)).select_related('shift').filter(
+                employee=self.employee, date__in=dates
+            )
+        }
+        self.open_breaks = list(
+            BreakLog.objects.select_for_update().filter(employee=self.employee, end__isnull=True).order_by('start')
+        )
+        config_ids = {e['break_config'] for e in events if e.get('break_config')}
+        break_configs = get_config(self.employee.company_id).break_configs
+        self.break_configs = {c.id: c for c in break_configs if c.id in config_ids}
+
+    def _attendance_at(self, ts):
+        """The attendance a punch at `ts` belongs to: today's, or last night's overnight shift."""
+        day = self._local_date(ts)
+        today = self.attendances.get(day)
+        if today and today.check_in and today.check_in <= ts:
+            return today
+        yesterday = self.attendances.get(day - timedelta(days=1))
+        if yesterday and yesterday.check_in and (not yesterday.check_out or yesterday.check_out <= ts):
+            if yesterday.shift and yesterday.shift.checkin > yesterday.shift.checkout:
+                return yesterday
+        return today
+
+    def _changed(self, attendance):
+        self.changed_attendances[attendance.id] = attendance
+
+    def _check_in(self, event, ts):
+        day = self._local_date(ts)
+        attendance = self.attendances.get(day)
+        if attendance is None:
+            shift, _ = resolve_shift(self.employee, timezone.localtime(ts, self.tz))
+            attendance, created = Attendance.objects.get_or_create(
+                employee=self.employee,
+                date=day,
+                defaults={
+                    'company_id': self.employee.company_id,
+                    'shift': shift,
+                    'check_in': ts,
+                    'is_present': True,
+                },
+            )
+            self.attendances[day] = attendance
+            if created:
+                return 'applied', '', attendance
+        if attendance.check_in is None or ts < attendance.check_in:
+            detail = '' if attendance.check_in is None else 'Replaced a later check-in.'
+            attendance.check_in = ts
+            attendance.is_present = True
+            if attendance.shift is None:
+                attendance.shift, _ = resolve_shift(self.employee, timezone.localtime(ts, self.tz))
+            self._changed(attendance)
+            return 'applied', detail, attendance
+        return 'ignored', 'Already checked in.', attendance
+
+    def _check_out(self, event, ts):
+        attendance = self._attendance_at(ts)
+        if attendance is None or not attendance.check_in or attendance.check_in > ts:
+            return 'rejected', 'No check-in before this check-out.', attendance
+        if attendance.check_out and attendance.check_out >= ts:
+            return 'ignored', 'Already checked out later.', attendance
+        attendance.check_out = ts
+        self._changed(attendance)
+        return 'applied', '', attendance
+
+    def _break_start(self, event, ts):
+        attendance = self._attendance_at(ts)
+        config = self.break_configs.get(event.get('break_config'))
+        if config is None:
+            return 'rejected', 'break_config is required to start a break.', attendance
+        if self.open_breaks:
+            return 'ignored', 'A break is already active.', attendance
+        break_log = BreakLog(employee=self.employee, attendance=attendance, break_config=config, start=ts)
+        self.open_breaks.append(break_log)
+        self.new_breaks.append(break_log)
+        return 'applied', '', attendance
+
+    def _break_end(self, event, ts):
+        config_id = event.get('break_config')
+        candidates = [
+            b for b in self.open_breaks
+            if b.start and b.start <= ts and (not config_id or b.break_config_id == config_id)
+        ]
+        if not candidates:
+            return 'rejected', 'No active break to end.', self._attendance_at(ts)
+        break_log = candidates[-1]
+        break_log.end = ts
+        break_log.duration_minutes = int((ts - break_log.start).total_seconds() // 60)
+        self.open_breaks.remove(break_log)
+        if break_log.pk:
+            self.changed_breaks.append(break_log)
+        if break_log.attendance_id:
+            self._changed(self._attendance_by_id(break_log.attendance_id))
+        return 'applied', '', break_log.attendance
+
+    def _attendance_by_id(self, attendance_id):
+        for attendance in self.attendances.values():
+            if attendance.id == attendance_id:
+                return attendance
+        return Attendance.objects.select_related('shift').get(id=attendance_id)
+
+    def _save(self):
+        BreakLog.objects.bulk_create(self.new_breaks)
+        BreakLog.objects.bulk_update(self.changed_breaks, ['end', 'duration_minutes'])
+
+        # Every day the bulk writes touched
+        days = {a.date for a in self.changed_attendances.values()}
+        days.update(self._local_date(b.start) for b in self.new_breaks + self.changed_breaks if b.start)
+        employee_id = self.employee.id
+
+        def invalidate():
+            for day in days:
+                invalidate_dashboard(employee_id, day)
+        transaction.on_commit(invalidate)
+
+        changed = list(self.changed_attendances.values())
+        if not changed:
+            return
+        # Recompute each affected day once, with all its breaks summed in one query
+        totals = break_totals([a.id for a in changed])
+        for attendance in changed:
+            if attendance.check_in and attendance.check_out:
+                attendance.total_work_duration, attendance.overtime_duration = Attendance.compute_durations(
+                    attendance.check_in, attendance.check_out,
+                    totals.get(attendance.id) or timedelta(0), attendance.shift,
+                )
+            attendance.updated_at = timezone.now()
+        Attendance.objects.bulk_update(changed, [
+            'check_in', 'check_out', 'shift', 'is_present',
+            'total_work_duration', 'overtime_duration', 'updated_at',
+        ])
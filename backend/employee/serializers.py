@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from app.models import Notification,LearningCorner,BreakConfig, BreakLog,Attendance, ShiftPolicy, Employee,EmpLeave,Leave,CompanyPolicies
+from datetime import date
+from app.models import Notification,LearningCorner,BreakConfig, BreakLog,Attendance, ShiftPolicy, Employee,EmpLeave,Leave,CompanyPolicies,PunchEvent,LeaveBalance,LeaveLedgerEntry
 from .models import *
 
 class ReportingManagerSerializer(serializers.ModelSerializer):
@@ -104,6 +105,7 @@ class TaskSerializer(serializers.ModelSerializer):
             )
 
         # Create subtasks and their assignments
+        subtask_ids = []
         for subtask_data in subtasks_data:
             sub_assigned_employees = subtask_data.pop('assignedEmployees', [])
             sub_task_owner = subtask_data.pop('taskOwner', None)
@@ -120,15 +122,32 @@ class TaskSerializer(serializers.ModelSerializer):
                     employee_id=emp_id,
                     role='owner' if str(emp_id) == str(sub_task_owner) else 'contributor'
                 )
+            subtask_ids.append(subtask.id)
 
+        Task.refresh_counters([task.id, *subtask_ids])
+        task.refresh_from_db(fields=Task.COUNTER_FIELDS)
         return task
 
+    def update(self, instance, validated_data):
+        serializers.raise_errors_on_nested_writes('update', self, validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Only the edited fields: the counters belong to Task.refresh_counters(),
+        # and the ones loaded with the instance may be stale by now
+        instance.save(update_fields=list(validated_data))
+        return instance
 
+
+    # Tasks loaded through task_tree.load_task_forest carry their subtasks and
+    # assignments; anything else falls back to querying.
     def get_subtask_details(self, obj):
+        if hasattr(obj, 'tree_subtasks'):
+            return TaskSerializer(obj.tree_subtasks, many=True, context=self.context).data
         return TaskSerializer(obj.subtasks.all(), many=True).data
 
     def get_assignments(self, obj):
-        return TaskAssignmentSerializer(obj.assignments.all(), many=True,context=self.context).data
+        assignments = obj.tree_assignments if hasattr(obj, 'tree_assignments') else obj.assignments.all()
+        return TaskAssignmentSerializer(assignments, many=True,context=self.context).data
 
     def get_progress(self, obj):
         return obj.progress()
@@ -138,7 +157,7 @@ class TaskSerializer(serializers.ModelSerializer):
         return obj.created_at.strftime("%Y-%m-%d %H:%M")
 
 class MyTaskSerializer(serializers.ModelSerializer):
-    assignments = TaskAssignmentSerializer(many=True, read_only=True)
+    assignments = serializers.SerializerMethodField()
     progress = serializers.SerializerMethodField()
     created_by = serializers.PrimaryKeyRelatedField(read_only=True)
     created_at = serializers.SerializerMethodField()
@@ -158,9 +177,15 @@ class MyTaskSerializer(serializers.ModelSerializer):
         """
         Return a list of employee names assigned to this task (excluding the owner if needed).
         """
+        if hasattr(obj, 'tree_assignments'):
+            return [assign.employee.full_name for assign in obj.tree_assignments if assign.role == 'contributor']
         contributors_qs = obj.assignments.filter(role='contributor').select_related('employee')
         return [assign.employee.full_name for assign in contributors_qs]
 
+    def get_assignments(self, obj):
+        assignments = obj.tree_assignments if hasattr(obj, 'tree_assignments') else obj.assignments.all()
+        return TaskAssignmentSerializer(assignments, many=True, context=self.context).data
+
     def get_subtask_details(self, obj):
         """
         Return only the subtasks assigned to the logged-in employee.
@@ -181,8 +206,8 @@ class MyTaskSerializer(serializers.ModelSerializer):
                 'deadline': subtask.deadline,
                 'priority': subtask.priority,
                 'status': subtask.status,
-                'assignments': TaskAssignmentSerializer(subtask.assignments.all(), many=True, context=self.context).data,
-                'progress': subtask.progress()
+                'assignments': self.get_assignments(subtask),
+                'progress': self.get_progress(subtask)
             }
             for subtask in subtasks_qs
         ]
@@ -247,33 +272,36 @@ class LeaveSerializer(serializers.ModelSerializer):
         model = Leave
         fields = ['id', 'leave_name', 'count', 'is_paid', 'used_count', 'remaining_count']
 
-    def get_used_count(self, obj):
+    def _balance(self, obj):
+        balances = self.context.get('leave_balances')
+        if balances is not None:
+            return balances.get(obj.id)
         request = self.context.get('request')
-        if request and hasattr(request.user, 'employee_profile'):
-            employee = request.user.employee_profile
-
-            # Get all approved leaves of this type for the employee
-            leaves = EmpLeave.objects.filter(
-                employee=employee,
-                leave_type=obj,
-                status='Approved'
-            )
+        employee = getattr(request.user, 'employee_profile', None) if request else None
+        if not employee:
+            return None
+        return LeaveBalance.objects.filter(employee=employee, leave_type=obj, year=date.today().year).first()
 
-            total_days = 0
-            for leave in leaves:
-                if leave.from_date and leave.to_date:
-                    delta = (leave.to_date - leave.from_date).days + 1  # inclusive
-                    total_days += max(delta, 0)
+    def get_used_count(self, obj):
+        # This year's approved days, kept up to date by app.leave_ledger
+        balance = self._balance(obj)
+        return balance.used if balance else 0
 
-            return total_days
+    def get_remaining_count(self, obj):
+        balance = self._balance(obj)
+        return balance.remaining if balance else obj.count
+
+
+class LeaveLedgerEntrySerializer(serializers.ModelSerializer):
+    leave_name = serializers.CharField(source='leave_type.leave_name', read_only=True)
+    from_date = serializers.DateField(source='emp_leave.from_date', read_only=True, default=None)
+    to_date = serializers.DateField(source='emp_leave.to_date', read_only=True, default=None)
+
+    class Meta:
+        model = LeaveLedgerEntry
+        fields = ['id', 'leave_type', 'leave_name', 'year', 'entry_type', 'days', 'note', 'from_date', 'to_date', 'created_at']
 
-        return 0
 
-    def get_remaining_count(self, obj):
-        used = self.get_used_count(obj)
-        return max(obj.count - used, 0)
-    
-    
 class EmpLearningCornerSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
     video = serializers.SerializerMethodField()
@@ -350,3 +378,24 @@ class PolicyConfigurationSerializer(serializers.ModelSerializer):
         if obj.document:
             return request.build_absolute_uri(obj.document.url)
         return None
+
+
+class PunchEventInputSerializer(serializers.Serializer):
+    client_event_id = serializers.CharField(max_length=64)
+    type = serializers.ChoiceField(choices=[choice for choice, _ in PunchEvent.EVENT_TYPES])
+    timestamp = serializers.DateTimeField()
+    # Kiosks punch for many employees; employee apps leave this out
+    employee = serializers.IntegerField(required=False)
+    break_config = serializers.IntegerField(required=False, allow_null=True)
+
+
+class PunchSyncSerializer(serializers.Serializer):
+    MAX_EVENTS = 500
+
+    device_id = serializers.CharField(max_length=100)
+    events = PunchEventInputSerializer(many=True, allow_empty=False)
+
+    def validate_events(self, events):
+        if len(events) > self.MAX_EVENTS:
+            raise serializers.ValidationError(f"At most {self.MAX_EVENTS} events per sync.")
+        return events
@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from app.models import Attendance, BreakLog, CalendarEvent, Employee, Payroll
+from .calendar_service import invalidate_company_events
+from .dashboard import invalidate_dashboard
+
+
+def _invalidate_on_commit(employee_id, day):
+    if employee_id:
+        transaction.on_commit(lambda: invalidate_dashboard(employee_id, day))
+
+
+@receiver([post_save, post_delete], sender=Attendance)
+def attendance_changed(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.employee_id, instance.date)
+
+
+@receiver([post_save, post_delete], sender=BreakLog)
+def break_log_changed(sender, instance, **kwargs):
+    day = timezone.localdate(instance.start) if instance.start else timezone.localdate()
+    _invalidate_on_commit(instance.employee_id, day)
+
+
+@receiver([post_save, post_delete], sender=Payroll)
+def payroll_changed(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.employee_id, timezone.localdate())
+
+
+@receiver(post_save, sender=Employee)
+def employee_changed(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.id, timezone.localdate())
+
+
+@receiver(pre_save, sender=CalendarEvent)
+def calendar_event_moving(sender, instance, **kwargs):
+    # Remember where an edited event was, so the month it leaves is refreshed too
+    if instance.pk:
+        instance._previous_slot = (
+            CalendarEvent.objects.filter(pk=instance.pk).values_list('company_id', 'date').first()
+        )
+
+
+@receiver([post_save, post_delete], sender=CalendarEvent)
+def calendar_event_changed(sender, instance, **kwargs):
+    slots = {(instance.company_id, instance.date)}
+    previous = getattr(instance, '_previous_slot', None)
+    if previous:
+        slots.add(previous)
+    for company_id, day in slots:
+        if company_id and day:
+            transaction.on_commit(lambda c=company_id, d=day: invalidate_company_events(c, d))
@@ -0,0 +1,110 @@
+from django.db import transaction
+from django.http import Http404
+
+from app.models import Employee
+from notifications.events import publish
+from notifications.models import UserNotification
+from notifications.senders import get_system_sender
+from notifications.service import send_fcm_batch, send_fcm_to_users
+from .models import Task, TaskAssignment
+
+
+def notify_new_assignees(task, assignments):
+    """
+    Announce new assignments of `task`, as the per-row handlers did: each new
+    assignee gets the task push and a "Task Assigned" notification, and everyone
+    on the task is told it was assigned to them, once per batch.
+    """
+    assignments = [a for a in assignments if a.employee.user_id]
+    if not assignments:
+        return
+    default_sender = get_system_sender(assignments[0].employee.company_id)
+    body = f"{task.title} (deadline: {task.deadline})"
+    send_fcm_batch(
+        [
+            {
+                'user_id': a.employee.user_id,
+                'notif_type': 'task',
+                'message': body,
+                'extra_data': {"type": "task", "task_id": task.id, "assignment_id": a.id, "status": a.status},
+            }
+            for a in assignments
+        ],
+        sender=default_sender,
+    )
+    UserNotification.objects.bulk_create([
+        UserNotification(
+            recipient=a.employee,
+            title=f"Task Assigned: {task.title}",
+            message=f"You have been assigned a task: {task.title} (deadline: {task.deadline})",
+            related_object_id=task.id,
+            sender=default_sender,
+        )
+        for a in assignments
+    ])
+    send_fcm_to_users(
+        list(task.assignments.filter(employee__user__isnull=False).values_list("employee__user_id", flat=True)),
+        "task",
+        f"{task.title} assigned to you",
+        sender=default_sender,
+        extra_data={"type": "task", "task_id": task.id},
+    )
+
+
+def reconcile_assignments(task, manager, employee_ids, owner_id):
+    """
+    Make the task's assignments match `employee_ids`, with `owner_id` as owner and
+    everyone else as contributor. Only the difference is written: assignments of
+    employees who stay keep their status, removed ones are deleted and new ones
+    are bulk created. Every employee must report to `manager`, otherwise Http404
+    is raised and nothing changes.
+
+    Returns the task's assignments in the order of `employee_ids`.
+    """
+    try:
+        wanted = list(dict.fromkeys(int(emp_id) for emp_id in employee_ids))
+    except (TypeError, ValueError):
+        raise Http404("No Employee matches the given query.")
+    employees = {emp.id: emp for emp in Employee.objects.filter(id__in=wanted, reporting_manager=manager)}
+    if len(employees) != len(wanted):
+        raise Http404("No Employee matches the given query.")
+
+    def role_for(emp_id):
+        return 'owner' if str(emp_id) == str(owner_id) else 'contributor'
+
+    with transaction.atomic():
+        existing = {a.employee_id: a for a in TaskAssignment.objects.select_for_update().filter(task=task)}
+
+        removed = [a.id for emp_id, a in existing.items() if emp_id not in employees]
+        if removed:
+            TaskAssignment.objects.filter(id__in=removed).delete()
+
+        changed = []
+        for emp_id, assignment in existing.items():
+            if emp_id in employees and assignment.role != role_for(emp_id):
+                assignment.role = role_for(emp_id)
+                changed.append(assignment)
+        if changed:
+            TaskAssignment.objects.bulk_update(changed, ['role'])
+
+        added = TaskAssignment.objects.bulk_create([
+            TaskAssignment(task=task, employee_id=emp_id, role=role_for(emp_id))
+            for emp_id in wanted if emp_id not in existing
+        ])
+
+        if removed or added:
+            Task.refresh_counters([task.id])
+
+        # bulk_create skips post_save, which publishes these for single saves
+        for assignment in added:
+            publish('task_assigned', assignment.id)
+
+    by_employee = {a.employee_id: a for a in existing.values() if a.employee_id in employees}
+    by_employee.update({a.employee_id: a for a in added})
+    assignments = []
+    for emp_id in wanted:
+        assignment = by_employee[emp_id]
+        # Already loaded above; saves a query per row when serializing
+        assignment.employee = employees[emp_id]
+        assignments.append(assignment)
+    return assignments
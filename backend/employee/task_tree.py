@@ -0,0 +1,68 @@
+from django.core.exceptions import EmptyResultSet
+from django.db.models.expressions import RawSQL
+
+from .models import Task, TaskAssignment
+
+
+def _forest_ids(roots):
+    """
+    SQL selecting the ids of the root tasks and of every task below them,
+    at any depth, through a recursive CTE.
+    """
+    root_sql, params = roots.order_by().values('pk').query.sql_with_params()
+    table = Task._meta.db_table
+    sql = (
+        f'WITH RECURSIVE forest(id) AS ('
+        f'{root_sql} '
+        f'UNION SELECT t.id FROM {table} t JOIN forest f ON t.parent_task_id = f.id'
+        f') SELECT id FROM forest'
+    )
+    return RawSQL(sql, params)
+
+
+def load_task_forest(roots):
+    """
+    Load the tasks of `roots` with all their subtasks and assignments in two
+    queries, and return the root tasks in id order.
+
+    Each loaded task gets:
+      tree_subtasks     its direct subtasks, in id order
+      tree_assignments  its assignments, with the employee selected
+
+    Progress comes from the counters stored on each task.
+    """
+    try:
+        forest_ids = _forest_ids(roots)
+    except EmptyResultSet:
+        # roots is an empty queryset such as Task.objects.none()
+        return []
+
+    tasks = list(
+        Task.objects.filter(pk__in=forest_ids)
+        .select_related('created_by')
+        .order_by('id')
+    )
+    by_id = {task.id: task for task in tasks}
+    for task in tasks:
+        task.tree_subtasks = []
+        task.tree_assignments = []
+
+    assignments = (
+        TaskAssignment.objects.filter(task_id__in=list(by_id))
+        .select_related('employee')
+        .order_by('id')
+    )
+    for assignment in assignments:
+        task = by_id[assignment.task_id]
+        # Share the loaded task instead of fetching it again through the FK
+        assignment.task = task
+        task.tree_assignments.append(assignment)
+
+    roots_out = []
+    for task in tasks:
+        parent = by_id.get(task.parent_task_id)
+        if parent is not None:
+            parent.tree_subtasks.append(task)
+        else:
+            roots_out.append(task)
+    return roots_out
@@ -1,3 +1,102 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.models import Attendance, BreakConfig, BreakLog, Company, Employee, PunchEvent, UserRegister
+
+from .models import Task, TaskAssignment
+from .punch import PunchSync
+from .views import TaskDetailAPIView
+
+
+class TaskDetailTests(TestCase):
+    def setUp(self):
+        company = Company.objects.create(
+            name='Acme', address='1 Main St', email='hr@acme.example', phone_number='0000000000'
+        )
+        user = UserRegister.objects.create_user(username='manager', password='x', role='employee', company=company)
+        self.manager = Employee.objects.create(company=company, user=user, first_name='Mina')
+        self.report = Employee.objects.create(company=company, first_name='Ravi', reporting_manager=self.manager)
+        self.task = Task.objects.create(
+            title='Quarterly report', created_by=self.manager, deadline=date(2026, 12, 31), priority='medium'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def test_update_keeps_counters_changed_meanwhile(self):
+        # Loaded before an assignment is added, as by a request racing with it
+        stale = Task.objects.get(pk=self.task.pk)
+        TaskAssignment.objects.create(task=self.task, employee=self.report, role='owner', status='done')
+        Task.refresh_counters([self.task.id])
+
+        with mock.patch.object(TaskDetailAPIView, 'get_object', return_value=stale):
+            response = self.client.patch(
+                reverse('task_detail', args=[self.task.pk]), {'title': 'Annual report'}, format='json'
+            )
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['progress'], 100)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.title, 'Annual report')
+        self.assertEqual((self.task.assignments_total, self.task.assignments_done), (1, 1))
+
+
+class PunchSyncTests(TestCase):
+    def setUp(self):
+        company = Company.objects.create(
+            name='Acme', address='1 Main St', email='hr@acme.example', phone_number='0000000000'
+        )
+        self.employee = Employee.objects.create(company=company, first_name='Ravi')
+        self.lunch = BreakConfig.objects.create(company=company, break_choice='meal_break', duration_minutes=30)
+        yesterday = (datetime.now(dt_timezone.utc) - timedelta(days=1)).date()
+        self.day = datetime(yesterday.year, yesterday.month, yesterday.day, tzinfo=dt_timezone.utc)
+
+    def _event(self, cid, event_type, hour, minute=0, **extra):
+        return {
+            'client_event_id': cid, 'type': event_type,
+            'timestamp': self.day.replace(hour=hour, minute=minute), **extra,
+        }
+
+    def _sync(self, events):
+        return PunchSync(self.employee, 'phone-1', dt_timezone.utc).run(events)
+
+    def test_events_are_replayed_in_time_order(self):
+        outcomes = self._sync([
+            self._event('e4', 'check_out', 18),
+            self._event('e3', 'break_end', 13, 30, break_config=self.lunch.id),
+            self._event('e1', 'check_in', 9),
+            self._event('e2', 'break_start', 13, break_config=self.lunch.id),
+        ])
+
+        self.assertEqual([status for status, _ in outcomes], ['applied'] * 4)
+        attendance = Attendance.objects.get(employee=self.employee)
+        self.assertEqual(attendance.check_in, self.day.replace(hour=9))
+        self.assertEqual(attendance.check_out, self.day.replace(hour=18))
+        self.assertEqual(attendance.total_work_duration, timedelta(hours=8, minutes=30))
+        break_log = BreakLog.objects.get(employee=self.employee)
+        self.assertEqual((break_log.attendance_id, break_log.duration_minutes), (attendance.id, 30))
+
+    def test_duplicate_client_event_ids(self):
+        check_in = self._event('e1', 'check_in', 9)
+        outcomes = self._sync([check_in, dict(check_in, timestamp=self.day.replace(hour=8))])
+        self.assertEqual(outcomes, [('applied', ''), ('duplicate', 'Repeated in this batch.')])
+
+        # A resent batch changes nothing
+        outcomes = self._sync([check_in, self._event('e2', 'check_out', 17)])
+        self.assertEqual(outcomes, [('duplicate', 'Already synced.'), ('applied', '')])
+        self.assertEqual(PunchEvent.objects.filter(employee=self.employee).count(), 2)
+        self.assertEqual(Attendance.objects.get(employee=self.employee).check_in, self.day.replace(hour=9))
+
+    def test_break_end_without_open_break(self):
+        outcomes = self._sync([
+            self._event('e1', 'check_in', 9),
+            self._event('e2', 'break_end', 13, break_config=self.lunch.id),
+        ])
 
-# Create your tests here.
+        self.assertEqual(outcomes[1], ('rejected', 'No active break to end.'))
+        event = PunchEvent.objects.get(employee=self.employee, client_event_id='e2')
+        self.assertEqual(event.status, 'rejected')
+        self.assertFalse(BreakLog.objects.filter(employee=self.employee).exists())
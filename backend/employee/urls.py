@@ -8,6 +8,8 @@ urlpatterns = [
     path('employee-id/', EmployeeIdAPIView.as_view(), name='employee_id'),
     path('checkin/', CheckInAPIView.as_view(), name='api_checkin'),
     path('checkout/', CheckOutAPIView.as_view(), name='api_checkout'),
+    path('punch/', PunchAPIView.as_view(), name='api_punch'),
+    path('punch-sync/', PunchSyncAPIView.as_view(), name='api_punch_sync'),
     path('dashboard/', DashboardAPIView.as_view(), name='dashboard'),
     path('employee-notifications/', NotificationListAPIView.as_view(), name='employee-notifications'),
 
@@ -24,6 +26,8 @@ urlpatterns = [
     path('employee-leave-create/', EmpLeaveListCreateAPIView.as_view(), name='employee_leave_create'),
     path('emp-leaves/', EmpLeaveListAPIView.as_view(), name='emp_leave_list'),
     path('leaves-list/', LeaveListAPIView.as_view(), name='leave_list'),
+    path('leave-ledger/', LeaveLedgerAPIView.as_view(), name='leave_ledger'),
+    path('emp-leaves/bulk-decision/', BulkEmpLeaveDecisionAPIView.as_view(), name='emp_leave_bulk_decision'),
     path('emp-leaves/<int:leave_id>/approve/', ApproveEmpLeaveAPIView.as_view(), name='emp_leave_approve'),
     path('emp-leaves/<int:leave_id>/reject/', RejectEmpLeaveAPIView.as_view(), name='emp_leave_reject'),
     path('emp-leaves/<int:leave_id>/cancel/', CancelEmpLeaveAPIView.as_view(), name='emp_leave_cancel'),
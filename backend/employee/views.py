@@ -1,6 +1,6 @@
 from rest_framework import viewsets, generics,permissions, status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import action
@@ -9,12 +9,26 @@ from datetime import datetime, timedelta
 import pytz
 import calendar
 from datetime import date
-from django.db.models import Q,Prefetch
+from django.db.models import Q
 from rest_framework.views import APIView
 from calendar import month_name
 from .utils import calculate_worked_time, calculate_effective_time
 import re
-from app.models import Attendance,Notification,LearningCorner, ShiftPolicy, Employee, BreakLog,Payroll,CalendarEvent,EmpLeave,CompanyPolicies,Level,Designation
+from app.models import Attendance,Notification,LearningCorner, ShiftPolicy, Employee, BreakLog,Payroll,CalendarEvent,EmpLeave,CompanyPolicies,Level,Designation,EmployeeHierarchy,LeaveLedgerEntry
+from app.shift_resolver import resolve_shift
+from app.org_hierarchy import chain_of, reports_of
+from app.leave_ledger import balances_for, sync_leave
+from app.leave_intervals import overlapping
+from app.tenant_config import get_config
+from .punch import PunchError, PunchSync, punch_in, punch_out
+from .dashboard import get_snapshot as get_dashboard_snapshot
+from .attendance_history import build_month_history, payload_etag
+from .task_tree import load_task_forest
+from .task_assignments import reconcile_assignments
+from .leave_decisions import DECISIONS as LEAVE_DECISIONS, MAX_BATCH as MAX_LEAVE_DECISIONS, decide_leaves
+from .calendar_service import MAX_MONTHS as MAX_CALENDAR_MONTHS, build_month_grids, month_span
+from django.utils.http import parse_etags
+from django.db import IntegrityError, transaction
 from .models import *
 from .serializers import *
 
@@ -52,16 +66,16 @@ class ReportingManagerAPIView(APIView):
         manager_id = request.query_params.get('manager_id')
 
         if manager_id:
-            # Fetch reportees for given manager
-            employees = Employee.objects.filter(reporting_manager_id=manager_id)
+            # Fetch reportees for given manager; ?transitive=true includes their reports too
+            if request.query_params.get('transitive') in ('1', 'true'):
+                employees = reports_of(manager_id)
+            else:
+                employees = Employee.objects.filter(reporting_manager_id=manager_id)
         else:
             # Fetch distinct reporting managers
-            manager_ids = (
-                Employee.objects.exclude(reporting_manager__isnull=True)
-                .values_list('reporting_manager_id', flat=True)
-                .distinct()
+            employees = Employee.objects.filter(
+                id__in=EmployeeHierarchy.objects.filter(depth=1).values('ancestor_id')
             )
-            employees = Employee.objects.filter(id__in=manager_ids)
 
         serializer = ReportingManagerSerializer(employees, many=True)
         return Response(serializer.data)
@@ -90,50 +104,26 @@ class CheckInAPIView(APIView):
                 "detail": f"Already checked in at {existing.check_in.astimezone(tz).strftime('%H:%M:%S')}"
             }, status=400)
 
-        shifts = ShiftPolicy.objects.all()
-        selected_shift = None
-        early_checkin_buffer = timedelta(hours=2)
-        min_work_time = timedelta(hours=2)
-
-        for shift in shifts:
-            shift_start_dt = tz.localize(datetime.combine(today, shift.checkin))
-            shift_end_dt = tz.localize(datetime.combine(today, shift.checkout))
-            if shift.checkin > shift.checkout:
-                shift_end_dt += timedelta(days=1)
-            early_window_start = shift_start_dt - early_checkin_buffer
-            if early_window_start <= now_dt < shift_end_dt:
-                if shift_end_dt - now_dt >= min_work_time:
-                    selected_shift = shift
-                    break
-
+        selected_shift, shift_start_dt = resolve_shift(employee, now_dt)
         if not selected_shift:
-            selected_shift = min(
-                shifts,
-                key=lambda s: (
-                    (
-                        tz.localize(datetime.combine(today, s.checkin)) - now_dt
-                        if tz.localize(datetime.combine(today, s.checkin)) > now_dt
-                        else tz.localize(datetime.combine(today + timedelta(days=1), s.checkin)) - now_dt
-                    ).total_seconds()
-                )
-            )
+            return Response({"detail": "No shift policy configured for your company."}, status=400)
 
-        grace = selected_shift.grace()
-        shift_start_dt = tz.localize(datetime.combine(today, selected_shift.checkin))
-        if selected_shift.checkin > selected_shift.checkout and now_dt.time() < selected_shift.checkout:
-            shift_start_dt -= timedelta(days=1)
-        shift_start_with_grace = shift_start_dt + grace
+        shift_start_with_grace = shift_start_dt + selected_shift.grace()
 
         is_late = now_dt > shift_start_with_grace
 
-        attendance = Attendance.objects.create(
-            employee=employee,
-            company=employee.company,
-            shift=selected_shift,
-            date=today,
-            check_in=now_dt,
-            is_present=True
-        )
+        try:
+            attendance = Attendance.objects.create(
+                employee=employee,
+                company=employee.company,
+                shift=selected_shift,
+                date=today,
+                check_in=now_dt,
+                is_present=True
+            )
+        except IntegrityError:
+            # A concurrent tap created today's row first
+            return Response({"detail": "Already checked in."}, status=400)
 
         serializer = EmployeeAttendanceSerializer(attendance)
         return Response({
@@ -179,129 +169,163 @@ class CheckOutAPIView(APIView):
 
 
 
-class DashboardAPIView(APIView):
+class PunchAPIView(APIView):
+    """
+    Lightweight check-in / check-out used at shift start.
+    Body: {"type": "in"} or {"type": "out"}; defaults to "in".
+    """
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
+    def post(self, request):
         user = request.user
         if not hasattr(user, 'role') or user.role != 'employee':
-            return Response({"detail": "Unauthorized. Employee role required."}, status=403)
+            return Response({"detail": "Unauthorized."}, status=403)
+
+        employee = Employee.objects.only('id', 'company_id', 'department_id').filter(user_id=user.id).first()
+        if not employee:
+            return Response({"detail": "Employee record not found."}, status=404)
+
+        punch_type = request.data.get('type', 'in')
+        if punch_type not in ('in', 'out'):
+            return Response({"detail": "type must be 'in' or 'out'."}, status=400)
 
+        now_dt = timezone.localtime(timezone.now(), pytz.timezone('Asia/Kolkata'))
         try:
-            employee = Employee.objects.get(email=user.email)
-            today = timezone.localdate()
-            tz = pytz.timezone('Asia/Kolkata')
-            now = timezone.localtime(timezone.now(), tz)
+            if punch_type == 'in':
+                result = punch_in(employee, now_dt)
+            else:
+                result = punch_out(employee, now_dt)
+        except PunchError as e:
+            return Response({"detail": str(e)}, status=400)
 
-            attendance = Attendance.objects.filter(employee=employee, date=today).first()
+        if punch_type == 'in':
+            shift = result['shift']
+            return Response({
+                "detail": f"Checked in at {now_dt.strftime('%H:%M:%S')} for shift {shift.shift_type}",
+                "attendance_id": result['attendance_id'],
+                "check_in": now_dt,
+                "shift": {"id": shift.id, "shift_type": shift.shift_type},
+                "is_late": result['is_late'],
+                "late_by_minutes": int(result['late_by'].total_seconds() // 60),
+            })
 
-            active_break = BreakLog.objects.filter(
-                employee=employee,
-                start__date=today,
-                end__isnull=True
-            ).first()
+        return Response({
+            "detail": f"Checked out at {now_dt.strftime('%H:%M:%S')}",
+            "attendance_id": result['attendance_id'],
+            "check_in": result['check_in'],
+            "check_out": now_dt,
+            "total_work_duration": str(result['total_work_duration']),
+            "overtime_duration": str(result['overtime_duration']),
+        })
 
-            recent_breaks = BreakLog.objects.filter(
-                employee=employee,
-                start__date=today,
-                end__isnull=False
-            ).order_by('-start')[:5]
 
-            punch_in = attendance.check_in if attendance else None
-            punch_out = attendance.check_out if attendance else None
+class PunchSyncAPIView(APIView):
+    """
+    Batch upload of punches recorded offline by the mobile app or a kiosk.
 
-            # Break minutes calculation (fix: always sum all breaks for today for this employee)
-            breaks = BreakLog.objects.filter(
-                employee=employee,
-                start__date=today,
-                end__isnull=False
-            )
-            break_minutes = sum(
-                int((b.end - b.start).total_seconds() // 60)
-                for b in breaks
-            )
+    Body: {"device_id": "...", "events": [{"client_event_id", "type", "timestamp",
+    "break_config"?, "employee"?}]}. Employees sync their own punches; company
+    admins (kiosks) must give the employee id on every event. Events already
+    synced are reported as duplicates, so a device can safely resend a batch.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        if getattr(user, 'role', None) not in ('employee', 'admin'):
+            return Response({"detail": "Unauthorized."}, status=403)
 
-            # Late check-in logic
-            is_late = False
-            if attendance and punch_in and attendance.shift:
-                grace = attendance.shift.grace_period or timedelta(minutes=15)
-                shift_start = datetime.combine(today, attendance.shift.checkin)
-                shift_start_aware = tz.localize(shift_start)
-
-                if punch_in > (shift_start_aware + grace):
-                    is_late = True
-
-            # Overtime calculation
-            overtime = None
-            if attendance and punch_out and attendance.shift:
-                shift_start_time = attendance.shift.checkin
-                shift_end_time = attendance.shift.checkout
-
-                shift_start_dt = datetime.combine(today, shift_start_time)
-                shift_end_dt = datetime.combine(today, shift_end_time)
-
-                # If overnight shift (e.g., 9 PM to 6 AM)
-                if shift_start_time > shift_end_time:
-                    shift_end_dt += timedelta(days=1)
-
-                shift_end_aware = tz.localize(shift_end_dt)
-
-                if punch_out > shift_end_aware:
-                    overtime_delta = punch_out - shift_end_aware
-                    overtime_minutes = overtime_delta.total_seconds() // 60
-                    overtime = {
-                        'hours': int(overtime_minutes // 60),
-                        'minutes': int(overtime_minutes % 60),
-                        'total': round(overtime_minutes / 60, 2)
+        serializer = PunchSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        device_id = serializer.validated_data['device_id']
+        events = serializer.validated_data['events']
+
+        if user.role == 'employee':
+            employee = Employee.objects.only('id', 'company_id', 'department_id').filter(user_id=user.id).first()
+            if not employee:
+                return Response({"detail": "Employee record not found."}, status=404)
+            if any(e.get('employee') not in (None, employee.id) for e in events):
+                return Response({"detail": "You can only sync your own punches."}, status=403)
+            employees = {employee.id: employee}
+            for event in events:
+                event['employee'] = employee.id
+        else:
+            if any(e.get('employee') is None for e in events):
+                return Response({"detail": "employee is required on every event."}, status=400)
+            employees = {
+                e.id: e for e in Employee.objects.only('id', 'company_id', 'department_id').filter(
+                    company=user.company, id__in={e['employee'] for e in events}
+                )
+            }
+            unknown = {e['employee'] for e in events} - set(employees)
+            if unknown:
+                return Response({"detail": f"Unknown employee id(s): {sorted(unknown)}"}, status=400)
+
+        by_employee = {}
+        for index, event in enumerate(events):
+            by_employee.setdefault(event['employee'], []).append((index, event))
+
+        tz = pytz.timezone('Asia/Kolkata')
+        results = [None] * len(events)
+        with transaction.atomic():
+            for employee_id, indexed in by_employee.items():
+                outcomes = PunchSync(employees[employee_id], device_id, tz).run([e for _, e in indexed])
+                for (index, event), (event_status, detail) in zip(indexed, outcomes):
+                    results[index] = {
+                        "client_event_id": event['client_event_id'],
+                        "status": event_status,
+                        "detail": detail,
                     }
 
-            # Latest payroll
-            latest_payroll = Payroll.objects.filter(employee=employee).order_by('-payroll_date').first()
-            latest_payroll_data = {
-                'amount': latest_payroll.net_pay,
-                'date': latest_payroll.payroll_date
-            } if latest_payroll else None
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+        return Response({"device_id": device_id, "summary": summary, "results": results})
+
+class DashboardAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        if not hasattr(user, 'role') or user.role != 'employee':
+            return Response({"detail": "Unauthorized. Employee role required."}, status=403)
+
+        try:
+            today = timezone.localdate()
+            tz = pytz.timezone('Asia/Kolkata')
+            now = timezone.localtime(timezone.now(), tz)
 
+            snapshot = get_dashboard_snapshot(user, today, tz)
+            if snapshot is None:
+                return Response({"detail": "Employee record not found."}, status=404)
+
+            punch_in = snapshot['check_in']
+            punch_out = snapshot['check_out']
+            break_minutes = snapshot['break_minutes']
 
             # Birthday message logic
             birthday_message = None
-            if employee.date_of_birth:
-                today_month = today.month
-                today_day = today.day
-                dob_month = employee.date_of_birth.month
-                dob_day = employee.date_of_birth.day
-                if today_month == dob_month and today_day == dob_day:
-                    birthday_message = f"Happy Birthday, {employee.first_name}! 🎉"
+            dob = snapshot['date_of_birth']
+            if dob and (today.month, today.day) == (dob.month, dob.day):
+                birthday_message = f"Happy Birthday, {snapshot['first_name']}! 🎉"
 
             dashboard_data = {
-                'employee_name': f"{employee.first_name} {employee.last_name}",
-                'employee_photo': request.build_absolute_uri(employee.photo.url) if employee.photo else None,
+                'employee_name': snapshot['employee_name'],
+                'employee_photo': request.build_absolute_uri(snapshot['photo_url']) if snapshot['photo_url'] else None,
 
                 'checkin_time': timezone.localtime(punch_in, tz).strftime('%H:%M:%S') if punch_in else None,
                 'checkout_time': timezone.localtime(punch_out, tz).strftime('%H:%M:%S') if punch_out else None,
-                'is_late': is_late,
+                'is_late': snapshot['is_late'],
                 'total_worked': calculate_worked_time(punch_in, punch_out, now)[0],
                 'effective_time': calculate_effective_time(punch_in, break_minutes, punch_out, now)['formatted'],
                 'total_break_minutes': break_minutes,
-                'shift_name': attendance.shift.shift_type if attendance and attendance.shift else 'Not assigned',
-                'shift_timing': f"{attendance.shift.checkin.strftime('%H:%M')} - {attendance.shift.checkout.strftime('%H:%M')}" if attendance and attendance.shift else '--:--',
+                'shift_name': snapshot['shift_name'],
+                'shift_timing': snapshot['shift_timing'],
                 'server_time': now.strftime('%Y-%m-%d %H:%M:%S'),
-                'active_break': {
-                        'type': active_break.break_config.get_break_choice_display() if active_break.break_config else None,
-                        'break_config_id': active_break.break_config.id if active_break.break_config else None,
-                        'start_time': timezone.localtime(active_break.start, tz).strftime('%H:%M:%S')
-                    } if active_break else None,
-                'recent_breaks': [
-                        {
-                            'type': br.break_config.get_break_choice_display() if br.break_config else None,
-                            'break_config_id': br.break_config.id if br.break_config else None,
-                            'start_time': timezone.localtime(br.start, tz).strftime('%H:%M:%S'),
-                            'end_time': timezone.localtime(br.end, tz).strftime('%H:%M:%S')
-                        }
-                        for br in recent_breaks
-                    ] if recent_breaks else None,
-                'overtime': overtime,
-                'latest_payroll': latest_payroll_data,
+                'active_break': snapshot['active_break'],
+                'recent_breaks': snapshot['recent_breaks'],
+                'overtime': snapshot['overtime'],
+                'latest_payroll': snapshot['latest_payroll'],
                 'birthday_message': birthday_message,
             }
 
@@ -336,150 +360,8 @@ class AttendanceHistoryAPIView(APIView):
         except Employee.DoesNotExist:
             return Response({"detail": "Employee not found."}, status=404)
 
-        start_date = datetime(selected_year, selected_month, 1).date()
-        if selected_month == 12:
-            end_date = datetime(selected_year + 1, 1, 1).date() - timedelta(days=1)
-        else:
-            end_date = datetime(selected_year, selected_month + 1, 1).date() - timedelta(days=1)
-
-        # Attendance records
-        attendances = Attendance.objects.filter(
-            employee=employee,
-            date__range=(start_date, end_date)
-        ).select_related('shift').prefetch_related('break_logs')
-
-        # Approved leaves
-        approved_leaves = EmpLeave.objects.filter(
-            employee=employee,
-            status='Approved',
-            from_date__lte=end_date,
-            to_date__gte=start_date
-        )
-
-        approved_leave_days = set()
-        for leave in approved_leaves:
-            for i in range((leave.to_date - leave.from_date).days + 1):
-                approved_leave_days.add(leave.from_date + timedelta(days=i))
-
-        # Index by date
-        att_map = {att.date: att for att in attendances}
-        # Monthly stats
-        monthly_data = []
-        stats = {
-            'present': 0,
-            'absent': 0,
-            'leave': 0,
-            'half_day': 0,
-            'late': 0,
-            'working_days': 0
-        }
-
-        day = start_date
-        while day <= end_date:
-            is_weekend = day.weekday() >= 5
-            status = 'absent'
-            is_late = False
-            late_duration = None
-            total_hours = None
-            overtime_hours = None
-            break_time = '-'
-
-            att = att_map.get(day)
-
-            if is_weekend:
-                status = 'weekend'
-            elif day in approved_leave_days:
-                status = 'leave'
-                stats['leave'] += 1
-            elif att and att.check_in:
-                if att.check_out:
-                    check_out = att.check_out
-                    check_in = att.check_in
-                    # Get all completed breaks for this employee for this day
-                    breaks = BreakLog.objects.filter(
-                        employee=employee,
-                        start__date=day,
-                        end__isnull=False
-                    )
-                    total_break = sum(
-                        (b.end - b.start).total_seconds()
-                        for b in breaks if b.end and b.start
-                    )
-                    work_duration = (check_out - check_in).total_seconds() / 3600
-                    work_duration -= total_break / 3600
-                    total_hours = round(work_duration, 2)
-                    # Shift rules
-                    if att.shift:
-                        grace = att.shift.grace_period or timedelta(minutes=15)
-                        shift_start_naive = datetime.combine(day, att.shift.checkin)
-                        shift_start_aware = tz.localize(shift_start_naive)
-                        check_in_local = check_in.astimezone(tz)
-                        if check_in_local > (shift_start_aware + grace):
-                            is_late = True
-                            late_delta = check_in_local - (shift_start_aware + grace)
-                            late_duration = str(late_delta).split('.')[0]  # Format as HH:MM:SS
-                        full_day_hours = att.shift.full_day_hours()
-                        half_day_hours = att.shift.half_day_hours()
-                        if work_duration >= full_day_hours:
-                            status = 'present'
-                            stats['present'] += 1
-                        elif work_duration >= half_day_hours:
-                            status = 'half_day'
-                            stats['half_day'] += 1
-                            stats['present'] += 0.5
-                            stats['absent'] += 0.5
-                        else:
-                            status = 'absent'
-                            stats['absent'] += 1
-                    else:
-                        status = 'present'
-                        stats['present'] += 1
-                    if att.overtime_duration:
-                        overtime_hours = round(att.overtime_duration.total_seconds() / 3600, 2)
-                    break_time = f'{int(total_break // 60)} min' if total_break else '-'
-                else:
-                    # Checked in but not checked out: show status as 'checked_in', and calculate late
-                    status = 'checked_in'
-                    break_time = '-'
-                    if att.shift:
-                        grace = att.shift.grace_period or timedelta(minutes=15)
-                        shift_start_naive = datetime.combine(day, att.shift.checkin)
-                        shift_start_aware = tz.localize(shift_start_naive)
-                        check_in_local = att.check_in.astimezone(tz)
-                        if check_in_local > (shift_start_aware + grace):
-                            is_late = True
-                            late_delta = check_in_local - (shift_start_aware + grace)
-                            late_duration = str(late_delta).split('.')[0]
-            else:
-                if not is_weekend and status not in ['leave']:
-                    status = 'absent'
-                    stats['absent'] += 1
-
-            if is_late and status in ['present', 'half_day', 'checked_in']:
-                stats['late'] += 1
-
-            monthly_data.append({
-                'date': str(day),
-                'day_name': day.strftime('%A'),
-                'check_in': att.check_in.astimezone(tz).strftime('%H:%M:%S') if att and att.check_in else '-',
-                'check_out': att.check_out.astimezone(tz).strftime('%H:%M:%S') if att and att.check_out else '-',
-                'shift': str(att.shift) if att and att.shift else '-',
-                'is_weekend': is_weekend,
-                'status': status,
-                'is_late': is_late,
-                'late_duration': late_duration,
-                'total_hours': total_hours if total_hours is not None else '-',
-                'overtime_hours': overtime_hours if overtime_hours is not None else '-',
-                'break_time': break_time,
-            })
-
-
-            if not is_weekend:
-                stats['working_days'] += 1
-
-            day += timedelta(days=1)
-
-        return Response({
+        monthly_data, stats = build_month_history(employee, selected_year, selected_month, tz)
+        payload = {
             'months': [{'value': i, 'name': month_name[i]} for i in range(1, 13)],
             'years': list(range(today.year - 5, today.year + 6)),
             'selected_month': selected_month,
@@ -487,7 +369,20 @@ class AttendanceHistoryAPIView(APIView):
             'selected_month_name': month_name[selected_month],
             'monthly_data': monthly_data,
             'summary': stats
-        })
+        }
+
+        # Past months rarely change: let the client keep them for a while and
+        # revalidate with If-None-Match afterwards. The current month is always revalidated.
+        etag = payload_etag(payload)
+        is_past_month = (selected_year, selected_month) < (today.year, today.month)
+        cache_control = 'private, max-age=300' if is_past_month else 'private, no-cache'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(payload)
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
 
 class EmployeeCalendarAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -499,31 +394,19 @@ class EmployeeCalendarAPIView(APIView):
         day = int(request.GET.get('day', today.day))
         current_date = date(year, month, day)
 
-        cal = calendar.Calendar(firstweekday=6)
-        month_days = cal.monthdayscalendar(year, month)
-
-        weeks = []
-        for week_days in month_days:
-            week = []
-            for day_num in week_days:
-                if day_num == 0:
-                    week.append({'day': ''})
-                    continue
-
-                day_date = date(year, month, day_num)
+        try:
+            months_count = int(request.GET.get('months', 1))
+        except ValueError:
+            months_count = 1
+        months_count = min(max(months_count, 1), MAX_CALENDAR_MONTHS)
 
-                admin_events = CalendarEvent.objects.filter(date=day_date)
-                personal_events = PersonalCalendar.objects.filter(date=day_date, created_by=request.user)
+        employee = getattr(request.user, 'employee_profile', None)
+        company_id = employee.company_id if employee else request.user.company_id
 
-                week.append({
-                    'day': day_num,
-                    'date': str(day_date),
-                    'admin_events': [{'id': e.id, 'title': e.name} for e in admin_events],
-                    'personal_events': [{'id': e.id, 'title': e.name} for e in personal_events],
-                    'is_today': day_date == today,
-                    'is_selected': day_date == current_date
-                })
-            weeks.append(week)
+        grids = build_month_grids(
+            request.user, company_id, month_span(year, month, months_count), today, current_date
+        )
+        weeks = grids[0]['weeks']
 
         prev_month = (current_date.replace(day=1) - timedelta(days=1))
         next_month = (current_date.replace(day=1) + timedelta(days=32)).replace(day=1)
@@ -533,6 +416,8 @@ class EmployeeCalendarAPIView(APIView):
             'weeks': weeks,
             'prev_month': {'year': prev_month.year, 'month': prev_month.month},
             'next_month': {'year': next_month.year, 'month': next_month.month},
+            # Every requested month, for the multi-month (year) view
+            'months': grids,
         })
 
     def post(self, request):
@@ -591,6 +476,11 @@ class TaskListCreateAPIView(generics.ListCreateAPIView):
 
         return Task.objects.filter(created_by=manager, parent_task__isnull=True)
 
+    def list(self, request, *args, **kwargs):
+        tasks = load_task_forest(self.get_queryset())
+        serializer = self.get_serializer(tasks, many=True)
+        return Response(serializer.data)
+
     def perform_create(self, serializer):
         user = self.request.user
         if not user.is_authenticated:
@@ -617,6 +507,23 @@ class TaskDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
         # Return all tasks (including subtasks) created by this manager
         return Task.objects.filter(created_by=manager)
 
+    def perform_update(self, serializer):
+        old_parent_id = serializer.instance.parent_task_id
+        with transaction.atomic():
+            task = serializer.save()
+            if task.parent_task_id != old_parent_id:
+                # Moving a subtask changes the subtask counts of both parents
+                Task.refresh_counters([task.id] + ([old_parent_id] if old_parent_id else []))
+            # The response reports progress from the current counts
+            task.refresh_from_db(fields=Task.COUNTER_FIELDS)
+
+    def perform_destroy(self, instance):
+        parent_id = instance.parent_task_id
+        with transaction.atomic():
+            instance.delete()
+            if parent_id:
+                Task.refresh_counters([parent_id])
+
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
@@ -636,7 +543,7 @@ class TaskDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
                         new_status = subtask_data.get('status', subtask.status)
                         if new_status != subtask.status:
                             subtask.status = new_status
-                            subtask.save()
+                            subtask.save(update_fields=['status'])
                     except Task.DoesNotExist:
                         # You can log or handle this case if needed
                         pass
@@ -663,7 +570,7 @@ class UpdateStatusByManagerAPIView(APIView):
         parent_status = request.data.get('status')
         if parent_status:
             parent_task.status = parent_status
-            parent_task.save()
+            parent_task.save(update_fields=['status'])
 
         # Update subtasks statuses if provided
         subtasks_data = request.data.get('subtasks', [])
@@ -683,7 +590,7 @@ class UpdateStatusByManagerAPIView(APIView):
                 continue  # Skip subtasks not created by manager
 
             subtask.status = subtask_status
-            subtask.save()
+            subtask.save(update_fields=['status'])
 
         serializer = TaskSerializer(parent_task, context={'request': request})
         return Response(serializer.data)
@@ -712,16 +619,8 @@ class TaskAssignAPIView(generics.GenericAPIView):
         if str(owner_id) not in [str(eid) for eid in employee_ids]:
             return Response({"detail": "Owner must be in employees."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Remove old assignments
-        TaskAssignment.objects.filter(task=task).delete()
-
-        # Create new assignments
-        assignments = []
-        for emp_id in employee_ids:
-            emp = get_object_or_404(Employee, id=emp_id, reporting_manager=manager)
-            role = 'owner' if str(emp_id) == str(owner_id) else 'contributor'
-            assignment = TaskAssignment.objects.create(task=task, employee=emp, role=role)
-            assignments.append(assignment)
+        # Only the difference with the current assignments is written
+        assignments = reconcile_assignments(task, manager, employee_ids, owner_id)
 
         # Serialize with request context to get full avatar URL
         serializer = self.get_serializer(assignments, many=True, context={'request': request})
@@ -755,14 +654,7 @@ class SubTaskAssignAPIView(APIView):
         if str(owner_id) not in [str(cid) for cid in contributor_ids]:
             return Response({"detail": "Owner must be a contributor."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Delete existing assignments for this subtask
-        TaskAssignment.objects.filter(task=subtask).delete()
-
-        # Create assignments
-        for emp_id in contributor_ids:
-            emp = get_object_or_404(Employee, id=emp_id, reporting_manager=manager)
-            role = 'owner' if str(emp_id) == str(owner_id) else 'contributor'
-            TaskAssignment.objects.create(task=subtask, employee=emp, role=role)
+        reconcile_assignments(subtask, manager, contributor_ids, owner_id)
 
         return Response({"detail": "Subtask assignments updated successfully."})
     
@@ -782,11 +674,7 @@ class SubTaskAssignAPIView(APIView):
             if str(owner_id) not in [str(cid) for cid in contributor_ids]:
                 return Response({"detail": "Owner must be a contributor."}, status=status.HTTP_400_BAD_REQUEST)
 
-            TaskAssignment.objects.filter(task=subtask).delete()
-            for emp_id in contributor_ids:
-                emp = get_object_or_404(Employee, id=emp_id, reporting_manager=manager)
-                role = 'owner' if str(emp_id) == str(owner_id) else 'contributor'
-                TaskAssignment.objects.create(task=subtask, employee=emp, role=role)
+            reconcile_assignments(subtask, manager, contributor_ids, owner_id)
 
             return Response({"detail": "Subtask assignments updated successfully."})
 
@@ -799,38 +687,27 @@ class MyTasksAPIView(generics.ListAPIView):
         user = self.request.user
         emp = user.employee_profile
 
-        # Filter subtasks assigned to this employee
-        employee_subtasks = (
-            Task.objects.filter(
-                parent_task__isnull=False,
-                assignments__employee=emp
-            )
-            .select_related('parent_task')
-            .prefetch_related(
-                Prefetch('assignments', queryset=TaskAssignment.objects.select_related('employee'))
-            )
-        )
-
         # Main tasks assigned to this employee OR having assigned subtasks
-        queryset = (
+        return (
             Task.objects.filter(
                 Q(assignments__employee=emp) |
                 Q(subtasks__assignments__employee=emp)
             )
             .filter(parent_task__isnull=True)  # Only main tasks
-            .prefetch_related(
-                Prefetch(
-                    'subtasks',
-                    queryset=employee_subtasks.distinct(),
-                    to_attr='employee_subtasks'
-                ),
-                Prefetch('assignments', queryset=TaskAssignment.objects.select_related('employee'))
-            )
-            .select_related('created_by')
             .distinct()
         )
 
-        return queryset
+    def list(self, request, *args, **kwargs):
+        emp = request.user.employee_profile
+        tasks = load_task_forest(self.get_queryset())
+        for task in tasks:
+            # Only the subtasks this employee is assigned to
+            task.employee_subtasks = [
+                subtask for subtask in task.tree_subtasks
+                if any(a.employee_id == emp.id for a in subtask.tree_assignments)
+            ]
+        serializer = self.get_serializer(tasks, many=True)
+        return Response(serializer.data)
 
 
 class UpdateAssignmentStatusAPIView(generics.UpdateAPIView):
@@ -856,12 +733,14 @@ class UpdateAssignmentStatusAPIView(generics.UpdateAPIView):
         # --- Update status ---
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            Task.refresh_counters([task.id])
 
-        # --- Recalculate task status ---
-        new_task_status = task.compute_status_from_assignments()
-        task.status = new_task_status
-        task.save()
+            # --- Recalculate task status ---
+            new_task_status = task.compute_status_from_assignments()
+            task.status = new_task_status
+            task.save(update_fields=['status'])
 
         return Response({"detail": "Assignment status updated."})
 
@@ -879,21 +758,20 @@ class EmpLeaveListCreateAPIView(generics.ListCreateAPIView):
         start_date = serializer.validated_data.get("from_date")
         end_date = serializer.validated_data.get("to_date")
 
-        # Check if leave already exists in the given date range
-        exists = EmpLeave.objects.filter(
-            employee=emp,
-            from_date__lte=end_date,
-            to_date__gte=start_date
-        ).exists()
-
-        if exists:
-            raise Exception("Leave already exists for the given dates.")
+        # Rejected and cancelled leaves free their dates again
+        if overlapping(emp, start_date, end_date).exists():
+            raise ValidationError({"detail": "Leave already exists for the given dates."})
 
-        serializer.save(
-            company=emp.company,
-            employee=emp,
-            reporting_manager=emp.reporting_manager
-        )
+        try:
+            with transaction.atomic():
+                serializer.save(
+                    company=emp.company,
+                    employee=emp,
+                    reporting_manager=emp.reporting_manager
+                )
+        except IntegrityError:
+            # A concurrent request took the dates; the exclusion constraint refused this one
+            raise ValidationError({"detail": "Leave already exists for the given dates."})
 
 
 class LeaveListAPIView(generics.ListAPIView):
@@ -902,14 +780,30 @@ class LeaveListAPIView(generics.ListAPIView):
 
     def get_queryset(self):
         emp = self.request.user.employee_profile
-        return Leave.objects.filter(company=emp.company)
+        return get_config(emp.company_id).leave_types
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request  # required for dynamic count
+        emp = getattr(self.request.user, 'employee_profile', None)
+        # This year's balances for every leave type in one query
+        context['leave_balances'] = balances_for(emp) if emp else {}
         return context
 
 
+class LeaveLedgerAPIView(generics.ListAPIView):
+    serializer_class = LeaveLedgerEntrySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        emp = self.request.user.employee_profile
+        queryset = LeaveLedgerEntry.objects.filter(employee=emp).select_related('leave_type', 'emp_leave')
+        year = self.request.query_params.get('year')
+        if year and year.isdigit():
+            queryset = queryset.filter(year=int(year))
+        return queryset.order_by('-created_at', '-id')
+
+
 class EmpLeaveListAPIView(generics.ListAPIView):
     serializer_class = EmpLeaveSerializer
     permission_classes = [IsAuthenticated]
@@ -927,7 +821,13 @@ class ApproveEmpLeaveAPIView(APIView):
         leave = get_object_or_404(EmpLeave, id=leave_id, reporting_manager=manager)
         if leave.status != 'Approved':
             leave.status = 'Approved'
-            leave.save()
+            try:
+                with transaction.atomic():
+                    leave.save()
+                    sync_leave(leave, user=request.user)
+            except IntegrityError:
+                # A rejected or cancelled leave whose dates were taken again since
+                return Response({'detail': 'The employee already has leave on these dates.'}, status=400)
             return Response({'detail': 'Leave approved.'})
         return Response({'detail': 'Already approved.'})
 
@@ -940,10 +840,47 @@ class RejectEmpLeaveAPIView(APIView):
         leave = get_object_or_404(EmpLeave, id=leave_id, reporting_manager=manager)
         if leave.status != 'Rejected':
             leave.status = 'Rejected'
-            leave.save()
+            with transaction.atomic():
+                leave.save()
+                # Gives the days back when an approved leave is rejected afterwards
+                sync_leave(leave, user=request.user)
             return Response({'detail': 'Leave rejected.'})
         return Response({'detail': 'Already rejected.'})
 
+class BulkEmpLeaveDecisionAPIView(APIView):
+    """Approve or reject many leave requests of the manager's reports at once."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        manager = request.user.employee_profile
+        status_value = LEAVE_DECISIONS.get(request.data.get('action'))
+        if not status_value:
+            return Response({'detail': "action must be 'approve' or 'reject'."}, status=400)
+
+        leave_ids = request.data.get('leave_ids')
+        if not isinstance(leave_ids, list) or not leave_ids:
+            return Response({'detail': 'leave_ids must be a non-empty list.'}, status=400)
+        if len(leave_ids) > MAX_LEAVE_DECISIONS:
+            return Response({'detail': f'At most {MAX_LEAVE_DECISIONS} leaves can be decided at once.'}, status=400)
+        try:
+            leave_ids = [int(leave_id) for leave_id in leave_ids]
+        except (TypeError, ValueError):
+            return Response({'detail': 'leave_ids must be integers.'}, status=400)
+
+        try:
+            changed, unchanged, missing = decide_leaves(manager, leave_ids, status_value, user=request.user)
+        except IntegrityError:
+            return Response({'detail': 'An employee already has leave on the dates of one of these requests.'}, status=400)
+        if missing:
+            return Response({'detail': 'Leave requests not found.', 'missing': missing}, status=404)
+
+        return Response({
+            'detail': f'{len(changed)} leave(s) {status_value.lower()}.',
+            'updated': [leave.id for leave in changed],
+            'unchanged': [leave.id for leave in unchanged],
+        })
+
+
 class CancelEmpLeaveAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -963,7 +900,9 @@ class CancelEmpLeaveAPIView(APIView):
 
         if leave.status == "Approved":            
             leave.status = "Cancelled"
-            leave.save()
+            with transaction.atomic():
+                leave.save()
+                sync_leave(leave, user=request.user)
             return Response({"detail": "Approved leave has been cancelled."})
     
 class EmpLearningCornerAPIView(generics.ListAPIView):
@@ -995,7 +934,7 @@ class BreakLogAPIView(APIView):
 
     def get(self, request):
         employee = request.user.employee_profile
-        configs = BreakConfig.objects.filter(company=employee.company, enabled=True)
+        configs = get_config(employee.company_id).enabled_break_configs
         serializer = EmployeeBreakConfigSerializer(configs, many=True)
         return Response(serializer.data)
 
@@ -1069,10 +1008,19 @@ class EmployeeHierarchyAPIView(APIView):
         match = re.search(r'(\d+)', level_name)
         return int(match.group(1)) if match else None
 
+    def _person(self, emp):
+        return {
+            'id': emp.id,
+            'name': emp.full_name,
+            'designation': emp.designation.designation_name if emp.designation else None,
+        }
+
     def get(self, request):
         user = request.user
         try:
-            employee = Employee.objects.select_related('level', 'designation', 'reporting_manager').get(user=user)
+            employee = Employee.objects.select_related(
+                'level', 'designation', 'reporting_manager__level', 'reporting_manager__designation'
+            ).get(user=user)
         except Employee.DoesNotExist:
             return Response({'error': 'Employee not found.'}, status=404)
 
@@ -1081,19 +1029,11 @@ class EmployeeHierarchyAPIView(APIView):
         current_designation = employee.designation
 
         # Reporting manager info
-        reporting_manager = getattr(employee, 'reporting_manager', None)
-        reportees = []
+        reporting_manager = employee.reporting_manager
         if reporting_manager:
             # Get reportees for this manager (excluding the current employee)
-            reportees_qs = Employee.objects.filter(reporting_manager=reporting_manager).exclude(id=employee.id)
-            reportees = [
-                {
-                    'id': rep.id,
-                    'name': rep.full_name,
-                    'designation': rep.designation.designation_name if rep.designation else None,
-                }
-                for rep in reportees_qs
-            ]
+            reportees_qs = reports_of(reporting_manager, direct=True).exclude(id=employee.id)
+            reportees = [self._person(rep) for rep in reportees_qs.select_related('designation')]
             manager_info = {
                 'name': reporting_manager.full_name,
                 'level': reporting_manager.level.level_name if reporting_manager.level else None,
@@ -1102,33 +1042,27 @@ class EmployeeHierarchyAPIView(APIView):
             }
         else:
             # If no reporting manager (e.g., CEO), get direct reportees for this employee
-            reportees_qs = Employee.objects.filter(reporting_manager=employee)
-            reportees = [
-                {
-                    'id': rep.id,
-                    'name': rep.full_name,
-                    'designation': rep.designation.designation_name if rep.designation else None,
-                }
-                for rep in reportees_qs
-            ]
+            reportees = [self._person(rep) for rep in reports_of(employee, direct=True).select_related('designation')]
             manager_info = None
 
         # Higher authority (next higher level by numeric order in level name)
         current_level_number = self.extract_level_number(current_level.level_name) if current_level else None
-        all_levels = Level.objects.filter(company=employee.company)
-        higher_levels = [
-            lvl for lvl in all_levels
-            if self.extract_level_number(lvl.level_name) is not None and self.extract_level_number(lvl.level_name) < current_level_number
-        ] if current_level_number is not None else []
-
-        next_higher_level = max(higher_levels, key=lambda lvl: self.extract_level_number(lvl.level_name)) if higher_levels else None
+        next_higher_level = None
+        if current_level_number is not None:
+            higher_levels = []
+            for lvl in get_config(employee.company_id).levels:
+                number = self.extract_level_number(lvl.level_name)
+                if number is not None and number < current_level_number:
+                    higher_levels.append((number, lvl))
+            if higher_levels:
+                next_higher_level = max(higher_levels, key=lambda item: item[0])[1]
 
         if next_higher_level:
-            # Get all designations for this level
-            designations = Designation.objects.filter(level=next_higher_level)
             employees_at_level = Employee.objects.filter(company=employee.company, level=next_higher_level)
-            if employees_at_level.count() == 1:
-                higher_emp = employees_at_level.first()
+            # Two rows are enough to tell a single person from a group
+            first_two = list(employees_at_level.select_related('designation')[:2])
+            if len(first_two) == 1:
+                higher_emp = first_two[0]
                 higher_info = {
                     'level': next_higher_level.level_name,
                     'employee_name': higher_emp.full_name,
@@ -1136,14 +1070,19 @@ class EmployeeHierarchyAPIView(APIView):
                 }
             else:
                 # If multiple employees, show level and designation only
+                designation_name = (
+                    Designation.objects.filter(level=next_higher_level)
+                    .values_list('designation_name', flat=True).first()
+                )
                 higher_info = {
                     'level': next_higher_level.level_name,
-                    'designation': designations.first().designation_name if designations.exists() else None,
-                    'employee_count': employees_at_level.count(),
+                    'designation': designation_name,
+                    'employee_count': employees_at_level.count() if first_two else 0,
                 }
         else:
             higher_info = None
 
+        chain = chain_of(employee).select_related('designation', 'level')
         response_data = {
             'employee': {
                 'name': employee.full_name,
@@ -1152,8 +1091,13 @@ class EmployeeHierarchyAPIView(APIView):
             },
             'reporting_manager': manager_info,
             'higher_authority': higher_info,
+            # Managers from the direct one up to the top
+            'reporting_chain': [
+                dict(self._person(emp), level=emp.level.level_name if emp.level else None)
+                for emp in chain
+            ],
         }
         # If the current employee has no reporting manager, add their reportees to the response
         if not reporting_manager:
             response_data['reportees'] = reportees
-        return Response(response_data)
\ No newline at end of file
+        return Response(response_data)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'drf_yasg',
@@ -79,6 +80,7 @@ SWAGGER_SETTINGS = {
 
 
 MIDDLEWARE = [
+    'app.middleware.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -87,7 +89,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    
+    'notifications.middleware.EventCollectorMiddleware',
 ]
 
 ROOT_URLCONF = 'innovyx_hrms.urls'
@@ -152,6 +154,36 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Per-process memory by default. With several worker processes, point this at a
+# shared backend (Redis, Memcached) so invalidations reach every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'innovyx-hrms',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+
+# Request profiling (app.profiling): query counts, N+1 detection and a
+# Server-Timing header on every response, latency histograms per route at
+# /app/profiling/, cProfile dumps of a sample of the slow requests.
+# Off unless PROFILING_ENABLED=1 is set in the environment.
+
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED') == '1',
+    'WINDOW': 1000,
+    'DUPLICATE_THRESHOLD': 5,
+    'SLOW_REQUEST_MS': 1000,
+    'PROFILE_SAMPLE_RATE': 0.05,
+    'PROFILE_DIR': BASE_DIR / 'profiles',
+    'PROFILE_KEEP': 50,
+}
+
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
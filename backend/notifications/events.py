@@ -0,0 +1,109 @@
+"""
+Deferred domain events.
+
+Signal handlers publish events instead of doing slow work (push notifications)
+on the spot. An event only counts once the transaction it was published in
+commits; events of a rolled back transaction or savepoint are dropped.
+Within a collecting scope (every request, through notifications.middleware)
+committed events are held back, events with the same type and key are merged
+(the last one wins), and the lot is handed to the background worker in one
+batch when the scope ends. Outside a scope each event goes to the worker as
+soon as it commits.
+
+The worker runs the subscriber of each event type once per batch with the
+list of that type's events, so a subscriber can send them in one go.
+
+Delivery is best-effort. Batches wait in an in-process queue, not in the
+database: a normal shutdown lets the worker finish them, but those still
+queued when the process is killed or crashes are lost, and a failing
+subscriber is logged, not retried. Use notifications.outbox for anything that
+must arrive (emails carrying credentials or letters).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_subscribers = {}
+_state = Local()
+# One worker: batches are handled in the order they were flushed
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='events')
+
+
+def subscriber(event_type):
+    """
+    Register the function handling the events of `event_type`. It is called
+    with a list of the events' data, each with the event key under 'key'.
+    """
+    def register(func):
+        _subscribers[event_type] = func
+        return func
+    return register
+
+
+def publish(event_type, key, **data):
+    """
+    Publish an event once the current transaction commits. Events with the
+    same `event_type` and `key` collected together are delivered once, with
+    the data of the last one.
+    """
+    transaction.on_commit(lambda: _committed(event_type, key, data))
+
+
+def _committed(event_type, key, data):
+    scopes = getattr(_state, 'scopes', None)
+    if scopes:
+        scopes[-1][(event_type, key)] = data
+    else:
+        _submit({(event_type, key): data})
+
+
+@contextmanager
+def collecting():
+    """Hold back committed events until the block ends, then flush them as one batch."""
+    scopes = getattr(_state, 'scopes', None)
+    if scopes is None:
+        scopes = _state.scopes = []
+    scopes.append({})
+    try:
+        yield
+    finally:
+        batch = scopes.pop()
+        if scopes:
+            # A nested scope hands its events on to the enclosing one
+            scopes[-1].update(batch)
+        elif batch:
+            _submit(batch)
+
+
+def _submit(batch):
+    by_type = {}
+    for (event_type, key), data in batch.items():
+        by_type.setdefault(event_type, []).append({'key': key, **data})
+    _executor.submit(_dispatch, by_type)
+
+
+def _dispatch(by_type):
+    try:
+        for event_type, events in by_type.items():
+            func = _subscribers.get(event_type)
+            if func is None:
+                logger.warning("No subscriber for %s events", event_type)
+                continue
+            try:
+                func(events)
+            except Exception:
+                logger.exception("Handling %d %s event(s) failed", len(events), event_type)
+    finally:
+        # The worker thread keeps its own connection between batches
+        close_old_connections()
+
+
+def join(timeout=None):
+    """Wait until every batch flushed so far has been handled."""
+    _executor.submit(lambda: None).result(timeout)
+
@@ -0,0 +1,43 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbound emails over a single reused mail connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help="Keep polling the outbox instead of exiting when it is empty.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to wait between polls when the outbox is empty.")
+        parser.add_argument('--backend', default=None, help="Email backend path; defaults to settings.EMAIL_BACKEND.")
+
+    def handle(self, *args, **options):
+        connection = get_connection(options['backend'])
+        totals = {'sent': 0, 'retried': 0, 'failed': 0}
+        try:
+            while True:
+                result = deliver_pending(connection, batch_size=options['batch_size'])
+                for key, value in result.items():
+                    totals[key] += value
+                if any(result.values()):
+                    self.stdout.write(
+                        f"Sent {result['sent']}, retrying {result['retried']}, failed {result['failed']}."
+                    )
+                    continue
+                if not options['loop']:
+                    break
+                # Idle: drop the connection rather than let the server time it out
+                connection.close()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['sent']} sent, {totals['retried']} to retry, {totals['failed']} failed."
+        ))
@@ -0,0 +1,12 @@
+from .events import collecting
+
+
+class EventCollectorMiddleware:
+    """Collects the events published during a request and flushes them once the response is built."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collecting():
+            return self.get_response(request)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:26
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Built without locking out writes on the busy tables
+    atomic = False
+
+    dependencies = [
+        ('app', '0036_hot_query_indexes'),
+        ('notifications', '0004_outbound_email'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='usernotification',
+            index=models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='usernotification',
+            index=models.Index(condition=models.Q(('read', False)), fields=['recipient', 'id'], name='notif_unread_idx'),
+        ),
+    ]
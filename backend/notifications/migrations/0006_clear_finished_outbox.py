@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def clear_finished_emails(apps, schema_editor):
+    """
+    Apply the outbox's cleanup to emails that finished before it existed:
+    blank credential bodies of failed emails and delete the attachment files
+    of sent and failed ones.
+    """
+    OutboundEmail = apps.get_model('notifications', 'OutboundEmail')
+    OutboundEmailAttachment = apps.get_model('notifications', 'OutboundEmailAttachment')
+
+    OutboundEmail.objects.filter(status='failed', redact_after_send=True).exclude(body='').update(body='')
+    attachments = OutboundEmailAttachment.objects.filter(
+        email__status__in=['sent', 'failed']
+    ).exclude(file='')
+    for attachment in attachments.iterator():
+        attachment.file.delete(save=False)
+        attachment.save(update_fields=['file'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        # Cleared bodies and deleted files cannot be restored; reversing leaves them as they are
+        migrations.RunPython(clear_finished_emails, migrations.RunPython.noop),
+    ]
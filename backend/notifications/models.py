@@ -1,6 +1,7 @@
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
-from app.models import Employee 
+from app.models import Company, Employee
 from django.utils import timezone
 
 class UserNotification(models.Model):
@@ -13,6 +14,13 @@ class UserNotification(models.Model):
     read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+            # The notification stream polls for a recipient's unread notifications after an id
+            models.Index(fields=['recipient', 'id'], condition=Q(read=False), name='notif_unread_idx'),
+        ]
+
     def __str__(self):
         return f"{self.recipient.full_name} - {self.title}"
 
@@ -27,3 +35,54 @@ class UserDevice(models.Model):
         return f"{self.user_id} - {self.platform} - {self.token[:12]}..."
 
 
+
+
+class OutboundEmail(models.Model):
+    """
+    An email waiting in (or already through) the outbox.
+    Requests only queue rows here; `manage.py send_outbound_emails` delivers them.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True, related_name='outbound_emails')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbound_emails')
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list, blank=True)
+    bcc = models.JSONField(default=list, blank=True)
+    # Body holds credentials (e.g. welcome emails) and is blanked once sent or failed
+    redact_after_send = models.BooleanField(default=False)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
+class OutboundEmailAttachment(models.Model):
+    email = models.ForeignKey(OutboundEmail, on_delete=models.CASCADE, related_name='attachments')
+    filename = models.CharField(max_length=255)
+    file = models.FileField(upload_to='outbox/%Y/%m/')
+    mimetype = models.CharField(max_length=100, blank=True)
+
+    def __str__(self):
+        return self.filename
@@ -0,0 +1,196 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import OutboundEmail, OutboundEmailAttachment
+
+logger = logging.getLogger(__name__)
+
+# A row stuck in 'sending' this long belongs to a worker that died mid-batch
+STALE_LOCK_AFTER = timedelta(minutes=15)
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=1)
+FINAL_STATUSES = ('sent', 'failed')
+
+# Sent after each batch with the OutboundEmail rows it delivered (`emails`),
+# for records that should only count as sent once the email went out
+emails_delivered = Signal()
+
+
+def queue_messages(messages, company=None, created_by=None, redact_after_send=False):
+    """
+    Queue Django EmailMessage objects for delivery by the outbox worker.
+    Attachments are written to storage under `outbox/`, not into the database.
+    Returns the created OutboundEmail rows, in the same order as `messages`.
+    """
+    messages = list(messages)
+    if not messages:
+        return []
+
+    with transaction.atomic():
+        emails = OutboundEmail.objects.bulk_create([
+            OutboundEmail(
+                company=company,
+                created_by=created_by,
+                subject=message.subject,
+                body=message.body,
+                from_email=message.from_email or '',
+                to=list(message.to),
+                cc=list(message.cc),
+                bcc=list(message.bcc),
+                redact_after_send=redact_after_send,
+            )
+            for message in messages
+        ])
+        for email, message in zip(emails, messages):
+            for attachment in message.attachments:
+                filename, content, mimetype = attachment
+                if isinstance(content, str):
+                    content = content.encode()
+                stored = OutboundEmailAttachment(email=email, filename=filename, mimetype=mimetype or '')
+                stored.file.save(filename, ContentFile(content), save=False)
+                stored.save()
+    return emails
+
+
+def queue_email(subject, body, to, attachments=(), company=None, created_by=None, redact_after_send=False):
+    """
+    Queue a single email. `attachments` is an iterable of (filename, content, mimetype).
+    """
+    message = EmailMessage(subject=subject, body=body, from_email=settings.DEFAULT_FROM_EMAIL, to=list(to))
+    for filename, content, mimetype in attachments:
+        message.attach(filename, content, mimetype)
+    return queue_messages([message], company=company, created_by=created_by, redact_after_send=redact_after_send)[0]
+
+
+def retry_delay(attempts):
+    delay = RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0))
+    return min(delay, RETRY_MAX_DELAY)
+
+
+def claim_batch(batch_size):
+    """
+    Mark up to `batch_size` due emails as 'sending' and return their ids.
+    SKIP LOCKED lets several workers drain the outbox without picking the same rows.
+    """
+    now = timezone.now()
+    due = (
+        Q(status='pending', next_attempt_at__lte=now)
+        | Q(status='sending', locked_at__lt=now - STALE_LOCK_AFTER)
+    )
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if ids:
+            OutboundEmail.objects.filter(id__in=ids).update(
+                status='sending', locked_at=now, attempts=F('attempts') + 1
+            )
+    return ids
+
+
+def _build_message(email, connection):
+    message = EmailMessage(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=email.to,
+        cc=email.cc,
+        bcc=email.bcc,
+        connection=connection,
+    )
+    for attachment in email.attachments.all():
+        with attachment.file.open('rb') as fh:
+            message.attach(attachment.filename, fh.read(), attachment.mimetype or None)
+    return message
+
+
+def deliver_pending(connection=None, batch_size=50):
+    """
+    Claim one batch of due emails and send them over `connection`.
+    The connection is left open so a long-running worker can reuse it across batches.
+    Returns a dict with the number of emails sent, retried and failed.
+    """
+    ids = claim_batch(batch_size)
+    result = {'sent': 0, 'retried': 0, 'failed': 0}
+    if not ids:
+        return result
+
+    connection = connection or get_connection()
+    emails = OutboundEmail.objects.filter(id__in=ids).prefetch_related('attachments').order_by('id')
+    now = timezone.now()
+    done = []
+    for email in emails:
+        try:
+            # No-op when already open; reopens after a dropped connection
+            connection.open()
+            connection.send_messages([_build_message(email, connection)])
+        except Exception as e:
+            logger.warning("Outbound email %s failed (attempt %s): %s", email.id, email.attempts, e)
+            connection.close()
+            email.last_error = str(e)
+            if email.attempts >= email.max_attempts:
+                email.status = 'failed'
+                result['failed'] += 1
+            else:
+                email.status = 'pending'
+                email.next_attempt_at = now + retry_delay(email.attempts)
+                result['retried'] += 1
+        else:
+            email.status = 'sent'
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            result['sent'] += 1
+        if email.status in FINAL_STATUSES and email.redact_after_send:
+            email.body = ''
+        email.locked_at = None
+        done.append(email)
+
+    OutboundEmail.objects.bulk_update(
+        done, ['status', 'sent_at', 'last_error', 'body', 'next_attempt_at', 'locked_at']
+    )
+    purge_attachments([email.id for email in done if email.status in FINAL_STATUSES])
+    delivered = [email for email in done if email.status == 'sent']
+    if delivered:
+        emails_delivered.send(sender=OutboundEmail, emails=delivered)
+    return result
+
+
+def purge_attachments(email_ids):
+    """
+    Delete the stored files of emails that will not be sent again. The
+    attachment rows stay, so the admin list still shows what was attached.
+    """
+    attachments = list(OutboundEmailAttachment.objects.filter(email_id__in=email_ids).exclude(file=''))
+    for attachment in attachments:
+        attachment.file.delete(save=False)
+    OutboundEmailAttachment.objects.bulk_update(attachments, ['file'])
+
+
+def can_requeue(email):
+    """Failed emails keep their body and attachments only when neither was cleared."""
+    return (
+        email.status == 'failed'
+        and not email.redact_after_send
+        and not email.attachments.exists()
+    )
+
+
+def requeue(email):
+    """Put a failed email back in the queue with a fresh set of attempts."""
+    email.status = 'pending'
+    email.attempts = 0
+    email.next_attempt_at = timezone.now()
+    email.last_error = ''
+    email.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error'])
+    return email
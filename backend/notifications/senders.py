@@ -0,0 +1,44 @@
+import threading
+import time
+
+from app.models import UserRegister
+
+# Bounds staleness in other processes, as in app.shift_resolver
+CACHE_TTL = 300
+
+_senders = {}
+_lock = threading.Lock()
+
+
+def get_system_sender(company_id):
+    """
+    The user a company's automatic notifications are sent as: its first admin,
+    or None when the company has no admin (or there is no company).
+    """
+    if not company_id:
+        return None
+    now = time.monotonic()
+    with _lock:
+        cached = _senders.get(company_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    sender = UserRegister.objects.filter(company_id=company_id, role='admin').order_by('id').first()
+    with _lock:
+        _senders[company_id] = (now + CACHE_TTL, sender)
+    return sender
+
+
+def invalidate(user=None):
+    """
+    Forget the cached senders affected by a change to `user`: the one of the
+    user's company, and any company the user was the sender of. Without a user,
+    forget them all.
+    """
+    with _lock:
+        if user is None:
+            _senders.clear()
+            return
+        for company_id, (_, sender) in list(_senders.items()):
+            if company_id == user.company_id or (sender is not None and sender.pk == user.pk):
+                del _senders[company_id]
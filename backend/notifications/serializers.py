@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import UserNotification
+from .models import UserNotification, OutboundEmail, OutboundEmailAttachment
 
 class UserNotificationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,3 +8,20 @@ class UserNotificationSerializer(serializers.ModelSerializer):
             'id', 'recipient', 'sender', 'title', 'message',
             'type', 'related_object_id', 'read', 'created_at'
         ]
+
+
+class OutboundEmailAttachmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OutboundEmailAttachment
+        fields = ['id', 'filename', 'mimetype']
+
+
+class OutboundEmailSerializer(serializers.ModelSerializer):
+    attachments = OutboundEmailAttachmentSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = OutboundEmail
+        fields = [
+            'id', 'subject', 'to', 'cc', 'status', 'attempts', 'max_attempts',
+            'next_attempt_at', 'last_error', 'created_at', 'sent_at', 'attachments'
+        ]
@@ -106,7 +106,51 @@ def send_fcm_to_users(user_ids, notif_type, message, sender, title="", related_o
         this_extra_data['company_name'] = emp_name_map.get(user_id, "")
         send_fcm_push(tk, title or notif_type.capitalize(), message, this_extra_data)
   
-        
+
+
+def send_fcm_batch(notifications, sender):
+    """
+    Send a batch of different notifications in one go.
+    notifications: dicts with user_id, notif_type, message and optionally
+    title, related_object_id and extra_data, one per recipient.
+    The UserNotification rows are created with one bulk insert and the user,
+    company and device lookups are shared by the whole batch.
+    """
+    from app.models import Employee
+    notifications = list(notifications)
+    user_ids = {n['user_id'] for n in notifications}
+    employees = {
+        e.user_id: e
+        for e in Employee.objects.filter(user_id__in=user_ids).select_related('company')
+    }
+    notifications = [n for n in notifications if n['user_id'] in employees]
+    if not notifications:
+        return
+
+    UserNotification.objects.bulk_create([
+        UserNotification(
+            recipient_id=employees[n['user_id']].id,
+            sender=sender,
+            title=n.get('title') or n['notif_type'].capitalize(),
+            message=n['message'],
+            related_object_id=n.get('related_object_id'),
+        )
+        for n in notifications
+    ])
+
+    tokens = {}
+    for user_id, tk in UserDevice.objects.filter(user_id__in=user_ids).values_list("user_id", "token"):
+        tokens.setdefault(user_id, []).append(tk)
+    for n in notifications:
+        company = employees[n['user_id']].company
+        # FCM requires all data values to be strings
+        data = {k: str(v) for k, v in (n.get('extra_data') or {}).items()}
+        data['company_logo'] = get_absolute_logo_url(company.logo) if company and company.logo else ""
+        data['company_name'] = company.name if company and company.name else ""
+        for tk in tokens.get(n['user_id'], []):
+            send_fcm_push(tk, n.get('title') or n['notif_type'].capitalize(), n['message'], data)
+
+
 def send_push_notification_to_all(title, message):
     user_ids = list(UserRegister.objects.values_list('id', flat=True))
     send_fcm_to_users(user_ids, "general", message, sender=None, title=title)  # sender can be None for general announcements
\ No newline at end of file
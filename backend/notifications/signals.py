@@ -1,82 +1,132 @@
-from .service import send_fcm_to_users,send_push_notification_to_all
+from .service import send_fcm_batch, send_fcm_to_users, send_push_notification_to_all
+from .senders import get_system_sender, invalidate as invalidate_senders
+from .events import publish, subscriber
 from app.models import UserRegister
-from django.db.models.signals import post_save, pre_save, post_migrate
+from django.db.models.signals import post_delete, post_save, pre_save, post_migrate
 from django.dispatch import receiver
 from employee.models import TaskAssignment, Task
+from employee.task_assignments import notify_new_assignees
 from app.models import Employee, EmpLeave, CalendarEvent, LearningCorner, Notification
 from notifications.models import UserNotification
 
+# The receivers below only publish events; the notifications are sent by the
+# subscribers, off the request, once the change is committed (see events.py).
 
-def _company_user_ids(company):
+
+def _company_user_ids(company_id):
     return list(
-        Employee.objects.filter(company=company).select_related("user").values_list("user__id", flat=True)
+        Employee.objects.filter(company_id=company_id, user__isnull=False).values_list("user_id", flat=True)
     )
+
+
+def _notify_company_employees(company_id, title, message, related_object_id, sender):
+    """In-app notification for every employee of the company, app user or not."""
+    UserNotification.objects.bulk_create([
+        UserNotification(
+            recipient_id=employee_id,
+            title=title,
+            message=message,
+            related_object_id=related_object_id,
+            sender=sender,
+        )
+        for employee_id in Employee.objects.filter(company_id=company_id).values_list("id", flat=True)
+    ])
+
+@receiver([post_save, post_delete], sender=UserRegister)
+def system_sender_changed(sender, instance, **kwargs):
+    # Logins only touch last_login, which has no bearing on the sender
+    if kwargs.get('update_fields') == frozenset({'last_login'}):
+        return
+    invalidate_senders(instance)
+
 # --- TASKS ---
 @receiver(post_save, sender=TaskAssignment)
-def task_assigned_updated(sender, instance, created, **kwargs):
+def task_assignment_saved(sender, instance, created, **kwargs):
+    if created:
+        publish('task_assigned', instance.id)
+    else:
+        publish('task_assignment_updated', instance.id)
+
+
+@subscriber('task_assigned')
+def notify_task_assigned(events):
     """
-    When a manager assigns/updates a task assignment, notify only the assigned employee.
-    Also create a UserNotification so the frontend gets live notification via SSE and API.
+    Notify new assignees, per task. Assignments created together (bulk or in
+    one request) are announced together.
     """
-    emp_user_id = instance.employee.user.id if hasattr(instance.employee, 'user') else None
-    if not emp_user_id:
-        return
-    task = instance.task
-    body = f"{task.title} (deadline: {task.deadline})"
-    data = {"type": "task", "task_id": task.id, "assignment_id": instance.id, "status": instance.status}
-    default_sender = UserRegister.objects.filter(role='admin').first()
-    send_fcm_to_users([emp_user_id], "task", body, sender=default_sender, extra_data=data)
-    # Create UserNotification for live notification
-    if created:
-        UserNotification.objects.create(
-            recipient=instance.employee,
-            title=f"Task Assigned: {task.title}",
-            message=f"You have been assigned a task: {task.title} (deadline: {task.deadline})",
-            related_object_id=task.id,
-            sender=default_sender
-        )
+    assignments = TaskAssignment.objects.filter(
+        id__in=[event['key'] for event in events]
+    ).select_related('task', 'employee').order_by('id')
+    by_task = {}
+    for assignment in assignments:
+        by_task.setdefault(assignment.task_id, (assignment.task, []))[1].append(assignment)
+    for task, task_assignments in by_task.values():
+        notify_new_assignees(task, task_assignments)
 
-@receiver(post_save, sender=TaskAssignment)
-def notify_employees_on_assignment(sender, instance, created, **kwargs):
-    if created:
-        # all users currently assigned to this task
-        assigned_user_ids = list(
-            instance.task.assignments.select_related("employee__user").values_list("employee__user__id", flat=True)
-        )
 
-        
-        default_sender = UserRegister.objects.filter(role="admin").first()
-        send_fcm_to_users(
-            assigned_user_ids,
-            "task",
-            f"{instance.task.title} assigned to you",
-            sender=default_sender,
-            extra_data={"type": "task", "task_id": instance.task.id},
-        )
-       
+@subscriber('task_assignment_updated')
+def notify_task_assignment_updated(events):
+    """When a task assignment is updated, notify only the assigned employee."""
+    assignments = TaskAssignment.objects.filter(
+        id__in=[event['key'] for event in events]
+    ).select_related('task', 'employee').order_by('id')
+    assignments = [a for a in assignments if a.employee.user_id]
+    if not assignments:
+        return
+    send_fcm_batch(
+        [
+            {
+                'user_id': a.employee.user_id,
+                'notif_type': 'task',
+                'message': f"{a.task.title} (deadline: {a.task.deadline})",
+                'extra_data': {"type": "task", "task_id": a.task.id, "assignment_id": a.id, "status": a.status},
+            }
+            for a in assignments
+        ],
+        sender=get_system_sender(assignments[0].employee.company_id),
+    )
+
+# --- LEAVES ---
 @receiver(post_save, sender=EmpLeave)
 def leave_created_notify_manager(sender, instance, created, **kwargs):
-    """
-    When employee submits leave -> notify reporting manager only.
-    Also create a UserNotification for the manager.
-    """
-    if created and instance.reporting_manager and instance.reporting_manager.user and instance.reporting_manager.user.id:
-        default_sender = UserRegister.objects.filter(role='admin').first()
-        send_fcm_to_users(
-            [instance.reporting_manager.user.id],
-            "leave",
-            f"{instance.employee} requested {instance.leave_type} ({instance.from_date} → {instance.to_date})",
+    if created and instance.reporting_manager_id:
+        publish('leave_requested', instance.id)
+
+
+@subscriber('leave_requested')
+def notify_leave_requested(events):
+    """When employees submit leave, notify their reporting managers only."""
+    leaves = EmpLeave.objects.filter(
+        id__in=[event['key'] for event in events], reporting_manager__user__isnull=False
+    ).select_related('employee', 'reporting_manager', 'leave_type').order_by('id')
+    by_company = {}
+    for leave in leaves:
+        by_company.setdefault(leave.company_id, []).append(leave)
+    for company_id, company_leaves in by_company.items():
+        default_sender = get_system_sender(company_id)
+        send_fcm_batch(
+            [
+                {
+                    'user_id': leave.reporting_manager.user_id,
+                    'notif_type': 'leave',
+                    'message': f"{leave.employee} requested {leave.leave_type} ({leave.from_date} → {leave.to_date})",
+                    'extra_data': {"type": "leave_request", "leave_id": leave.id},
+                }
+                for leave in company_leaves
+            ],
             sender=default_sender,
-            extra_data={"type": "leave_request", "leave_id": instance.id}
-        )
-        # Create UserNotification for manager, set sender to default_sender
-        UserNotification.objects.create(
-            recipient=instance.reporting_manager,
-            title=f"Leave Request from {instance.employee}",
-            message=f"{instance.employee} requested {instance.leave_type} ({instance.from_date} → {instance.to_date})",
-            related_object_id=instance.id,
-            sender=default_sender
         )
+        UserNotification.objects.bulk_create([
+            UserNotification(
+                recipient=leave.reporting_manager,
+                title=f"Leave Request from {leave.employee}",
+                message=f"{leave.employee} requested {leave.leave_type} ({leave.from_date} → {leave.to_date})",
+                related_object_id=leave.id,
+                sender=default_sender,
+            )
+            for leave in company_leaves
+        ])
+
 
 @receiver(pre_save, sender=EmpLeave)
 def leave_status_change(sender, instance, **kwargs):
@@ -87,31 +137,72 @@ def leave_status_change(sender, instance, **kwargs):
     except EmpLeave.DoesNotExist:
         return
     if prev.status != instance.status:
-        if instance.employee and instance.employee.user and instance.employee.user.id:
-            default_sender = UserRegister.objects.filter(role='admin').first()
-            send_fcm_to_users(
-                [instance.employee.user.id],
-                "leave",
-                f"Your leave ({instance.from_date} → {instance.to_date}) is {instance.status}",
+        publish('leave_status', instance.pk, status=instance.status)
+
+
+@subscriber('leave_status')
+def notify_leave_status(events):
+    """
+    Tell employees about the new status of their leave. The status is the one
+    the event was published with, the last one if it changed more than once.
+    """
+    statuses = {event['key']: event['status'] for event in events}
+    leaves = EmpLeave.objects.filter(
+        id__in=statuses, employee__user__isnull=False
+    ).select_related('employee').order_by('id')
+    by_company = {}
+    for leave in leaves:
+        by_company.setdefault(leave.company_id, []).append(leave)
+    for company_id, company_leaves in by_company.items():
+        default_sender = get_system_sender(company_id)
+        send_fcm_batch(
+            [
+                {
+                    'user_id': leave.employee.user_id,
+                    'notif_type': 'leave',
+                    'message': f"Your leave ({leave.from_date} → {leave.to_date}) is {statuses[leave.id]}",
+                    'extra_data': {"type": "leave_status", "leave_id": leave.id, "status": statuses[leave.id]},
+                }
+                for leave in company_leaves
+            ],
+            sender=default_sender,
+        )
+        UserNotification.objects.bulk_create([
+            UserNotification(
+                recipient=leave.employee,
+                title="Leave Status Updated",
+                message=f"Your leave ({leave.from_date} → {leave.to_date}) is {statuses[leave.id]}",
+                related_object_id=leave.id,
                 sender=default_sender,
-                extra_data={"type": "leave_status", "leave_id": instance.id, "status": instance.status}
-            )
-            # Create UserNotification for employee, set sender to default_sender
-            UserNotification.objects.create(
-                recipient=instance.employee,
-                title=f"Leave Status Updated",
-                message=f"Your leave ({instance.from_date} → {instance.to_date}) is {instance.status}",
-                related_object_id=instance.id,
-                sender=default_sender
             )
+            for leave in company_leaves
+        ])
 
+# --- BROADCASTS ---
 @receiver(post_save, sender=Notification)
 def admin_notification_broadcast(sender, instance, created, **kwargs):
     if created and instance.company_id:
-        user_ids = _company_user_ids(instance.company)
-        default_sender = UserRegister.objects.filter(role='admin').first()
+        publish('admin_notification', instance.id)
+
+
+@receiver(post_save, sender=CalendarEvent)
+def calendar_event_broadcast(sender, instance, created, **kwargs):
+    if created and instance.company_id:
+        publish('calendar_event', instance.id)
+
+
+@receiver(post_save, sender=LearningCorner)
+def learning_corner_broadcast(sender, instance, created, **kwargs):
+    if created and instance.company_id:
+        publish('learning_corner', instance.id)
+
+
+@subscriber('admin_notification')
+def send_admin_notifications(events):
+    for instance in Notification.objects.filter(id__in=[event['key'] for event in events]).order_by('id'):
+        default_sender = get_system_sender(instance.company_id)
         send_fcm_to_users(
-            user_ids,
+            _company_user_ids(instance.company_id),
             "general",
             instance.description or (instance.title or "Notification"),
             sender=default_sender,
@@ -119,23 +210,21 @@ def admin_notification_broadcast(sender, instance, created, **kwargs):
             related_object_id=instance.id,
             extra_data={"type": "admin_notification", "notification_id": instance.id}
         )
-        # Create UserNotification for all employees in company
-        for emp in Employee.objects.filter(company=instance.company):
-            UserNotification.objects.create(
-                recipient=emp,
-                title=instance.title or "Admin Notification",
-                message=instance.description or instance.title or "",
-                related_object_id=instance.id,
-                sender=default_sender
-            )
+        _notify_company_employees(
+            instance.company_id,
+            instance.title or "Admin Notification",
+            instance.description or instance.title or "",
+            instance.id,
+            default_sender,
+        )
 
-@receiver(post_save, sender=CalendarEvent)
-def calendar_event_broadcast(sender, instance, created, **kwargs):
-    if created and instance.company_id:
-        user_ids = _company_user_ids(instance.company)
-        default_sender = UserRegister.objects.filter(role='admin').first()
+
+@subscriber('calendar_event')
+def send_calendar_events(events):
+    for instance in CalendarEvent.objects.filter(id__in=[event['key'] for event in events]).order_by('id'):
+        default_sender = get_system_sender(instance.company_id)
         send_fcm_to_users(
-            user_ids,
+            _company_user_ids(instance.company_id),
             "event",
             f"{instance.name} on {instance.date}",
             sender=default_sender,
@@ -143,23 +232,21 @@ def calendar_event_broadcast(sender, instance, created, **kwargs):
             related_object_id=instance.id,
             extra_data={"type": "calendar_event", "event_id": instance.id}
         )
-        # Create UserNotification for all employees in company
-        for emp in Employee.objects.filter(company=instance.company):
-            UserNotification.objects.create(
-                recipient=emp,
-                title=instance.name or "Calendar Event",
-                message=getattr(instance, 'description', "Calendar Event"),
-                related_object_id=instance.id,
-                sender=default_sender  # Make sure default_sender is set to a valid UserRegister instance
-            )
+        _notify_company_employees(
+            instance.company_id,
+            instance.name or "Calendar Event",
+            instance.description,
+            instance.id,
+            default_sender,
+        )
 
-@receiver(post_save, sender=LearningCorner)
-def learning_corner_broadcast(sender, instance, created, **kwargs):
-    if created and instance.company_id:
-        user_ids = _company_user_ids(instance.company)
-        default_sender = UserRegister.objects.filter(role='admin').first()
+
+@subscriber('learning_corner')
+def send_learning_corner_items(events):
+    for instance in LearningCorner.objects.filter(id__in=[event['key'] for event in events]).order_by('id'):
+        default_sender = get_system_sender(instance.company_id)
         send_fcm_to_users(
-            user_ids,
+            _company_user_ids(instance.company_id),
             "learning",
             instance.title or "New item in Learning Corner",
             sender=default_sender,
@@ -167,14 +254,10 @@ def learning_corner_broadcast(sender, instance, created, **kwargs):
             related_object_id=instance.id,
             extra_data={"type": "learning_corner", "learning_id": instance.id}
         )
-        # Create UserNotification for all employees in company
-        for emp in Employee.objects.filter(company=instance.company):
-            UserNotification.objects.create(
-                recipient=emp,
-                title=instance.title or "Learning Corner",
-                message=(instance.description or instance.title or "Learning Corner"),
-                related_object_id=instance.id,
-                sender=default_sender
-            )
-
-
+        _notify_company_employees(
+            instance.company_id,
+            instance.title or "Learning Corner",
+            instance.description or instance.title or "Learning Corner",
+            instance.id,
+            default_sender,
+        )
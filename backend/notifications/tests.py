@@ -1,3 +1,150 @@
-from django.test import TestCase
+import tempfile
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.models import Company, EmpLeave, Employee, Leave, UserRegister
+from employee.models import Task
+from employee.task_assignments import reconcile_assignments
+
+from . import signals
+from .models import OutboundEmail, UserDevice, UserNotification
+from .outbox import deliver_pending, queue_email
+
+
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Queued attachments are written to storage
+        media = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        cls.addClassCleanup(media_settings.disable)
+
+    def setUp(self):
+        self.company = Company.objects.create(
+            name='Acme', address='1 Main St', email='hr@acme.example', phone_number='0000000000'
+        )
+
+    def _queue(self, **kwargs):
+        return queue_email(
+            'Welcome', 'Your password is s3cret', ['new@example.com'],
+            attachments=[('letter.pdf', b'%PDF-1.4', 'application/pdf')], company=self.company, **kwargs
+        )
+
+    def test_sent_email_drops_credentials_and_files(self):
+        email = self._queue(redact_after_send=True)
+        path = email.attachments.get().file.name
+        self.assertTrue(default_storage.exists(path))
+
+        self.assertEqual(deliver_pending()['sent'], 1)
+
+        email.refresh_from_db()
+        self.assertEqual(email.body, '')
+        self.assertFalse(default_storage.exists(path))
+        self.assertEqual(email.attachments.get().file.name, '')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('s3cret', mail.outbox[0].body)
+
+    def test_failed_email_drops_credentials_and_files(self):
+        email = self._queue(redact_after_send=True)
+        OutboundEmail.objects.filter(pk=email.pk).update(max_attempts=1)
+        path = email.attachments.get().file.name
+
+        connection = mock.Mock()
+        connection.send_messages.side_effect = OSError('connection refused')
+        self.assertEqual(deliver_pending(connection)['failed'], 1)
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'failed')
+        self.assertEqual(email.body, '')
+        self.assertFalse(default_storage.exists(path))
+
+    def test_retried_email_keeps_its_contents(self):
+        email = self._queue(redact_after_send=True)
+        path = email.attachments.get().file.name
+
+        connection = mock.Mock()
+        connection.send_messages.side_effect = OSError('connection refused')
+        self.assertEqual(deliver_pending(connection)['retried'], 1)
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.body, 'Your password is s3cret')
+        self.assertTrue(default_storage.exists(path))
+
+    def test_cleared_email_cannot_be_retried(self):
+        admin = UserRegister.objects.create_user(
+            username='acme-admin', password='x', role='admin', company=self.company
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        cleared = self._queue(redact_after_send=True)
+        plain = queue_email('Notice', 'Office closed Friday', ['all@example.com'], company=self.company)
+        OutboundEmail.objects.update(status='failed')
+
+        response = client.post(reverse('outbound-email-retry', args=[cleared.pk]))
+        self.assertEqual(response.status_code, 400)
+        response = client.post(reverse('outbound-email-retry', args=[plain.pk]))
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['status'], 'pending')
+
+
+@mock.patch('notifications.service.send_fcm_push')
+class NotificationSubscriberTests(TestCase):
+    # Subscribers run here in the test thread; the event worker's connection
+    # would not see the test's uncommitted rows
+    def setUp(self):
+        self.company = Company.objects.create(
+            name='Acme', address='1 Main St', email='hr@acme.example', phone_number='0000000000'
+        )
+        self.manager = self._employee('mina', 'Mina')
+        self.report = self._employee('ravi', 'Ravi', last_name='Kumar', reporting_manager=self.manager)
+
+    def _employee(self, username, first_name, **kwargs):
+        user = UserRegister.objects.create_user(
+            username=username, password='x', role='employee', company=self.company
+        )
+        UserDevice.objects.create(user=user, token=f'{username}-phone')
+        return Employee.objects.create(company=self.company, user=user, first_name=first_name, **kwargs)
+
+    def _titles(self, employee):
+        return sorted(UserNotification.objects.filter(recipient=employee).values_list('title', flat=True))
+
+    def test_task_assignment_notifications(self, push):
+        task = Task.objects.create(
+            title='Quarterly report', created_by=self.manager, deadline=date(2026, 12, 31), priority='medium'
+        )
+        assignments = reconcile_assignments(task, self.manager, [self.report.id], self.report.id)
+
+        signals.notify_task_assigned([{'key': a.id} for a in assignments])
+
+        self.assertEqual(self._titles(self.report), ['Task', 'Task', 'Task Assigned: Quarterly report'])
+        self.assertCountEqual(
+            [call.args[2] for call in push.call_args_list],
+            ['Quarterly report (deadline: 2026-12-31)', 'Quarterly report assigned to you'],
+        )
+
+    def test_leave_request_and_status_notifications(self, push):
+        casual = Leave.objects.create(company=self.company, leave_name='Casual', count=12)
+        leave = EmpLeave.objects.create(
+            company=self.company, employee=self.report, reporting_manager=self.manager, leave_type=casual,
+            from_date=date(2026, 3, 2), to_date=date(2026, 3, 3),
+        )
+
+        signals.notify_leave_requested([{'key': leave.id}])
+        signals.notify_leave_status([{'key': leave.id, 'status': 'Approved'}])
+
+        self.assertEqual(self._titles(self.manager), ['Leave', 'Leave Request from Ravi Kumar'])
+        self.assertEqual(self._titles(self.report), ['Leave', 'Leave Status Updated'])
+        self.assertEqual(
+            [(call.args[0], call.args[1]) for call in push.call_args_list],
+            [('mina-phone', 'Leave'), ('ravi-phone', 'Leave')],
+        )
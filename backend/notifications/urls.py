@@ -1,9 +1,15 @@
 from django.urls import path
-from .views import UserNotificationListAPIView, DeviceTokenView
+from .views import (
+    UserNotificationListAPIView, DeviceTokenView,
+    OutboundEmailListAPIView, OutboundEmailDetailAPIView, OutboundEmailRetryAPIView,
+)
 
 
 urlpatterns = [
     
     path('api/notifications/', UserNotificationListAPIView.as_view(), name='user-notifications'),
     path('devices/', DeviceTokenView.as_view(), name='device-token'),
+    path('outbound-emails/', OutboundEmailListAPIView.as_view(), name='outbound-email-list'),
+    path('outbound-emails/<int:pk>/', OutboundEmailDetailAPIView.as_view(), name='outbound-email-detail'),
+    path('outbound-emails/<int:pk>/retry/', OutboundEmailRetryAPIView.as_view(), name='outbound-email-retry'),
    ]
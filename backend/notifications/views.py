@@ -3,7 +3,9 @@ from rest_framework import generics, permissions
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import UserNotificationSerializer
+from .serializers import UserNotificationSerializer, OutboundEmailSerializer
+from .outbox import can_requeue, requeue
+from app.permissions import IsAdminUser
 from .models import *
 
 
@@ -47,4 +49,43 @@ class UserNotificationListAPIView(generics.ListAPIView):
 
 
 
+class OutboundEmailListAPIView(generics.ListAPIView):
+    """Delivery status of emails queued for the admin's company. Filter with ?status=."""
+    serializer_class = OutboundEmailSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
 
+    def get_queryset(self):
+        queryset = OutboundEmail.objects.filter(company=self.request.user.company).prefetch_related('attachments')
+        status_param = self.request.query_params.get('status')
+        if status_param:
+            queryset = queryset.filter(status=status_param)
+        return queryset.order_by('-created_at')
+
+
+class OutboundEmailDetailAPIView(generics.RetrieveAPIView):
+    serializer_class = OutboundEmailSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get_queryset(self):
+        return OutboundEmail.objects.filter(company=self.request.user.company).prefetch_related('attachments')
+
+
+class OutboundEmailRetryAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request, pk):
+        try:
+            email = OutboundEmail.objects.get(pk=pk, company=request.user.company)
+        except OutboundEmail.DoesNotExist:
+            return Response({"detail": "Email not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        if email.status != 'failed':
+            return Response({"detail": "Only failed emails can be retried."}, status=status.HTTP_400_BAD_REQUEST)
+        if not can_requeue(email):
+            return Response(
+                {"detail": "This email's body or attachments were cleared when it failed; send it again from where it was created."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        requeue(email)
+        return Response(OutboundEmailSerializer(email).data, status=status.HTTP_200_OK)